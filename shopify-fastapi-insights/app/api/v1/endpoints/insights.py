@@ -1,77 +1,225 @@
-from fastapi import APIRouter, Depends, HTTPException, BackgroundTasks
+from fastapi import APIRouter, Depends, HTTPException, BackgroundTasks, Query, Response
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
-from typing import List
+from typing import List, Optional
+import httpx
 
+from app.core.config import settings
 from app.core.database import get_db
+from app.core.http_client import get_http_client
 from app.services.insights_service import InsightsService
 from app.services.competitor_service import CompetitorService
+from app.services.job_queue import InsightsJobQueue, get_job_queue
+from app.services.batch_service import BatchInsightsService
+from app.services.product_service import ProductService
+from app.services.similarity import similarity_index
 from app.models.schemas import (
-    BrandInsightsRequest, BrandInsightsResponse, 
-    CompetitorAnalysisResponse
+    BrandInsightsRequest, BrandInsightsResponse, BrandInsightSummary, BatchInsightsRequest,
+    CompetitorAnalysisResponse, InsightJobResponse, SimilarBrandSchema, SimilarBrandsResponse,
+    ProductPageResponse, ProductSort
 )
 
 router = APIRouter()
 
-@router.post("/insights", response_model=BrandInsightsResponse)
+@router.post(
+    "/insights",
+    response_model=BrandInsightsResponse,
+    responses={202: {"model": InsightJobResponse, "description": "Extraction queued (async_mode)"}}
+)
 async def fetch_brand_insights(
     request: BrandInsightsRequest,
-    db: AsyncSession = Depends(get_db)
+    max_age: Optional[int] = Query(None, ge=0, description="Refresh sections fetched more than this many seconds ago"),
+    db: AsyncSession = Depends(get_db),
+    http_client: httpx.AsyncClient = Depends(get_http_client),
+    job_queue: InsightsJobQueue = Depends(get_job_queue)
 ):
     """
     Fetch comprehensive insights from a Shopify store or any e-commerce website.
+    
+    With `async_mode` the extraction is queued and a 202 with the insight id is
+    returned immediately; poll `GET /insights/{id}` for its status.
+    
+    Stored insights are returned as-is unless `max_age` is given, in which case
+    stale sections are re-fetched with conditional requests and only changed
+    sections are re-parsed and rewritten.
     """
-    insights_service = InsightsService()
+    if request.async_mode:
+        job = await job_queue.enqueue(str(request.website_url), db, max_age)
+        return JSONResponse(status_code=202, content=jsonable_encoder(job))
+    insights_service = InsightsService(http_client)
     try:
-        insights = await insights_service.extract_insights(str(request.website_url), db)
+        insights = await insights_service.extract_insights(str(request.website_url), db, max_age)
         return insights
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.post("/insights/batch", response_class=StreamingResponse)
+async def fetch_batch_insights(
+    request: BatchInsightsRequest,
+    http_client: httpx.AsyncClient = Depends(get_http_client)
+):
+    """
+    Extract insights for many stores in one call.
+    
+    URLs are deduplicated by base URL and results are streamed as NDJSON, one
+    line per store in the order the stores finish: a `BrandInsightsResponse`, or
+    a `BatchInsightsError` with status `failed` when no insights could be stored.
+    """
+    batch_service = BatchInsightsService(http_client)
+    website_urls = batch_service.dedupe_urls([str(url) for url in request.website_urls])
+    
+    async def ndjson_lines():
+        async for insights in batch_service.stream_insights(website_urls):
+            yield insights.model_dump_json() + "\n"
+    
+    return StreamingResponse(ndjson_lines(), media_type="application/x-ndjson")
+
+@router.post("/insights/detect", response_class=StreamingResponse)
+async def detect_shopify_stores(
+    request: BatchInsightsRequest,
+    http_client: httpx.AsyncClient = Depends(get_http_client)
+):
+    """
+    Classify many websites as Shopify stores or not, without extracting insights.
+    
+    Results are streamed as NDJSON, one `ShopifyDetectionResponse` per line, in
+    the order the sites finish. Most stores are decided by their homepage
+    response headers alone.
+    """
+    batch_service = BatchInsightsService(http_client)
+    website_urls = batch_service.dedupe_urls([str(url) for url in request.website_urls])
+    
+    async def ndjson_lines():
+        async for detection in batch_service.stream_detections(website_urls):
+            yield detection.model_dump_json() + "\n"
+    
+    return StreamingResponse(ndjson_lines(), media_type="application/x-ndjson")
+
 @router.post("/insights/competitors", response_model=CompetitorAnalysisResponse)
 async def analyze_competitors(
     request: BrandInsightsRequest,
-    db: AsyncSession = Depends(get_db)
+    db: AsyncSession = Depends(get_db),
+    http_client: httpx.AsyncClient = Depends(get_http_client)
 ):
     """
     Analyze a brand and its competitors (Bonus feature).
     """
-    competitor_service = CompetitorService()
+    competitor_service = CompetitorService(http_client)
     try:
         analysis = await competitor_service.analyze_competitors(str(request.website_url), db)
         return analysis
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-@router.get("/insights/history", response_model=List[BrandInsightsResponse])
+FIELDS_DESCRIPTION = "Comma-separated BrandInsightsResponse fields to return; only those columns are loaded"
+
+@router.get("/insights/history", response_model=List[BrandInsightSummary])
 async def get_insights_history(
-    limit: int = 10,
-    db: AsyncSession = Depends(get_db)
+    response: Response,
+    limit: int = Query(10, ge=1, le=100),
+    cursor: Optional[str] = Query(None, description="X-Next-Cursor header of the previous page"),
+    fields: Optional[str] = Query(None, description=FIELDS_DESCRIPTION),
+    db: AsyncSession = Depends(get_db),
+    http_client: httpx.AsyncClient = Depends(get_http_client)
 ):
-    """Get history of analyzed websites"""
-    from sqlalchemy import select, desc
-    from app.core.database import BrandInsight
-    result = await db.execute(
-        select(BrandInsight)
-        .order_by(desc(BrandInsight.created_at))
-        .limit(limit)
-    )
-    insights = result.scalars().all()
-    insights_service = InsightsService()
-    return [insights_service._convert_to_response(insight) for insight in insights]
+    """
+    Get history of analyzed websites, newest first.
+    
+    Returns summaries unless `fields` is given. When more rows exist, the
+    `X-Next-Cursor` header carries the cursor for the next page.
+    """
+    insights_service = InsightsService(http_client)
+    selected_fields = insights_service.parse_fields(fields)
+    insights, next_cursor = await insights_service.get_history(db, limit, cursor, selected_fields)
+    headers = {"X-Next-Cursor": next_cursor} if next_cursor else {}
+    if selected_fields:
+        return JSONResponse(
+            content=jsonable_encoder([await insights_service._convert_selected(i, selected_fields, db) for i in insights]),
+            headers=headers
+        )
+    response.headers.update(headers)
+    return [insights_service._convert_to_summary(insight) for insight in insights]
 
 @router.get("/insights/{insight_id}", response_model=BrandInsightsResponse)
 async def get_insight_by_id(
     insight_id: int,
-    db: AsyncSession = Depends(get_db)
+    fields: Optional[str] = Query(None, description=FIELDS_DESCRIPTION),
+    db: AsyncSession = Depends(get_db),
+    http_client: httpx.AsyncClient = Depends(get_http_client)
 ):
     """Get specific insight by ID"""
+    insights_service = InsightsService(http_client)
+    selected_fields = insights_service.parse_fields(fields)
+    insight = await insights_service.get_insight(insight_id, db, selected_fields)
+    if not insight:
+        raise HTTPException(status_code=404, detail="Insight not found")
+    if selected_fields:
+        return JSONResponse(content=jsonable_encoder(await insights_service._convert_selected(insight, selected_fields, db)))
+    return await insights_service._convert_to_response(insight, db)
+
+@router.get("/insights/{insight_id}/similar", response_model=SimilarBrandsResponse)
+async def get_similar_insights(
+    insight_id: int,
+    k: int = Query(10, ge=1, le=settings.SIMILARITY_MAX_K),
+    db: AsyncSession = Depends(get_db)
+):
+    """Find the k stored brands most similar to this one"""
     from sqlalchemy import select
     from app.core.database import BrandInsight
+    similar = await similarity_index.most_similar(insight_id, k)
+    if similar is None:
+        raise HTTPException(status_code=404, detail="Insight not found or not yet completed")
     result = await db.execute(
-        select(BrandInsight).where(BrandInsight.id == insight_id)
+        select(BrandInsight.id, BrandInsight.website_url, BrandInsight.brand_name)
+        .where(BrandInsight.id.in_([brand_id for brand_id, _ in similar]))
     )
-    insight = result.scalar_one_or_none()
-    if not insight:
+    brands = {row.id: row for row in result}
+    return SimilarBrandsResponse(
+        id=insight_id,
+        similar=[
+            SimilarBrandSchema(
+                id=brand_id,
+                website_url=brands[brand_id].website_url,
+                brand_name=brands[brand_id].brand_name,
+                similarity_score=score
+            )
+            for brand_id, score in similar
+            if brand_id in brands
+        ]
+    )
+
+
+@router.get("/insights/{insight_id}/products", response_model=ProductPageResponse)
+async def get_insight_products(
+    insight_id: int,
+    product_type: Optional[str] = None,
+    vendor: Optional[str] = None,
+    min_price: Optional[float] = Query(None, ge=0),
+    max_price: Optional[float] = Query(None, ge=0),
+    sort: ProductSort = ProductSort.PRICE_ASC,
+    cursor: Optional[str] = None,
+    limit: int = Query(50, ge=1, le=settings.PRODUCTS_PAGE_LIMIT),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Page through a store's product catalog.
+    
+    Pass the returned `next_cursor` as `cursor` to fetch the following page.
+    """
+    product_service = ProductService()
+    catalog = await product_service.catalog_state(insight_id, db)
+    if catalog is None:
         raise HTTPException(status_code=404, detail="Insight not found")
-    insights_service = InsightsService()
-    return insights_service._convert_to_response(insight) 
\ No newline at end of file
+    return await product_service.list_products(
+        insight_id, db,
+        generation=catalog.generation,
+        has_products=catalog.has_products,
+        product_type=product_type,
+        vendor=vendor,
+        min_price=min_price,
+        max_price=max_price,
+        sort=sort,
+        cursor=cursor,
+        limit=limit
+    )
@@ -0,0 +1,31 @@
+from fastapi import APIRouter, Request
+from typing import Any, Dict
+
+from app.core.executor import parse_executor
+from app.core.http_client import get_pool_metrics
+from app.core.loop_monitor import loop_lag_monitor
+from app.services.insights_service import insights_flight
+from app.services.llm_cache import llm_cache
+from app.services.llm_gateway import llm_gateway
+from app.services.path_stats import path_stats
+from app.services.rate_limiter import host_rate_limiter
+from app.services.similarity import similarity_index
+from app.services.token_budget import token_budgeter
+
+router = APIRouter()
+
+@router.get("/metrics", response_model=Dict[str, Any])
+async def get_metrics(request: Request):
+    """Runtime metrics for sizing connection pools and limiters"""
+    return {
+        "http_pool": get_pool_metrics(request.app.state.http_client),
+        "llm_cache": llm_cache.metrics(),
+        "llm_gateway": llm_gateway.metrics(),
+        "llm_input": token_budgeter.metrics(),
+        "scraper_rate_limiter": host_rate_limiter.metrics(),
+        "path_stats": path_stats.metrics(),
+        "similarity_index": similarity_index.metrics(),
+        "insights_single_flight": insights_flight.metrics(),
+        "parse_executor": parse_executor.metrics(),
+        "event_loop": loop_lag_monitor.metrics()
+    }
@@ -0,0 +1,228 @@
+import json
+import struct
+import zlib
+from collections import Counter
+from typing import Any, Callable, Dict, Iterable, Optional, Set, Tuple
+import logging
+
+from sqlalchemy.dialects import mysql
+from sqlalchemy.orm import synonym
+from sqlalchemy.types import LargeBinary, TypeDecorator
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+try:
+    import zstandard
+    ZSTD_AVAILABLE = True
+except ImportError:
+    ZSTD_AVAILABLE = False
+
+# Compressed values start with MAGIC, which never begins valid text or JSON, so
+# values written before compression (or below the size threshold) stay readable.
+MAGIC = b'\x00SZ'
+FORMAT_VERSION = 1
+HEADER = struct.Struct('>3sBBI')  # magic, format version, codec, dictionary id (0 = none)
+
+CODEC_IDS = {'zlib': 1, 'zstd': 2}
+CODEC_NAMES = {codec_id: name for name, codec_id in CODEC_IDS.items()}
+
+ZLIB_MAX_DICTIONARY_BYTES = 32 * 1024
+
+
+def resolve_codec(preferred: Optional[str] = None) -> Optional[str]:
+    codec = (preferred or settings.COMPRESSION_CODEC).lower()
+    if codec == 'none':
+        return None
+    if codec == 'zstd' and not ZSTD_AVAILABLE:
+        return 'zlib'
+    if codec not in CODEC_IDS:
+        raise ValueError(f"Unknown compression codec: {codec}")
+    return codec
+
+
+class MissingDictionaryError(ValueError):
+    pass
+
+
+class DictionaryRegistry:
+    """Trained compression dictionaries by id."""
+
+    def __init__(self):
+        # Filled from the database at startup and every COMPRESSION_DICTIONARY_REFRESH seconds,
+        # never from attribute access, which runs on the event loop
+        self._dictionaries: Dict[int, Tuple[str, bytes]] = {}
+        self._active: Dict[str, int] = {}
+        # Loaded but not yet used for writing
+        self.pending: Set[int] = set()
+
+    def register(self, dictionary_id: int, codec: str, data: bytes, active: bool = True) -> None:
+        self._dictionaries[dictionary_id] = (codec, data)
+        if not active:
+            self.pending.add(dictionary_id)
+            return
+        self.pending.discard(dictionary_id)
+        if dictionary_id >= self._active.get(codec, 0):
+            self._active[codec] = dictionary_id
+
+    def __contains__(self, dictionary_id: int) -> bool:
+        return dictionary_id in self._dictionaries
+
+    def newest(self) -> int:
+        return max(self._dictionaries, default=0)
+
+    def get(self, dictionary_id: int) -> Tuple[str, bytes]:
+        try:
+            return self._dictionaries[dictionary_id]
+        except KeyError:
+            raise MissingDictionaryError(
+                f"Compression dictionary {dictionary_id} is not loaded yet; dictionaries trained after "
+                f"startup are picked up within COMPRESSION_DICTIONARY_REFRESH ({settings.COMPRESSION_DICTIONARY_REFRESH}s)"
+            )
+
+    def active(self, codec: str) -> Tuple[int, Optional[bytes]]:
+        dictionary_id = self._active.get(codec, 0)
+        if not dictionary_id:
+            return 0, None
+        return dictionary_id, self._dictionaries[dictionary_id][1]
+
+
+dictionary_registry = DictionaryRegistry()
+
+
+def is_compressed(value: bytes) -> bool:
+    return value[:len(MAGIC)] == MAGIC
+
+
+def compress(data: bytes, codec: Optional[str] = None, level: Optional[int] = None, use_dictionary: bool = True) -> bytes:
+    codec = resolve_codec(codec)
+    if codec is None or len(data) < settings.COMPRESSION_MIN_BYTES:
+        return data
+    level = settings.COMPRESSION_LEVEL if level is None else level
+    dictionary_id, dictionary = dictionary_registry.active(codec) if use_dictionary else (0, None)
+    if codec == 'zstd':
+        compressor = zstandard.ZstdCompressor(
+            level=level or 3,
+            dict_data=zstandard.ZstdCompressionDict(dictionary) if dictionary else None
+        )
+        payload = compressor.compress(data)
+    else:
+        compressor = zlib.compressobj(level or 6, zdict=dictionary) if dictionary else zlib.compressobj(level or 6)
+        payload = compressor.compress(data) + compressor.flush()
+    if len(payload) + HEADER.size >= len(data):
+        return data
+    return HEADER.pack(MAGIC, FORMAT_VERSION, CODEC_IDS[codec], dictionary_id) + payload
+
+
+def decompress(value: bytes) -> bytes:
+    if not is_compressed(value):
+        return value
+    _, version, codec_id, dictionary_id = HEADER.unpack_from(value)
+    if version != FORMAT_VERSION:
+        raise ValueError(f"Unsupported compression format version {version}")
+    codec = CODEC_NAMES.get(codec_id)
+    payload = value[HEADER.size:]
+    dictionary = dictionary_registry.get(dictionary_id)[1] if dictionary_id else None
+    if codec == 'zstd':
+        if not ZSTD_AVAILABLE:
+            raise RuntimeError("Value is zstd-compressed but the 'zstandard' package is not installed")
+        decompressor = zstandard.ZstdDecompressor(
+            dict_data=zstandard.ZstdCompressionDict(dictionary) if dictionary else None
+        )
+        return decompressor.decompress(payload)
+    if codec == 'zlib':
+        decompressor = zlib.decompressobj(zdict=dictionary) if dictionary else zlib.decompressobj()
+        return decompressor.decompress(payload) + decompressor.flush()
+    raise ValueError(f"Unknown compression codec id {codec_id}")
+
+
+def train_dictionary(samples: Iterable[bytes], codec: Optional[str] = None, size: Optional[int] = None) -> bytes:
+    codec = resolve_codec(codec) or 'zlib'
+    samples = [sample for sample in samples if sample]
+    size = size or settings.COMPRESSION_DICTIONARY_BYTES
+    if codec == 'zstd':
+        return zstandard.train_dictionary(size, samples).as_bytes()
+    # zlib has no trainer: use the lines shared by most samples, most common last
+    # because deflate reaches the end of the preset dictionary most cheaply.
+    size = min(size, ZLIB_MAX_DICTIONARY_BYTES)
+    counts = Counter()
+    for sample in samples:
+        counts.update(set(line.strip() for line in sample.splitlines() if len(line.strip()) > 20))
+    chosen = []
+    total = 0
+    for line, count in counts.most_common():
+        if count < 2 or total + len(line) + 1 > size:
+            break
+        chosen.append(line)
+        total += len(line) + 1
+    return b'\n'.join(reversed(chosen))
+
+
+def compress_text(value: str) -> bytes:
+    return compress(value.encode('utf-8'))
+
+
+def decompress_text(value: bytes) -> str:
+    return decompress(value).decode('utf-8')
+
+
+def compress_json(value: Any) -> bytes:
+    # Dictionaries are trained on policy and brand texts, which do not help catalogs
+    return compress(json.dumps(value, separators=(',', ':')).encode('utf-8'), use_dictionary=False)
+
+
+def decompress_json(value: bytes) -> Any:
+    return json.loads(decompress(value))
+
+
+class CompressedBinary(TypeDecorator):
+    """Compressed bytes as stored; see compressed_text and compressed_json for the decoded attributes."""
+    impl = LargeBinary
+    cache_ok = True
+
+    def load_dialect_impl(self, dialect):
+        if dialect.name == 'mysql':
+            return dialect.type_descriptor(mysql.LONGBLOB())
+        return dialect.type_descriptor(LargeBinary())
+
+    def process_result_value(self, value: Any, dialect) -> Optional[bytes]:
+        # Columns not yet migrated from TEXT/JSON hand back str
+        if value is None:
+            return None
+        return value.encode('utf-8') if isinstance(value, str) else bytes(value)
+
+
+class _Decompressed:
+    # Instance side of a compressed attribute: values are decompressed on first read, not while
+    # rows load, and kept until the stored bytes change. Assigning compresses right away.
+
+    def __init__(self, raw_attribute: str, encode: Callable[[Any], bytes], decode: Callable[[bytes], Any]):
+        self.raw_attribute = raw_attribute
+        self.cache_key = f"_decompressed{raw_attribute}"
+        self.encode = encode
+        self.decode = decode
+
+    def __get__(self, instance, owner):
+        if instance is None:
+            return self
+        raw = getattr(instance, self.raw_attribute)
+        cached = instance.__dict__.get(self.cache_key)
+        if cached is not None and cached[0] is raw:
+            return cached[1]
+        value = None if raw is None else self.decode(raw)
+        instance.__dict__[self.cache_key] = (raw, value)
+        return value
+
+    def __set__(self, instance, value) -> None:
+        raw = None if value is None else self.encode(value)
+        setattr(instance, self.raw_attribute, raw)
+        instance.__dict__[self.cache_key] = (raw, value)
+
+
+def compressed_text(raw_attribute: str):
+    return synonym(raw_attribute, descriptor=_Decompressed(raw_attribute, compress_text, decompress_text))
+
+
+def compressed_json(raw_attribute: str):
+    return synonym(raw_attribute, descriptor=_Decompressed(raw_attribute, compress_json, decompress_json))
@@ -8,6 +8,12 @@ class Settings(BaseSettings):
     
     # Google AI
     GOOGLE_API_KEY: Optional[str] = os.getenv("GOOGLE_API_KEY")
+    LLM_PROVIDER: str = "gemini"  # gemini, or fake for offline runs without an API key
+    LLM_COMBINED_EXTRACTION: bool = True  # brand context and FAQs from one request per store
+    
+    # LLM input budgets, in tokens estimated at 4 characters each, for text chosen from about and FAQ pages
+    LLM_ABOUT_TOKEN_BUDGET: int = 1500
+    LLM_FAQ_TOKEN_BUDGET: int = 2500
     
     # API
     API_V1_STR: str = "/api/v1"
@@ -20,9 +26,109 @@ class Settings(BaseSettings):
     RATE_LIMIT_REQUESTS: int = 100
     RATE_LIMIT_WINDOW: int = 3600  # 1 hour
     
+    # Outbound scraping politeness (requests per second)
+    SCRAPER_HOST_RATE: float = 4.0
+    SCRAPER_HOST_BURST: float = 8.0
+    SCRAPER_MIN_HOST_RATE: float = 0.25
+    SCRAPER_GLOBAL_RATE: float = 50.0
+    SCRAPER_GLOBAL_BURST: float = 100.0
+    SCRAPER_MAX_RETRIES: int = 2
+    SCRAPER_MAX_RETRY_AFTER: float = 30.0
+    
+    # Response size caps: HTML pages are truncated at MAX_PAGE_BYTES, larger JSON responses fail
+    MAX_PAGE_BYTES: int = 2097152  # 2 MB
+    MAX_JSON_BYTES: int = 16777216  # 16 MB
+    
     # Timeouts
     HTTP_TIMEOUT: int = 30
-    LLM_TIMEOUT: int = 60
+    LLM_TIMEOUT: int = 60  # per LLM call, including queueing and retries
+    
+    # LLM gateway: concurrency limit, retries and circuit breaker around provider calls
+    LLM_MAX_CONCURRENCY: int = 8
+    LLM_MAX_RETRIES: int = 2
+    LLM_RETRY_BACKOFF: float = 0.5  # seconds before the first retry, doubled per attempt with jitter
+    LLM_CIRCUIT_FAILURE_THRESHOLD: int = 5
+    LLM_CIRCUIT_RESET_SECONDS: float = 30.0
+    
+    # LLM response cache
+    LLM_CACHE_ENABLED: bool = True
+    LLM_CACHE_TTL: int = 604800  # 7 days
+    LLM_CACHE_MAX_MEMORY_ENTRIES: int = 1024
+    LLM_CACHE_MAX_DB_ENTRIES: int = 100000
+    
+    # Shared HTTP client pool
+    HTTP2_ENABLED: bool = True
+    HTTP_MAX_CONNECTIONS: int = 100
+    HTTP_MAX_KEEPALIVE_CONNECTIONS: int = 20
+    HTTP_MAX_REQUESTS_PER_HOST: int = 10
+    HTTP_KEEPALIVE_EXPIRY: float = 30.0
+    
+    # HTML parsing ("lxml" falls back to "html.parser" when lxml is not installed)
+    HTML_PARSER: str = "lxml"
+    
+    # CPU-bound page parsing, kept off the event loop ("process", "thread" or "inline")
+    PARSE_EXECUTOR: str = "process"
+    PARSE_WORKERS: int = 2
+    
+    # Event loop lag sampling
+    LOOP_LAG_INTERVAL: float = 0.1
+    LOOP_LAG_WARN_SECONDS: float = 0.25
+    
+    # Page discovery from robots.txt and sitemaps; hard-coded paths are only guessed for page types not found
+    DISCOVERY_ENABLED: bool = True
+    DISCOVERY_MAX_AGE: int = 604800  # 7 days
+    DISCOVERY_MAX_SITEMAPS: int = 5
+    MAX_SITEMAP_BYTES: int = 10485760  # 10 MB
+    
+    # Learned path probing: candidates ordered by observed hit rate, 404'd paths skipped per host
+    PATH_STATS_ENABLED: bool = True
+    PATH_PROBE_WAVE_SIZE: int = 2  # candidates probed at once before trying the next ones; 0 probes all
+    PATH_NEGATIVE_TTL: int = 604800  # 7 days
+    PATH_STATS_REFRESH: int = 300
+    
+    # Shopify detection: homepage headers, then /meta.json and /products.json, then a bounded homepage scan
+    SHOPIFY_SCAN_BYTES: int = 65536
+    SHOPIFY_PROBE_MAX_BYTES: int = 1048576  # 1 MB
+    
+    # Scraping concurrency
+    MAX_CONCURRENT_FETCHES_PER_STORE: int = 8
+    
+    # Background insight jobs
+    INSIGHTS_WORKERS: int = 4
+    JOB_LEASE_SECONDS: int = 300
+    JOB_POLL_INTERVAL: float = 2.0
+    JOB_MAX_ATTEMPTS: int = 3
+    JOB_RETRY_BACKOFF: float = 30.0  # seconds before the first retry, doubled on each further attempt
+    
+    # Batch insights
+    BATCH_MAX_URLS: int = 500
+    BATCH_CONCURRENCY: int = 10
+    BATCH_PER_HOST_CONCURRENCY: int = 1
+    DETECT_CONCURRENCY: int = 50  # sites checked at once by the Shopify detection endpoint
+    
+    # Competitor analysis
+    COMPETITOR_DEADLINE: float = 60.0
+    COMPETITOR_MAX_AGE: int = 86400  # reuse competitor scrapes and analyses younger than a day
+    
+    # Compressed storage of large BrandInsight columns ("zstd" falls back to "zlib" when zstandard is not installed)
+    COMPRESSION_CODEC: str = "zstd"  # zstd, zlib or none
+    COMPRESSION_LEVEL: Optional[int] = None  # codec default when unset
+    COMPRESSION_MIN_BYTES: int = 256
+    COMPRESSION_DICTIONARY_BYTES: int = 32768
+    COMPRESSION_DICTIONARY_REFRESH: float = 60.0  # how often dictionaries trained by the migration are picked up
+    
+    # Similar brands
+    SIMILARITY_MAX_K: int = 100
+    SIMILARITY_REFRESH_SECONDS: float = 60.0  # how often queries look for features stored by other processes
+    
+    # Product catalog pagination
+    PRODUCTS_PAGE_LIMIT: int = 250
+    PRODUCTS_PAGE_PREFETCH: int = 2
+    MAX_PRODUCTS_PER_STORE: int = 25000
+    
+    # Hero products: the featured collection's JSON on Shopify stores, else structured data and CSS on the homepage
+    HERO_COLLECTION: str = "frontpage"
+    HERO_PRODUCTS_LIMIT: int = 12
     
     class Config:
         env_file = ".env"
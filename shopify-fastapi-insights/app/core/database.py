@@ -1,32 +1,53 @@
+import asyncio
+import logging
+
 from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine, async_sessionmaker
 from sqlalchemy.orm import DeclarativeBase
-from sqlalchemy import Column, Integer, String, DateTime, Text, JSON, Float, Boolean
-from datetime import datetime
+from sqlalchemy import Column, Integer, BigInteger, String, DateTime, Text, JSON, Float, Double, Boolean, LargeBinary, Index, UniqueConstraint, or_, select
+from datetime import datetime, timedelta
 from typing import AsyncGenerator
 
 from app.core.config import settings
+from app.core.compression import CompressedBinary, compressed_json, compressed_text, dictionary_registry
+
+logger = logging.getLogger(__name__)
 
 class Base(DeclarativeBase):
     pass
 
 class BrandInsight(Base):
     __tablename__ = "brand_insights"
+    __table_args__ = (
+        # History keyset pagination
+        Index("ix_brand_insights_created_id", "created_at", "id"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     website_url = Column(String(500), nullable=False, index=True)
+    # Normalized scheme://host of website_url; one row per store
+    base_url = Column(String(500), nullable=True, unique=True)
     brand_name = Column(String(255), nullable=True)
     
-    # Product data
-    product_catalog = Column(JSON, nullable=True)
-    hero_products = Column(JSON, nullable=True)
+    # Large values are stored compressed in the underscored columns and decompressed on attribute access
+    # Product data: the catalog lives in the products table under catalog_generation; product_catalog
+    # only holds catalogs stored before that, until they are copied over
+    catalog_generation = Column(Integer, nullable=False, default=0)
+    _product_catalog = Column('product_catalog', CompressedBinary, nullable=True)
+    product_catalog = compressed_json('_product_catalog')
+    _hero_products = Column('hero_products', CompressedBinary, nullable=True)
+    hero_products = compressed_json('_hero_products')
     
     # Policies
-    privacy_policy = Column(Text, nullable=True)
-    refund_policy = Column(Text, nullable=True)
+    _privacy_policy = Column('privacy_policy', CompressedBinary, nullable=True)
+    privacy_policy = compressed_text('_privacy_policy')
+    _refund_policy = Column('refund_policy', CompressedBinary, nullable=True)
+    refund_policy = compressed_text('_refund_policy')
     
     # FAQ and context
-    faqs = Column(JSON, nullable=True)
-    brand_context = Column(Text, nullable=True)
+    _faqs = Column('faqs', CompressedBinary, nullable=True)
+    faqs = compressed_json('_faqs')
+    _brand_context = Column('brand_context', CompressedBinary, nullable=True)
+    brand_context = compressed_text('_brand_context')
     
     # Contact and social
     contact_details = Column(JSON, nullable=True)
@@ -35,23 +56,121 @@ class BrandInsight(Base):
     
     # Metadata
     is_shopify_store = Column(Boolean, default=False)
-    scraping_status = Column(String(50), default="pending")
+    shopify_signal = Column(String(100), nullable=True)
+    shopify_confidence = Column(Float, nullable=True)
+    scraping_status = Column(String(50), default="pending", index=True)
     error_message = Column(Text, nullable=True)
     
+    # Incremental refresh: {section: ISO timestamp} and {url: {etag, last_modified, content_hash}}
+    section_fetched_at = Column(JSON, nullable=True)
+    page_validators = Column(JSON, nullable=True)
+    # {page type: path} of the page each page-backed section was last stored from
+    section_pages = Column(JSON, nullable=True)
+    # {fetched_at, pages: {page type: [paths]}} found in robots.txt and sitemaps
+    discovered_pages = Column(JSON, nullable=True)
+    
+    # Background job lease
+    attempts = Column(Integer, default=0, nullable=False)
+    lease_owner = Column(String(100), nullable=True)
+    lease_expires_at = Column(DateTime, nullable=True)
+    # Freshness the queued job was asked for, and when a failed job may be retried
+    max_age = Column(Integer, nullable=True)
+    retry_at = Column(DateTime, nullable=True)
+    
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
+class Product(Base):
+    __tablename__ = "products"
+    __table_args__ = (
+        UniqueConstraint("brand_insight_id", "generation", "product_id", name="uq_products_generation_product"),
+        # Keyset pagination: every filter combination ends in (price, id)
+        Index("ix_products_generation_price", "brand_insight_id", "generation", "price", "id"),
+        Index("ix_products_generation_type_price", "brand_insight_id", "generation", "product_type", "price", "id"),
+        Index("ix_products_generation_vendor_price", "brand_insight_id", "generation", "vendor", "price", "id"),
+    )
+    
+    id = Column(Integer, primary_key=True)
+    brand_insight_id = Column(Integer, nullable=False)
+    # A new catalog is written under the next generation while the live one (BrandInsight.catalog_generation) is served
+    generation = Column(Integer, nullable=False, default=0)
+    product_id = Column(BigInteger, nullable=False)
+    
+    title = Column(String(500), nullable=False)
+    handle = Column(String(255), nullable=False)
+    vendor = Column(String(255), nullable=False)
+    product_type = Column(String(255), nullable=False)
+    # Double rather than Float: MySQL FLOAT is single precision and keyset cursors compare prices exactly
+    price = Column(Double, nullable=False, default=0.0)
+    url = Column(String(1000), nullable=False)
+    image_url = Column(String(1000), nullable=True)
+    description = Column(Text, nullable=True)
+    is_hero_product = Column(Boolean, default=False)
+
 class CompetitorAnalysis(Base):
     __tablename__ = "competitor_analysis"
     
     id = Column(Integer, primary_key=True, index=True)
-    brand_insight_id = Column(Integer, nullable=False)
+    brand_insight_id = Column(Integer, nullable=False, index=True)
     competitor_url = Column(String(500), nullable=False)
+    competitor_insight_id = Column(Integer, nullable=True)
+    # Copy of the competitor's insights, only on rows stored before competitor_insight_id
     competitor_insights = Column(JSON, nullable=True)
     similarity_score = Column(Float, nullable=True)
     
     created_at = Column(DateTime, default=datetime.utcnow)
 
+class BrandFeature(Base):
+    __tablename__ = "brand_features"
+    
+    brand_insight_id = Column(Integer, primary_key=True)
+    feature_version = Column(Integer, nullable=False)
+    
+    # float32 vectors, see app.services.similarity
+    product_types = Column(LargeBinary, nullable=False)
+    price_quantiles = Column(LargeBinary, nullable=False)
+    social_mask = Column(Integer, nullable=False, default=0)
+    title_terms = Column(LargeBinary, nullable=False)
+    
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+class LLMCacheEntry(Base):
+    __tablename__ = "llm_cache"
+    
+    cache_key = Column(String(64), primary_key=True)
+    method = Column(String(50), nullable=False)
+    response = Column(JSON, nullable=True)
+    
+    created_at = Column(DateTime, default=datetime.utcnow, index=True)
+    expires_at = Column(DateTime, nullable=False, index=True)
+
+class PathStat(Base):
+    """Probe outcomes of a candidate page path, per host and summed over every host (host '*')."""
+    __tablename__ = "path_stats"
+    __table_args__ = (
+        UniqueConstraint("host", "page_type", "path", name="uq_path_stats_host_type_path"),
+    )
+    
+    id = Column(Integer, primary_key=True)
+    host = Column(String(255), nullable=False)
+    page_type = Column(String(50), nullable=False)
+    path = Column(String(255), nullable=False)
+    hits = Column(Integer, default=0, nullable=False)
+    misses = Column(Integer, default=0, nullable=False)
+    # Negative cache: the path 404'd on this host and is not probed again until then
+    dead_until = Column(DateTime, nullable=True)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+class CompressionDictionary(Base):
+    __tablename__ = "compression_dictionaries"
+    
+    id = Column(Integer, primary_key=True)
+    codec = Column(String(20), nullable=False)
+    data = Column(LargeBinary(length=16 * 1024 * 1024), nullable=False)
+    sample_count = Column(Integer, nullable=False, default=0)
+    
+    created_at = Column(DateTime, default=datetime.utcnow)
+
 # Database engine and session
 engine = create_async_engine(
     settings.DATABASE_URL.replace("mysql+pymysql", "mysql+aiomysql"),
@@ -63,6 +182,38 @@ async_session_maker = async_sessionmaker(engine, class_=AsyncSession, expire_on_
 async def init_db():
     async with engine.begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
+    await load_compression_dictionaries()
+
+async def load_compression_dictionaries() -> int:
+    # Dictionary ids only grow, so only new ones and those still pending are read. A new
+    # dictionary is used for writing once every worker has had a refresh to load it.
+    settled = datetime.utcnow() - timedelta(seconds=settings.COMPRESSION_DICTIONARY_REFRESH)
+    async with async_session_maker() as session:
+        result = await session.execute(
+            select(CompressionDictionary)
+            .where(or_(
+                CompressionDictionary.id > dictionary_registry.newest(),
+                CompressionDictionary.id.in_(dictionary_registry.pending)
+            ))
+            .order_by(CompressionDictionary.id)
+        )
+        loaded = 0
+        for dictionary in result.scalars():
+            active = dictionary.created_at is None or dictionary.created_at <= settled
+            if dictionary.id not in dictionary_registry:
+                logger.info(f"Loaded compression dictionary {dictionary.id}")
+                loaded += 1
+            dictionary_registry.register(dictionary.id, dictionary.codec, dictionary.data, active=active)
+        return loaded
+
+async def refresh_compression_dictionaries() -> None:
+    # Picks up dictionaries trained by the migration after this process started
+    while True:
+        await asyncio.sleep(settings.COMPRESSION_DICTIONARY_REFRESH)
+        try:
+            await load_compression_dictionaries()
+        except Exception as e:
+            logger.warning(f"Could not refresh compression dictionaries: {e}")
 
 async def get_db() -> AsyncGenerator[AsyncSession, None]:
     async with async_session_maker() as session:
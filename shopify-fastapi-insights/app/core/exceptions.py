@@ -19,6 +19,20 @@ class ScrapingError(InsightsException):
     def __init__(self, message: str = "Error occurred during website scraping"):
         super().__init__(message, 500)
 
+class PageNotModified(InsightsException):
+    def __init__(self, url: str):
+        self.url = url
+        super().__init__(f"Page not modified: {url}", 304)
+
+class InvalidCursorError(InsightsException):
+    def __init__(self, message: str = "Invalid pagination cursor"):
+        super().__init__(message, 400)
+
+class InvalidFieldsError(InsightsException):
+    def __init__(self, fields):
+        self.fields = fields
+        super().__init__(f"Unknown fields: {', '.join(fields)}", 400)
+
 def setup_exception_handlers(app):
     @app.exception_handler(InsightsException)
     async def insights_exception_handler(request: Request, exc: InsightsException):
@@ -0,0 +1,84 @@
+import asyncio
+import functools
+import multiprocessing
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Dict, Optional, TypeVar
+import logging
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar('T')
+
+EXECUTOR_KINDS = ('process', 'thread', 'inline')
+
+
+class ParseExecutor:
+    """Runs CPU-bound parsing off the event loop ("process", "thread" or "inline")."""
+
+    def __init__(self, kind: Optional[str] = None, workers: Optional[int] = None):
+        self.kind = (kind or settings.PARSE_EXECUTOR).lower()
+        if self.kind not in EXECUTOR_KINDS:
+            raise ValueError(f"Unknown parse executor: {self.kind}")
+        self.workers = max(1, workers or settings.PARSE_WORKERS)
+        self._pool: Optional[Executor] = None
+        self.in_flight = 0
+        self.tasks = 0
+        self.failures = 0
+        self.total_seconds = 0.0
+        self.max_seconds = 0.0
+
+    def start(self) -> None:
+        if self._pool is not None or self.kind == 'inline':
+            return
+        if self.kind == 'process':
+            self._pool = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context('spawn'))
+        else:
+            self._pool = ThreadPoolExecutor(self.workers, thread_name_prefix='parse')
+        logger.info(f"Started {self.kind} parse executor with {self.workers} workers")
+
+    def shutdown(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown(wait=True, cancel_futures=True)
+            self._pool = None
+
+    async def run(self, fn: Callable[..., T], *args: Any) -> T:
+        started = time.perf_counter()
+        self.in_flight += 1
+        try:
+            if self.kind == 'inline':
+                return fn(*args)
+            self.start()
+            try:
+                return await asyncio.get_running_loop().run_in_executor(self._pool, functools.partial(fn, *args))
+            except BrokenProcessPool:
+                # A worker died (e.g. OOM on a huge page); replace the pool for later calls
+                logger.error("Parse worker process died, restarting the pool")
+                self._pool = None
+                raise
+        except Exception:
+            self.failures += 1
+            raise
+        finally:
+            elapsed = time.perf_counter() - started
+            self.in_flight -= 1
+            self.tasks += 1
+            self.total_seconds += elapsed
+            self.max_seconds = max(self.max_seconds, elapsed)
+
+    def metrics(self) -> Dict[str, Any]:
+        return {
+            'kind': self.kind,
+            'workers': self.workers,
+            'in_flight': self.in_flight,
+            'tasks': self.tasks,
+            'failures': self.failures,
+            'mean_task_ms': round(self.total_seconds / self.tasks * 1000, 3) if self.tasks else 0.0,
+            'max_task_ms': round(self.max_seconds * 1000, 3),
+        }
+
+
+parse_executor = ParseExecutor()
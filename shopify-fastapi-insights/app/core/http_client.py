@@ -0,0 +1,156 @@
+import asyncio
+import time
+from collections import OrderedDict, defaultdict
+from typing import Any, AsyncIterator, Callable, Dict
+import logging
+
+import httpx
+from fastapi import Request
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+try:
+    import h2  # noqa: F401
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+class _ReleasingStream(httpx.AsyncByteStream):
+    def __init__(self, stream: httpx.AsyncByteStream, release: Callable[[], None]):
+        self._stream = stream
+        self._release = release
+
+    async def __aiter__(self) -> AsyncIterator[bytes]:
+        async for chunk in self._stream:
+            yield chunk
+
+    async def aclose(self) -> None:
+        try:
+            await self._stream.aclose()
+        finally:
+            self._release()
+
+class HostLimitedTransport(httpx.AsyncBaseTransport):
+    """Caps concurrent requests per host on top of the global httpx pool limits."""
+
+    def __init__(
+        self,
+        transport: httpx.AsyncBaseTransport,
+        max_requests_per_host: int,
+        max_connections: int,
+        max_keepalive_connections: int,
+        keepalive_expiry: float
+    ):
+        self._transport = transport
+        self.max_requests_per_host = max_requests_per_host
+        self.max_connections = max_connections
+        self.max_keepalive_connections = max_keepalive_connections
+        self.keepalive_expiry = keepalive_expiry
+        self._semaphores: Dict[str, asyncio.Semaphore] = {}
+        self.in_flight: Dict[str, int] = defaultdict(int)
+        self.waiting: Dict[str, int] = defaultdict(int)
+        # Hosts with nothing in flight, by when their last response was closed, oldest first
+        self._released_at: "OrderedDict[str, float]" = OrderedDict()
+        self.total_requests = 0
+        self.peak_in_flight = 0
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        host = request.url.netloc.decode('ascii')
+        semaphore = self._semaphores.setdefault(host, asyncio.Semaphore(self.max_requests_per_host))
+        self.waiting[host] += 1
+        try:
+            await semaphore.acquire()
+        finally:
+            self.waiting[host] -= 1
+        self.in_flight[host] += 1
+        self._released_at.pop(host, None)
+        self.total_requests += 1
+        self.peak_in_flight = max(self.peak_in_flight, sum(self.in_flight.values()))
+        released = False
+
+        def release() -> None:
+            nonlocal released
+            if released:
+                return
+            released = True
+            self.in_flight[host] -= 1
+            semaphore.release()
+            self._forget_idle_host(host)
+
+        try:
+            response = await self._transport.handle_async_request(request)
+        except BaseException:
+            release()
+            raise
+        response.stream = _ReleasingStream(response.stream, release)
+        return response
+
+    def _forget_idle_host(self, host: str) -> None:
+        if self.in_flight[host] == 0:
+            self._released_at[host] = time.monotonic()
+            self._released_at.move_to_end(host)
+            self._expire_released()
+        if self.in_flight[host] == 0 and self.waiting[host] == 0:
+            self.in_flight.pop(host, None)
+            self.waiting.pop(host, None)
+            self._semaphores.pop(host, None)
+
+    def _expire_released(self) -> None:
+        cutoff = time.monotonic() - self.keepalive_expiry
+        while self._released_at and next(iter(self._released_at.values())) < cutoff:
+            self._released_at.popitem(last=False)
+
+    async def aclose(self) -> None:
+        await self._transport.aclose()
+
+    def metrics(self) -> Dict[str, Any]:
+        # Counted here rather than read from the pool. Past max_connections requests queue inside
+        # the pool (HTTP/1.1: one request per connection). Idle connections are estimated as one
+        # kept alive per host whose last response closed within keepalive_expiry.
+        self._expire_released()
+        in_flight = sum(self.in_flight.values())
+        active = min(in_flight, self.max_connections)
+        return {
+            'http2': settings.HTTP2_ENABLED and HTTP2_AVAILABLE,
+            'max_connections': self.max_connections,
+            'max_keepalive_connections': self.max_keepalive_connections,
+            'max_requests_per_host': self.max_requests_per_host,
+            'active_connections': active,
+            'idle_connections': min(len(self._released_at), self.max_keepalive_connections),
+            'queued_requests': sum(self.waiting.values()) + in_flight - active,
+            'utilisation': active / self.max_connections if self.max_connections else 0.0,
+            'in_flight_requests': in_flight,
+            'peak_in_flight_requests': self.peak_in_flight,
+            'total_requests': self.total_requests,
+            'hosts_in_flight': {host: count for host, count in self.in_flight.items() if count},
+            'hosts_waiting': {host: count for host, count in self.waiting.items() if count},
+        }
+
+def create_http_client() -> httpx.AsyncClient:
+    http2 = settings.HTTP2_ENABLED and HTTP2_AVAILABLE
+    if settings.HTTP2_ENABLED and not HTTP2_AVAILABLE:
+        logger.warning("HTTP/2 requested but the 'h2' package is not installed, falling back to HTTP/1.1")
+    limits = httpx.Limits(
+        max_connections=settings.HTTP_MAX_CONNECTIONS,
+        max_keepalive_connections=settings.HTTP_MAX_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry=settings.HTTP_KEEPALIVE_EXPIRY
+    )
+    transport = HostLimitedTransport(
+        httpx.AsyncHTTPTransport(http2=http2, limits=limits),
+        settings.HTTP_MAX_REQUESTS_PER_HOST,
+        settings.HTTP_MAX_CONNECTIONS,
+        settings.HTTP_MAX_KEEPALIVE_CONNECTIONS,
+        settings.HTTP_KEEPALIVE_EXPIRY
+    )
+    return httpx.AsyncClient(transport=transport, timeout=settings.HTTP_TIMEOUT)
+
+def get_pool_metrics(client: httpx.AsyncClient) -> Dict[str, Any]:
+    transport = client._transport
+    if isinstance(transport, HostLimitedTransport):
+        return transport.metrics()
+    return {}
+
+def get_http_client(request: Request) -> httpx.AsyncClient:
+    return request.app.state.http_client
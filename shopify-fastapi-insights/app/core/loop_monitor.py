@@ -0,0 +1,62 @@
+import asyncio
+from collections import deque
+from typing import Any, Deque, Dict, Optional
+import logging
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class LoopLagMonitor:
+    """Measures event loop lag as how late a periodic sleep wakes up."""
+
+    def __init__(self, interval: Optional[float] = None, window: int = 600):
+        self.interval = interval or settings.LOOP_LAG_INTERVAL
+        self._samples: Deque[float] = deque(maxlen=window)
+        self._task: Optional[asyncio.Task] = None
+        self.max_lag = 0.0
+        self.stalls = 0
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            started = loop.time()
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, loop.time() - started - self.interval)
+            self._samples.append(lag)
+            self.max_lag = max(self.max_lag, lag)
+            if lag >= settings.LOOP_LAG_WARN_SECONDS:
+                self.stalls += 1
+                logger.warning(f"Event loop blocked for {lag * 1000:.0f}ms")
+
+    def metrics(self) -> Dict[str, Any]:
+        samples = sorted(self._samples)
+
+        def percentile(fraction: float) -> float:
+            if not samples:
+                return 0.0
+            return round(samples[min(len(samples) - 1, int(fraction * len(samples)))] * 1000, 3)
+
+        return {
+            'running': self._task is not None,
+            'samples': len(samples),
+            'current_lag_ms': round(self._samples[-1] * 1000, 3) if self._samples else 0.0,
+            'p50_lag_ms': percentile(0.5),
+            'p99_lag_ms': percentile(0.99),
+            'max_lag_ms': round(self.max_lag * 1000, 3),
+            'stalls': self.stalls,
+        }
+
+
+loop_lag_monitor = LoopLagMonitor()
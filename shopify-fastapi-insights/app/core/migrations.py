@@ -0,0 +1,273 @@
+"""Upgrade an existing schema and move BrandInsight's large columns to compressed storage.
+
+    python -m app.core.migrations [--batch-size 200] [--train-dictionary] [--recompress] [--report]
+"""
+import argparse
+import asyncio
+import time
+from typing import Any, Dict, List, Optional, Tuple
+import logging
+
+from sqlalchemy import Table, UniqueConstraint, column, inspect, literal, select, table, text, update
+from sqlalchemy.engine import Connection
+from sqlalchemy.schema import CreateIndex, CreateTable
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from app.core import compression
+from app.core.compression import compress, decompress, dictionary_registry, is_compressed, train_dictionary
+from app.core.database import Base, CompressionDictionary, async_session_maker, engine, init_db
+
+logger = logging.getLogger(__name__)
+
+COMPRESSED_COLUMNS = ('product_catalog', 'hero_products', 'privacy_policy', 'refund_policy', 'faqs', 'brand_context')
+DICTIONARY_COLUMNS = ('privacy_policy', 'refund_policy', 'brand_context')
+
+# Columns whose type changed after their table was created, with the MySQL types they replace.
+# Compressed values are binary, so those columns become LONGBLOB before a worker writes one.
+# (SQLite stores price as 8-byte REAL either way, and accepts bytes in TEXT and JSON columns.)
+CHANGED_COLUMNS = (('products', 'price', ('float',)),) + tuple(
+    ('brand_insights', name, ('text', 'mediumtext', 'longtext', 'json', 'blob', 'mediumblob'))
+    for name in COMPRESSED_COLUMNS
+)
+
+# Indexes and unique constraints the models no longer have, by table and columns. The old unique
+# product id per store would reject a catalog staged under a new generation.
+OBSOLETE_INDEXES = {
+    'products': (
+        ('brand_insight_id', 'product_id'),
+        ('brand_insight_id', 'price', 'id'),
+        ('brand_insight_id', 'product_type', 'price', 'id'),
+        ('brand_insight_id', 'vendor', 'price', 'id'),
+    ),
+}
+
+# Untyped view of the table so values are read and written exactly as stored
+raw_insights = table('brand_insights', column('id'), *[column(name) for name in COMPRESSED_COLUMNS])
+
+
+def _to_bytes(value: Any) -> bytes:
+    return value.encode('utf-8') if isinstance(value, str) else bytes(value)
+
+
+def _default_sql(model_column, conn: Connection) -> Optional[str]:
+    default = model_column.default
+    if default is None or not default.is_scalar:
+        return None
+    return str(literal(default.arg, model_column.type).compile(dialect=conn.dialect, compile_kwargs={'literal_binds': True}))
+
+
+def _add_column_ddl(model_table: Table, model_column, conn: Connection) -> str:
+    ddl = f"ALTER TABLE {model_table.name} ADD COLUMN {model_column.name} {model_column.type.compile(dialect=conn.dialect)}"
+    value = _default_sql(model_column, conn)
+    if value is not None:
+        ddl += f" DEFAULT {value}"
+        if not model_column.nullable:
+            ddl += " NOT NULL"
+    return ddl
+
+
+def _index_ddl(model_table: Table) -> Dict[Tuple[str, ...], Any]:
+    # Unique constraints are added as unique indexes, built as text so the model table is left as declared
+    ddl = {tuple(c.name for c in index.columns): CreateIndex(index) for index in model_table.indexes}
+    for constraint in model_table.constraints:
+        if isinstance(constraint, UniqueConstraint):
+            names = tuple(c.name for c in constraint.columns)
+            name = constraint.name or f"uq_{model_table.name}_{'_'.join(names)}"
+            ddl[names] = text(f"CREATE UNIQUE INDEX {name} ON {model_table.name} ({', '.join(names)})")
+    return ddl
+
+
+def _drop_index_ddl(table_name: str, name: str, conn: Connection) -> Any:
+    if conn.dialect.name == 'mysql':
+        return text(f"ALTER TABLE {table_name} DROP INDEX {name}")
+    return text(f"DROP INDEX {name}")
+
+
+def _rebuild_sqlite_table(model_table: Table, existing: set, conn: Connection) -> List[Any]:
+    # SQLite cannot drop a unique constraint declared with its table, so the table is recreated;
+    # columns it did not have are filled with their defaults
+    old_name = f"_{model_table.name}_old"
+    values = {c.name: c.name if c.name in existing else _default_sql(c, conn) for c in model_table.columns}
+    values = {name: value for name, value in values.items() if value is not None}
+    return [
+        text(f"ALTER TABLE {model_table.name} RENAME TO {old_name}"),
+        CreateTable(model_table),
+        text(f"INSERT INTO {model_table.name} ({', '.join(values)}) SELECT {', '.join(values.values())} FROM {old_name}"),
+        text(f"DROP TABLE {old_name}"),
+        *[CreateIndex(index) for index in model_table.indexes],
+    ]
+
+
+def _schema_upgrades(conn: Connection) -> List[Any]:
+    # create_all only creates missing tables, so columns and indexes added to the models
+    # since a table was created are added here. Checked against the live schema each time.
+    inspector = inspect(conn)
+    upgrades = []
+    for model_table in Base.metadata.sorted_tables:
+        if not inspector.has_table(model_table.name):
+            continue
+        existing = {c['name'] for c in inspector.get_columns(model_table.name)}
+        indexes = {tuple(i['column_names']): i['name'] for i in inspector.get_indexes(model_table.name)}
+        constraints = {tuple(u['column_names']): u['name'] for u in inspector.get_unique_constraints(model_table.name)}
+        obsolete = OBSOLETE_INDEXES.get(model_table.name, ())
+        if conn.dialect.name == 'sqlite' and any(columns in constraints and columns not in indexes for columns in obsolete):
+            upgrades.extend(_rebuild_sqlite_table(model_table, existing, conn))
+            continue
+        for model_column in model_table.columns:
+            if model_column.name not in existing:
+                upgrades.append(text(_add_column_ddl(model_table, model_column, conn)))
+        for columns in obsolete:
+            name = indexes.get(columns) or constraints.get(columns)
+            if name:
+                upgrades.append(_drop_index_ddl(model_table.name, name, conn))
+        indexed = (set(indexes) | set(constraints)) - set(obsolete)
+        for columns, ddl in _index_ddl(model_table).items():
+            if columns not in indexed:
+                upgrades.append(ddl)
+    if conn.dialect.name not in ('mysql', 'sqlite'):
+        logger.warning(f"Convert {', '.join(COMPRESSED_COLUMNS)} to a binary type manually on {conn.dialect.name}")
+    if conn.dialect.name == 'mysql':
+        for table_name, column_name, old_types in CHANGED_COLUMNS:
+            if not inspector.has_table(table_name):
+                continue
+            reflected = {c['name']: c['type'] for c in inspector.get_columns(table_name)}
+            if column_name in reflected and type(reflected[column_name]).__name__.lower() in old_types:
+                model_column = Base.metadata.tables[table_name].c[column_name]
+                null = 'NULL' if model_column.nullable else 'NOT NULL'
+                upgrades.append(text(
+                    f"ALTER TABLE {table_name} MODIFY {column_name} {model_column.type.compile(dialect=conn.dialect)} {null}"
+                ))
+    return upgrades
+
+
+async def upgrade_schema(db_engine: AsyncEngine = engine) -> int:
+    async with db_engine.begin() as conn:
+        upgrades = await conn.run_sync(_schema_upgrades)
+        for statement in upgrades:
+            logger.info(f"Schema upgrade: {str(statement).strip()}")
+            await conn.execute(statement)
+    return len(upgrades)
+
+
+async def train_from_rows(sample_limit: int, db_engine: AsyncEngine = engine) -> Optional[int]:
+    async with db_engine.connect() as conn:
+        result = await conn.execute(
+            select(*[raw_insights.c[name] for name in DICTIONARY_COLUMNS])
+            .order_by(raw_insights.c.id.desc())
+            .limit(sample_limit)
+        )
+        samples = [decompress(_to_bytes(value)) for row in result for value in row if value]
+    if len(samples) < 10:
+        logger.warning(f"Only {len(samples)} samples stored, not training a dictionary")
+        return None
+    codec = compression.resolve_codec() or 'zlib'
+    data = train_dictionary(samples, codec)
+    async with async_session_maker() as db:
+        dictionary = CompressionDictionary(codec=codec, data=data, sample_count=len(samples))
+        db.add(dictionary)
+        await db.commit()
+        dictionary_registry.register(dictionary.id, codec, data)
+    logger.info(f"Trained {codec} dictionary {dictionary.id} ({len(data)} bytes) on {len(samples)} samples")
+    return dictionary.id
+
+
+async def compress_existing_rows(batch_size: int, recompress: bool = False, db_engine: AsyncEngine = engine) -> Dict[str, int]:
+    stats = {'rows': 0, 'values_compressed': 0, 'bytes_before': 0, 'bytes_after': 0}
+    last_id = 0
+    while True:
+        async with db_engine.begin() as conn:
+            result = await conn.execute(
+                select(raw_insights)
+                .where(raw_insights.c.id > last_id)
+                .order_by(raw_insights.c.id)
+                .limit(batch_size)
+            )
+            rows = result.all()
+            if not rows:
+                break
+            for row in rows:
+                values = {}
+                for name in COMPRESSED_COLUMNS:
+                    stored = row._mapping[name]
+                    if stored is None:
+                        continue
+                    stored = _to_bytes(stored)
+                    stats['bytes_before'] += len(stored)
+                    if is_compressed(stored) and not recompress:
+                        stats['bytes_after'] += len(stored)
+                        continue
+                    packed = compress(decompress(stored), use_dictionary=name in DICTIONARY_COLUMNS)
+                    stats['bytes_after'] += len(packed)
+                    if packed != stored:
+                        values[name] = packed
+                        stats['values_compressed'] += 1
+                if values:
+                    await conn.execute(update(raw_insights).where(raw_insights.c.id == row.id).values(**values))
+            stats['rows'] += len(rows)
+            last_id = rows[-1].id
+        logger.info(f"Compressed {stats['rows']} rows, {stats['bytes_before']} -> {stats['bytes_after']} bytes")
+    return stats
+
+
+async def report(sample_limit: int, db_engine: AsyncEngine = engine) -> List[Dict[str, Any]]:
+    async with db_engine.connect() as conn:
+        result = await conn.execute(select(raw_insights).order_by(raw_insights.c.id.desc()).limit(sample_limit))
+        values = [
+            (decompress(_to_bytes(row._mapping[name])), name in DICTIONARY_COLUMNS)
+            for row in result
+            for name in COMPRESSED_COLUMNS
+            if row._mapping[name]
+        ]
+    codecs = ['zlib'] + (['zstd'] if compression.ZSTD_AVAILABLE else [])
+    lines = []
+    for codec in codecs:
+        for use_dictionary in (False, True):
+            if use_dictionary and not dictionary_registry.active(codec)[0]:
+                continue
+            packed = [
+                compress(value, codec, use_dictionary=use_dictionary and dictionary_column)
+                for value, dictionary_column in values
+            ]
+            started = time.perf_counter()
+            for value in packed:
+                decompress(value)
+            elapsed = time.perf_counter() - started
+            raw_bytes = sum(len(value) for value, _ in values)
+            stored_bytes = sum(len(value) for value in packed)
+            lines.append({
+                'codec': codec,
+                'dictionary': use_dictionary,
+                'values': len(values),
+                'raw_bytes': raw_bytes,
+                'stored_bytes': stored_bytes,
+                'ratio': round(raw_bytes / stored_bytes, 2) if stored_bytes else 0.0,
+                'mean_read_us': round(elapsed / len(values) * 1e6, 1) if values else 0.0,
+            })
+    return lines
+
+
+async def main(args: argparse.Namespace) -> None:
+    await init_db()
+    await upgrade_schema()
+    if args.train_dictionary:
+        await train_from_rows(args.sample_limit)
+    if not args.report_only:
+        stats = await compress_existing_rows(args.batch_size, args.recompress)
+        print(f"rows={stats['rows']} values_compressed={stats['values_compressed']} "
+              f"bytes_before={stats['bytes_before']} bytes_after={stats['bytes_after']}")
+    if args.report or args.report_only:
+        for line in await report(args.sample_limit):
+            print(' '.join(f"{key}={value}" for key, value in line.items()))
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Upgrade the schema and compress BrandInsight's large columns in place")
+    parser.add_argument('--batch-size', type=int, default=200)
+    parser.add_argument('--sample-limit', type=int, default=1000, help="rows used for dictionary training and the report")
+    parser.add_argument('--train-dictionary', action='store_true')
+    parser.add_argument('--recompress', action='store_true', help="rewrite values that are already compressed")
+    parser.add_argument('--report', action='store_true', help="print size and read latency per codec afterwards")
+    parser.add_argument('--report-only', action='store_true', help="only print the report")
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(main(parser.parse_args()))
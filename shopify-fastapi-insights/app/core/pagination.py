@@ -0,0 +1,17 @@
+import base64
+import json
+from typing import Any, List
+
+from app.core.exceptions import InvalidCursorError
+
+def encode_cursor(values: List[Any]) -> str:
+    return base64.urlsafe_b64encode(json.dumps(values).encode('utf-8')).decode('ascii')
+
+def decode_cursor(cursor: str, size: int) -> List[Any]:
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+    except (ValueError, UnicodeError):
+        raise InvalidCursorError()
+    if not isinstance(values, list) or len(values) != size:
+        raise InvalidCursorError()
+    return values
@@ -3,6 +3,8 @@ from typing import List, Optional, Dict, Any
 from datetime import datetime
 from enum import Enum
 
+from app.core.config import settings
+
 class ScrapingStatus(str, Enum):
     PENDING = "pending"
     IN_PROGRESS = "in_progress"
@@ -21,6 +23,14 @@ class ProductSchema(BaseModel):
     description: Optional[str] = None
     is_hero_product: bool = False
 
+class ProductSort(str, Enum):
+    PRICE_ASC = "price"
+    PRICE_DESC = "-price"
+
+class ProductPageResponse(BaseModel):
+    items: List[ProductSchema] = []
+    next_cursor: Optional[str] = None
+
 class FAQSchema(BaseModel):
     question: str
     answer: str
@@ -47,6 +57,7 @@ class ImportantLinksSchema(BaseModel):
 class BrandInsightsRequest(BaseModel):
     website_url: HttpUrl
     include_competitors: bool = False
+    async_mode: bool = False
     
     @validator('website_url')
     def validate_url(cls, v):
@@ -55,6 +66,9 @@ class BrandInsightsRequest(BaseModel):
             raise ValueError('URL must start with http:// or https://')
         return v
 
+class BatchInsightsRequest(BaseModel):
+    website_urls: List[HttpUrl] = Field(..., min_length=1, max_length=settings.BATCH_MAX_URLS)
+
 class BrandInsightsResponse(BaseModel):
     id: int
     website_url: str
@@ -75,12 +89,45 @@ class BrandInsightsResponse(BaseModel):
     
     # Metadata
     is_shopify_store: bool = False
+    shopify_signal: Optional[str] = None
+    shopify_confidence: Optional[float] = None
     scraping_status: ScrapingStatus
     error_message: Optional[str] = None
     
     created_at: datetime
     updated_at: datetime
 
+class BrandInsightSummary(BaseModel):
+    id: int
+    website_url: str
+    brand_name: Optional[str] = None
+    is_shopify_store: bool = False
+    scraping_status: ScrapingStatus
+    error_message: Optional[str] = None
+    created_at: datetime
+    updated_at: datetime
+
+class BatchInsightsError(BaseModel):
+    website_url: str
+    scraping_status: ScrapingStatus = ScrapingStatus.FAILED
+    error_message: str
+
+class ShopifyDetectionResponse(BaseModel):
+    website_url: str
+    is_shopify_store: bool = False
+    signal: str
+    confidence: float
+    error_message: Optional[str] = None
+
+class InsightJobResponse(BaseModel):
+    id: int
+    website_url: str
+    scraping_status: ScrapingStatus
+    attempts: int = 0
+    error_message: Optional[str] = None
+    created_at: datetime
+    updated_at: datetime
+
 class CompetitorInsightsSchema(BaseModel):
     competitor_url: str
     insights: Optional[BrandInsightsResponse] = None
@@ -88,4 +135,14 @@ class CompetitorInsightsSchema(BaseModel):
 
 class CompetitorAnalysisResponse(BaseModel):
     brand_insights: BrandInsightsResponse
-    competitors: List[CompetitorInsightsSchema] = [] 
\ No newline at end of file
+    competitors: List[CompetitorInsightsSchema] = [] 
+
+class SimilarBrandSchema(BaseModel):
+    id: int
+    website_url: str
+    brand_name: Optional[str] = None
+    similarity_score: float
+
+class SimilarBrandsResponse(BaseModel):
+    id: int
+    similar: List[SimilarBrandSchema] = []
@@ -0,0 +1,88 @@
+import asyncio
+from collections import defaultdict
+from typing import AsyncIterator, Awaitable, Callable, Dict, List, TypeVar, Union
+import logging
+
+import httpx
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from app.core.config import settings
+from app.core.database import async_session_maker
+from app.models.schemas import BatchInsightsError, BrandInsightsResponse, ScrapingStatus, ShopifyDetectionResponse
+from app.services.insights_service import InsightsService
+from app.services.scraper import WebScraper
+from app.services.shopify_detector import SIGNAL_ERROR, ShopifyDetector
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar('T')
+
+class BatchInsightsService:
+    def __init__(self, http_client: httpx.AsyncClient, session_maker: async_sessionmaker = async_session_maker):
+        self.http_client = http_client
+        self.session_maker = session_maker
+        self.scraper = WebScraper(http_client)
+        self.shopify_detector = ShopifyDetector(self.scraper)
+    
+    def dedupe_urls(self, website_urls: List[str]) -> List[str]:
+        unique_urls: Dict[str, str] = {}
+        for website_url in website_urls:
+            unique_urls.setdefault(self.scraper.normalize_base_url(website_url), website_url)
+        return list(unique_urls.values())
+    
+    async def stream_insights(self, website_urls: List[str]) -> AsyncIterator[Union[BrandInsightsResponse, BatchInsightsError]]:
+        async for insights in self._stream(website_urls, self._extract, settings.BATCH_CONCURRENCY):
+            yield insights
+    
+    async def stream_detections(self, website_urls: List[str]) -> AsyncIterator[ShopifyDetectionResponse]:
+        async for detection in self._stream(website_urls, self._detect, settings.DETECT_CONCURRENCY):
+            yield detection
+    
+    async def _stream(self, website_urls: List[str], handler: Callable[[str], Awaitable[T]], concurrency: int) -> AsyncIterator[T]:
+        global_limit = asyncio.Semaphore(concurrency)
+        host_limits = defaultdict(lambda: asyncio.Semaphore(settings.BATCH_PER_HOST_CONCURRENCY))
+        
+        async def run(website_url: str) -> T:
+            async with host_limits[self.scraper.get_host_key(website_url)]:
+                async with global_limit:
+                    return await handler(website_url)
+        
+        tasks = [asyncio.create_task(run(website_url)) for website_url in website_urls]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                yield await next_done
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+    
+    async def _extract(self, website_url: str) -> Union[BrandInsightsResponse, BatchInsightsError]:
+        insights_service = InsightsService(self.http_client, self.session_maker)
+        try:
+            async with self.session_maker() as db:
+                return await insights_service.extract_insights(website_url, db)
+        except Exception as e:
+            logger.warning(f"Batch extraction failed for {website_url}: {e}")
+            error = BatchInsightsError(website_url=website_url, error_message=str(e))
+        try:
+            # A new session, so the failed row is read as committed rather than from the old identity map
+            async with self.session_maker() as db:
+                failed_insights = await insights_service._get_existing_insights(website_url, db)
+                if failed_insights is not None and failed_insights.scraping_status == ScrapingStatus.FAILED:
+                    return await insights_service._convert_to_response(failed_insights, db)
+        except Exception as e:
+            logger.warning(f"Could not read the failed insights of {website_url}: {e}")
+        return error
+    
+    async def _detect(self, website_url: str) -> ShopifyDetectionResponse:
+        try:
+            detection = await self.shopify_detector.detect(self.scraper.get_base_url(website_url))
+        except Exception as e:
+            logger.info(f"Shopify detection failed for {website_url}: {e}")
+            return ShopifyDetectionResponse(website_url=website_url, signal=SIGNAL_ERROR, confidence=0.0, error_message=str(e))
+        return ShopifyDetectionResponse(
+            website_url=website_url,
+            is_shopify_store=detection.is_shopify,
+            signal=detection.signal,
+            confidence=detection.confidence
+        )
@@ -1,29 +1,88 @@
 import asyncio
-from typing import List
+from datetime import datetime, timedelta
+from typing import List, Optional
 import logging
-from sqlalchemy.ext.asyncio import AsyncSession
+import httpx
+from sqlalchemy import select, desc
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
 
 from app.services.insights_service import InsightsService
 from app.services.llm_service import LLMService
-from app.models.schemas import CompetitorAnalysisResponse, CompetitorInsightsSchema
-from app.core.database import CompetitorAnalysis
+from app.services.similarity import BrandFeatures, build_features, similarity_index
+from app.models.schemas import BrandInsightsResponse, CompetitorAnalysisResponse, CompetitorInsightsSchema
+from app.core.config import settings
+from app.core.database import BrandInsight, CompetitorAnalysis, async_session_maker
 
 logger = logging.getLogger(__name__)
 
 class CompetitorService:
-    def __init__(self):
-        self.insights_service = InsightsService()
+    def __init__(self, http_client: httpx.AsyncClient, session_maker: async_sessionmaker = async_session_maker):
+        self.insights_service = InsightsService(http_client)
         self.llm_service = LLMService()
+        self.session_maker = session_maker
     
     async def analyze_competitors(self, website_url: str, db: AsyncSession) -> CompetitorAnalysisResponse:
         brand_insights = await self.insights_service.extract_insights(website_url, db)
-        competitors = await self._find_competitors(brand_insights, db)
+        competitors = await self._get_stored_analysis(brand_insights.id, db)
+        if competitors is None:
+            competitors = await self._find_competitors(brand_insights)
+            await self._store_analysis(brand_insights.id, competitors, db)
         return CompetitorAnalysisResponse(
             brand_insights=brand_insights,
             competitors=competitors
         )
     
-    async def _find_competitors(self, brand_insights, db: AsyncSession) -> List[CompetitorInsightsSchema]:
+    async def _get_stored_analysis(self, brand_insight_id: int, db: AsyncSession) -> Optional[List[CompetitorInsightsSchema]]:
+        cutoff = datetime.utcnow() - timedelta(seconds=settings.COMPETITOR_MAX_AGE)
+        result = await db.execute(
+            select(CompetitorAnalysis)
+            .where(
+                CompetitorAnalysis.brand_insight_id == brand_insight_id,
+                CompetitorAnalysis.created_at >= cutoff
+            )
+            .order_by(desc(CompetitorAnalysis.created_at), CompetitorAnalysis.id)
+        )
+        rows = result.scalars().all()
+        if not rows:
+            return None
+        latest = [row for row in rows if row.created_at == rows[0].created_at]
+        insight_ids = [row.competitor_insight_id for row in latest if row.competitor_insight_id is not None]
+        result = await db.execute(select(BrandInsight).where(BrandInsight.id.in_(insight_ids)))
+        stored = {row.id: await self.insights_service._convert_to_response(row, db) for row in result.scalars().all()}
+        competitors = []
+        for row in latest:
+            if row.competitor_insight_id is not None:
+                insights = stored.get(row.competitor_insight_id)
+            else:
+                insights = BrandInsightsResponse(**row.competitor_insights) if row.competitor_insights else None
+            if insights is None:
+                # Partial analyses from before they stopped being stored, or a deleted competitor
+                return None
+            competitors.append(CompetitorInsightsSchema(
+                competitor_url=row.competitor_url,
+                insights=insights,
+                similarity_score=row.similarity_score
+            ))
+        return competitors
+    
+    async def _store_analysis(self, brand_insight_id: int, competitors: List[CompetitorInsightsSchema], db: AsyncSession) -> None:
+        # Analyses cut short by the deadline or a failed scrape are not stored, so the next request retries them
+        if not competitors or any(competitor.insights is None for competitor in competitors):
+            return
+        created_at = datetime.utcnow()
+        db.add_all([
+            CompetitorAnalysis(
+                brand_insight_id=brand_insight_id,
+                competitor_url=competitor.competitor_url,
+                competitor_insight_id=competitor.insights.id,
+                similarity_score=competitor.similarity_score,
+                created_at=created_at
+            )
+            for competitor in competitors
+        ])
+        await db.commit()
+    
+    async def _find_competitors(self, brand_insights: BrandInsightsResponse) -> List[CompetitorInsightsSchema]:
         competitors = []
         try:
             industry = self._determine_industry(brand_insights.product_catalog)
@@ -31,26 +90,44 @@ class CompetitorService:
                 brand_insights.brand_name or "Unknown Brand",
                 industry
             )
-            for competitor_url in competitor_urls[:3]:
-                try:
-                    competitor_insights = await self.insights_service.extract_insights(competitor_url, db)
-                    similarity_score = self._calculate_similarity(brand_insights, competitor_insights)
-                    competitors.append(CompetitorInsightsSchema(
-                        competitor_url=competitor_url,
-                        insights=competitor_insights,
-                        similarity_score=similarity_score
-                    ))
-                except Exception as e:
-                    logger.warning(f"Could not analyze competitor {competitor_url}: {e}")
-                    competitors.append(CompetitorInsightsSchema(
-                        competitor_url=competitor_url,
-                        insights=None,
-                        similarity_score=None
-                    ))
+            tasks = {
+                asyncio.create_task(self._analyze_competitor(competitor_url, brand_insights)): competitor_url
+                for competitor_url in competitor_urls[:3]
+            }
+            if not tasks:
+                return competitors
+            done, pending = await asyncio.wait(tasks, timeout=settings.COMPETITOR_DEADLINE)
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+            for task, competitor_url in tasks.items():
+                if task in done and task.exception() is None:
+                    competitors.append(task.result())
+                    continue
+                if task in pending:
+                    logger.warning(f"Competitor {competitor_url} not analyzed within {settings.COMPETITOR_DEADLINE}s")
+                else:
+                    logger.warning(f"Could not analyze competitor {competitor_url}: {task.exception()}")
+                competitors.append(CompetitorInsightsSchema(
+                    competitor_url=competitor_url,
+                    insights=None,
+                    similarity_score=None
+                ))
         except Exception as e:
             logger.error(f"Error in competitor analysis: {e}")
         return competitors
     
+    async def _analyze_competitor(self, competitor_url: str, brand_insights: BrandInsightsResponse) -> CompetitorInsightsSchema:
+        async with self.session_maker() as db:
+            competitor_insights = await self.insights_service.extract_insights(
+                competitor_url, db, max_age=settings.COMPETITOR_MAX_AGE
+            )
+        return CompetitorInsightsSchema(
+            competitor_url=competitor_url,
+            insights=competitor_insights,
+            similarity_score=self._calculate_similarity(brand_insights, competitor_insights)
+        )
+    
     def _determine_industry(self, products) -> str:
         if not products:
             return "E-commerce"
@@ -64,32 +141,15 @@ class CompetitorService:
         else:
             return "E-commerce"
     
-    def _calculate_similarity(self, brand1, brand2) -> float:
+    def _calculate_similarity(self, brand1: BrandInsightsResponse, brand2: BrandInsightsResponse) -> float:
         try:
-            score = 0.0
-            if brand1.product_catalog and brand2.product_catalog:
-                types1 = set(p.product_type.lower() for p in brand1.product_catalog)
-                types2 = set(p.product_type.lower() for p in brand2.product_catalog)
-                intersection = len(types1.intersection(types2))
-                union = len(types1.union(types2))
-                if union > 0:
-                    score += (intersection / union) * 0.5
-            if brand1.product_catalog and brand2.product_catalog:
-                prices1 = [p.price for p in brand1.product_catalog if p.price > 0]
-                prices2 = [p.price for p in brand2.product_catalog if p.price > 0]
-                if prices1 and prices2:
-                    avg_price1 = sum(prices1) / len(prices1)
-                    avg_price2 = sum(prices2) / len(prices2)
-                    price_diff = abs(avg_price1 - avg_price2) / max(avg_price1, avg_price2)
-                    score += (1 - price_diff) * 0.3
-            social1 = brand1.social_handles.model_dump()
-            social2 = brand2.social_handles.model_dump()
-            social_platforms1 = set(k for k, v in social1.items() if v)
-            social_platforms2 = set(k for k, v in social2.items() if v)
-            if social_platforms1 or social_platforms2:
-                social_similarity = len(social_platforms1.intersection(social_platforms2)) / len(social_platforms1.union(social_platforms2))
-                score += social_similarity * 0.2
-            return min(score, 1.0)
+            return similarity_index.score_pair(self._features(brand1), self._features(brand2))
         except Exception as e:
             logger.error(f"Error calculating similarity: {e}")
-            return 0.0 
\ No newline at end of file
+            return 0.0
+    
+    def _features(self, brand: BrandInsightsResponse) -> BrandFeatures:
+        return build_features(
+            [p.model_dump() for p in brand.product_catalog],
+            brand.social_handles.model_dump()
+        )
@@ -0,0 +1,96 @@
+import re
+from typing import Iterable, NamedTuple, Optional
+from urllib.parse import urljoin
+
+from app.models.schemas import ContactDetailsSchema, SocialHandlesSchema, ImportantLinksSchema
+from app.services.parsed_page import Anchor, ParsedPage
+
+EMAIL_REGEX = re.compile(r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}\b')
+PHONE_REGEX = re.compile(r'(\+?\d{1,3}[-.\s]?)?\(?\d{3}\)?[-.\s]?\d{3}[-.\s]?\d{4}')
+
+SOCIAL_PATTERNS = {
+    'instagram': r'instagram\.com/([^/\s]+)',
+    'facebook': r'facebook\.com/([^/\s]+)',
+    'twitter': r'(?:twitter\.com|x\.com)/([^/\s]+)',
+    'tiktok': r'tiktok\.com/@([^/\s]+)',
+    'youtube': r'youtube\.com/(?:channel/|user/|c/)?([^/\s]+)',
+    'pinterest': r'pinterest\.com/([^/\s]+)'
+}
+
+LINK_PATTERNS = {
+    'order_tracking': r'track|tracking|order.*status',
+    'contact_us': r'contact|support|help',
+    'blogs': r'blog|news|article',
+    'shipping_info': r'shipping|delivery',
+    'size_guide': r'size.*guide|sizing'
+}
+
+# Emails and phones, and each platform, keep their own pass: in a merged alternation
+# one match consumes text another pattern would have matched (a phone number in an
+# email's local part, a handle that contains another platform's URL).
+SOCIAL_REGEXES = {platform: re.compile(pattern, re.IGNORECASE) for platform, pattern in SOCIAL_PATTERNS.items()}
+LINK_REGEXES = {key: re.compile(pattern, re.IGNORECASE) for key, pattern in LINK_PATTERNS.items()}
+# Matches wherever any link pattern does, so anchors matching none are rejected in one scan
+ANY_LINK_REGEX = re.compile('|'.join(f'(?:{pattern})' for pattern in LINK_PATTERNS.values()), re.IGNORECASE)
+
+
+class ExtractionResult(NamedTuple):
+    contact_details: ContactDetailsSchema
+    social_handles: SocialHandlesSchema
+    important_links: ImportantLinksSchema
+
+
+class ExtractionEngine:
+    """Contact, social and link extraction with every pattern compiled once."""
+
+    def extract(self, page: ParsedPage, base_url: str) -> ExtractionResult:
+        return ExtractionResult(
+            contact_details=self.extract_contact_details(page.text, page.anchors),
+            social_handles=self.extract_social_handles(page.html),
+            important_links=self.extract_important_links(page.anchors, base_url)
+        )
+
+    def extract_contact_details(self, text: str, anchors: Iterable[Anchor]) -> ContactDetailsSchema:
+        emails = set(EMAIL_REGEX.findall(text))
+        phones = set(PHONE_REGEX.findall(text))
+        for anchor in anchors:
+            if anchor.href.startswith('mailto:'):
+                emails.add(anchor.href.replace('mailto:', '').split('?')[0])
+            elif anchor.href.startswith('tel:'):
+                phones.add(anchor.href.replace('tel:', ''))
+        return ContactDetailsSchema(
+            emails=list(emails),
+            phones=list(phones)
+        )
+
+    def extract_social_handles(self, html: str) -> SocialHandlesSchema:
+        social_handles = {}
+        for platform, regex in SOCIAL_REGEXES.items():
+            match = regex.search(html)
+            if match:
+                social_handles[platform] = f"https://{platform}.com/{match.group(1)}"
+        return SocialHandlesSchema(**social_handles)
+
+    def extract_important_links(self, anchors: Iterable[Anchor], base_url: str) -> ImportantLinksSchema:
+        important_links = {}
+        for anchor in anchors:
+            if len(important_links) == len(LINK_PATTERNS):
+                break
+            if not ANY_LINK_REGEX.search(anchor.text):
+                continue
+            key = self._first_unassigned(anchor.text, important_links)
+            if key:
+                href = anchor.href
+                if href.startswith('/'):
+                    href = urljoin(base_url, href)
+                important_links[key] = href
+        return ImportantLinksSchema(**important_links)
+
+    def _first_unassigned(self, link_text: str, important_links: dict) -> Optional[str]:
+        for key, regex in LINK_REGEXES.items():
+            if regex.search(link_text) and key not in important_links:
+                return key
+        return None
+
+
+extraction_engine = ExtractionEngine()
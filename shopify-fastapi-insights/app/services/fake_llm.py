@@ -0,0 +1,57 @@
+"""Deterministic stand-in for the Gemini model, selected with LLM_PROVIDER=fake."""
+import asyncio
+import json
+import re
+from typing import List, Optional
+
+SENTENCE_REGEX = re.compile(r'(?<=[.!?])\s+')
+QA_PREFIX_REGEX = re.compile(r'^(?:q(?:uestion)?|a(?:nswer)?)\s*[:.]\s*', re.IGNORECASE)
+
+
+class FakeResponse:
+    def __init__(self, text: str):
+        self.text = text
+        self.parts = [text] if text else []
+
+
+class FakeGenerativeModel:
+    """Mirrors ``generate_content_async`` of ``genai.GenerativeModel``."""
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.calls = 0
+
+    async def generate_content_async(self, prompt: str) -> FakeResponse:
+        self.calls += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if '### ABOUT' in prompt and '### FAQ' in prompt:
+            about, faq = prompt.split('### ABOUT', 1)[1].split('### FAQ', 1)
+            return FakeResponse(json.dumps({
+                'brand_context': self._summarize(about),
+                'faqs': self._faqs(faq),
+            }))
+        if 'question-and-answer' in prompt:
+            return FakeResponse(json.dumps({'faqs': self._faqs(prompt.split('Text to analyze:', 1)[-1])}))
+        if 'brand analyst' in prompt:
+            return FakeResponse(self._summarize(prompt.split('Text:', 1)[-1]) or '')
+        if 'competitors' in prompt:
+            return FakeResponse('[]')
+        return FakeResponse('')
+
+    def _summarize(self, text: str) -> Optional[str]:
+        text = ' '.join(text.split())
+        if not text:
+            return None
+        return ' '.join(SENTENCE_REGEX.split(text)[:2])
+
+    def _faqs(self, text: str) -> List[dict]:
+        lines = [line.strip() for line in text.splitlines() if line.strip()]
+        faqs = []
+        for question, answer in zip(lines, lines[1:]):
+            if question.endswith('?') and not answer.endswith('?'):
+                faqs.append({
+                    'question': QA_PREFIX_REGEX.sub('', question),
+                    'answer': QA_PREFIX_REGEX.sub('', answer),
+                })
+        return faqs
@@ -1,165 +1,735 @@
 import httpx
 import asyncio
-from typing import List, Optional
+import os
+import socket
+import uuid
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, List, NamedTuple, Optional, Tuple
 from urllib.parse import urljoin
 import logging
-from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+from sqlalchemy import select, update, or_, and_
+from sqlalchemy.orm import load_only
 
 from app.services.scraper import WebScraper
+from app.services.parsed_page import ParsedPage
 from app.services.llm_service import LLMService
-from app.models.schemas import BrandInsightsResponse, ScrapingStatus
-from app.core.database import BrandInsight
-from app.core.exceptions import WebsiteNotFoundError, ScrapingError
+from app.services.page_discovery import PageDiscovery
+from app.services.path_stats import path_stats
+from app.services.product_service import ProductService
+from app.services.shopify_detector import ShopifyDetector
+from app.services.token_budget import token_budgeter
+from app.services.similarity import similarity_index
+from app.services.single_flight import SingleFlight
+from app.models.schemas import (
+    BrandInsightsResponse, BrandInsightSummary, ScrapingStatus, ProductSchema, FAQSchema,
+    ContactDetailsSchema, SocialHandlesSchema, ImportantLinksSchema
+)
+from app.core.database import BrandInsight, async_session_maker
+from app.core.exceptions import WebsiteNotFoundError, ScrapingError, PageNotModified, InvalidFieldsError, InvalidCursorError
+from app.core.pagination import encode_cursor, decode_cursor
+from app.core.config import settings
 
 logger = logging.getLogger(__name__)
 
+# Independently refreshable parts of a BrandInsight; 'homepage' covers every field parsed from it
+SECTIONS = ('homepage', 'product_catalog', 'privacy_policy', 'refund_policy', 'brand_context', 'faqs')
+
+# Paths guessed for a page type when discovery found no page of that type
+GUESSED_PATHS = {
+    'privacy': ['/policies/privacy-policy', '/pages/privacy-policy', '/privacy-policy', '/privacy'],
+    'refund': ['/policies/refund-policy', '/pages/refund-policy', '/pages/return-policy', '/refund-policy', '/returns'],
+    'about': ['/pages/about', '/pages/about-us', '/about', '/about-us', '/pages/our-story'],
+    'faq': [
+        '/pages/faq', '/faq', '/pages/faqs', '/faqs',
+        '/pages/help', '/help', '/pages/support', '/support',
+        '/pages/questions', '/questions'
+    ],
+}
+
+# Sections whose pages are found by discovery, and the page type each is read from
+SECTION_PAGE_TYPES = {'privacy_policy': 'privacy', 'refund_policy': 'refund', 'brand_context': 'about', 'faqs': 'faq'}
+DISCOVERED_SECTIONS = tuple(SECTION_PAGE_TYPES)
+
+# important_links fields filled from discovered pages when the homepage has no such link
+DISCOVERED_LINKS = {'shipping_info': 'shipping', 'contact_us': 'contact', 'order_tracking': 'tracking'}
+
+# Marker returned by section extractors when the source pages are unchanged since the last scrape
+UNCHANGED = object()
+
+RESPONSE_FIELDS = tuple(BrandInsightsResponse.model_fields)
+SUMMARY_FIELDS = tuple(BrandInsightSummary.model_fields)
+
+class ProbedPage(NamedTuple):
+    path: str
+    url: str
+    content: Any
+    validator: Optional[Dict]
+
+class StagedCatalog(NamedTuple):
+    # A catalog written to the products table under a generation that is not live yet
+    generation: int
+    count: int
+
+class PageSources:
+    # Pages the page-backed sections were stored from, and the pages found for them in this run.
+    # A page's validators are recorded only once content read from it is stored.
+    def __init__(self, base_url: str, section_pages: Optional[Dict[str, str]], validators: Dict[str, Dict]):
+        self.base_url = base_url
+        self.paths = dict(section_pages or {})
+        self.validators = validators
+        self.found: Dict[str, ProbedPage] = {}
+    
+    def previous(self, page_type: str) -> Tuple[Optional[str], Optional[Dict]]:
+        path = self.paths.get(page_type)
+        if not path:
+            return None, None
+        return path, self.validators.get(urljoin(self.base_url, path))
+    
+    def keep(self, page_type: str) -> None:
+        page = self.found.get(page_type)
+        if page is None:
+            return
+        previous_path = self.paths.get(page_type)
+        if previous_path and previous_path != page.path:
+            self.validators.pop(urljoin(self.base_url, previous_path), None)
+        self.paths[page_type] = page.path
+        if page.validator:
+            self.validators[page.url] = page.validator
+
+# Identifies this process in BrandInsight leases
+WORKER_ID = f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:8]}"
+
+# Concurrent extractions of one store within this process share a single scrape
+insights_flight: SingleFlight[BrandInsightsResponse] = SingleFlight()
+
 class InsightsService:
-    def __init__(self):
-        self.scraper = WebScraper()
+    def __init__(self, http_client: httpx.AsyncClient, session_maker: async_sessionmaker = async_session_maker):
+        self.scraper = WebScraper(http_client)
         self.llm_service = LLMService()
+        self.product_service = ProductService()
+        self.page_discovery = PageDiscovery(self.scraper)
+        self.shopify_detector = ShopifyDetector(self.scraper)
+        self.session_maker = session_maker
+        self.lease = timedelta(seconds=settings.JOB_LEASE_SECONDS)
     
-    async def extract_insights(self, website_url: str, db: AsyncSession) -> BrandInsightsResponse:
+    async def extract_insights(self, website_url: str, db: AsyncSession, max_age: Optional[int] = None) -> BrandInsightsResponse:
         existing_insights = await self._get_existing_insights(website_url, db)
         if existing_insights and existing_insights.scraping_status == ScrapingStatus.COMPLETED:
-            return self._convert_to_response(existing_insights)
-        db_insights = existing_insights or BrandInsight(
-            website_url=website_url,
-            scraping_status=ScrapingStatus.IN_PROGRESS
+            if not self._needs_refresh(existing_insights, max_age):
+                return await self._convert_to_response(existing_insights, db)
+        # The shared extraction gets its own session so it outlives a disconnecting leader
+        return await insights_flight.do(
+            self.scraper.normalize_base_url(website_url),
+            lambda: self._extract_in_new_session(website_url, max_age)
+        )
+    
+    async def _extract_in_new_session(self, website_url: str, max_age: Optional[int]) -> BrandInsightsResponse:
+        async with self.session_maker() as db:
+            return await self._extract_with_lease(website_url, db, max_age)
+    
+    async def _extract_with_lease(self, website_url: str, db: AsyncSession, max_age: Optional[int]) -> BrandInsightsResponse:
+        # The lease on the row coordinates processes; losers wait for the holder instead of scraping again
+        while True:
+            db_insights = await self._get_or_create_insights(website_url, db)
+            if db_insights.scraping_status == ScrapingStatus.COMPLETED and not self._needs_refresh(db_insights, max_age):
+                return await self._convert_to_response(db_insights, db)
+            if await self._claim(db_insights, db):
+                break
+            await self._wait_for_lease(db_insights.id, db)
+        heartbeat = asyncio.create_task(self.keep_lease(db_insights.id))
+        try:
+            return await self.run_extraction(db_insights, db, max_age)
+        finally:
+            heartbeat.cancel()
+            await asyncio.gather(heartbeat, return_exceptions=True)
+            db_insights.lease_owner = None
+            db_insights.lease_expires_at = None
+            await db.commit()
+    
+    def _unleased(self, now: datetime):
+        return or_(
+            BrandInsight.scraping_status != ScrapingStatus.IN_PROGRESS,
+            BrandInsight.lease_expires_at.is_(None),
+            BrandInsight.lease_expires_at < now
+        )
+    
+    async def _claim(self, db_insights: BrandInsight, db: AsyncSession) -> bool:
+        now = datetime.utcnow()
+        claimed = await db.execute(
+            update(BrandInsight)
+            .where(BrandInsight.id == db_insights.id, self._unleased(now))
+            .values(
+                scraping_status=ScrapingStatus.IN_PROGRESS,
+                error_message=None,
+                lease_owner=WORKER_ID,
+                lease_expires_at=now + self.lease
+            )
+            .execution_options(synchronize_session=False)
         )
-        if not existing_insights:
-            db.add(db_insights)
-        else:
-            db_insights.scraping_status = ScrapingStatus.IN_PROGRESS
-            db_insights.error_message = None
         await db.commit()
+        if claimed.rowcount != 1:
+            return False
+        await db.refresh(db_insights)
+        return True
+    
+    async def keep_lease(self, insight_id: int) -> None:
+        while True:
+            await asyncio.sleep(self.lease.total_seconds() / 3)
+            async with self.session_maker() as db:
+                await db.execute(
+                    update(BrandInsight)
+                    .where(BrandInsight.id == insight_id, BrandInsight.lease_owner == WORKER_ID)
+                    .values(lease_expires_at=datetime.utcnow() + self.lease)
+                    .execution_options(synchronize_session=False)
+                )
+                await db.commit()
+    
+    async def _wait_for_lease(self, insight_id: int, db: AsyncSession) -> None:
+        logger.info(f"Insight {insight_id} is being extracted elsewhere, waiting for it")
+        while True:
+            await asyncio.sleep(settings.JOB_POLL_INTERVAL)
+            await db.rollback()
+            db_insights = await db.get(BrandInsight, insight_id, populate_existing=True)
+            if db_insights is None or db_insights.scraping_status != ScrapingStatus.IN_PROGRESS:
+                return
+            if db_insights.lease_expires_at is None or db_insights.lease_expires_at < datetime.utcnow():
+                return
+    
+    async def enqueue_insights(self, website_url: str, db: AsyncSession, max_age: Optional[int] = None) -> BrandInsight:
+        db_insights = await self._get_or_create_insights(website_url, db)
+        if db_insights.scraping_status in (ScrapingStatus.PENDING, ScrapingStatus.IN_PROGRESS):
+            return db_insights
+        if db_insights.scraping_status == ScrapingStatus.COMPLETED and not self._needs_refresh(db_insights, max_age):
+            return db_insights
+        db_insights.scraping_status = ScrapingStatus.PENDING
+        db_insights.error_message = None
+        db_insights.attempts = 0
+        db_insights.max_age = max_age
+        db_insights.retry_at = None
+        await db.commit()
+        return db_insights
+    
+    def _needs_refresh(self, db_insights: BrandInsight, max_age: Optional[int]) -> bool:
+        if max_age is None:
+            return False
+        fetched_at = db_insights.section_fetched_at or {}
+        return any(self._is_stale(fetched_at.get(section), max_age) for section in SECTIONS)
+    
+    def _is_stale(self, fetched_at: Optional[str], max_age: Optional[int]) -> bool:
+        if max_age is None or not fetched_at:
+            return True
+        return datetime.utcnow() - datetime.fromisoformat(fetched_at) > timedelta(seconds=max_age)
+    
+    async def run_extraction(self, db_insights: BrandInsight, db: AsyncSession, max_age: Optional[int] = None) -> BrandInsightsResponse:
+        website_url = db_insights.website_url
+        discovery = None
         try:
             base_url = self.scraper.get_base_url(website_url)
-            async with httpx.AsyncClient() as client:
-                homepage_soup = await self.scraper.get_soup(base_url, client)
-                is_shopify = self.scraper.is_shopify_store(homepage_soup)
-                contact_details = self.scraper.extract_contact_details(homepage_soup)
-                social_handles = self.scraper.extract_social_handles(homepage_soup)
-                important_links = self.scraper.extract_important_links(homepage_soup, base_url)
-                product_catalog = []
-                hero_products = []
-                if is_shopify:
-                    product_catalog = await self.scraper.fetch_product_catalog(base_url, client)
-                hero_products = await self.scraper.extract_hero_products(homepage_soup, base_url)
-                privacy_policy = await self._extract_page_content(base_url, 'privacy', client)
-                refund_policy = await self._extract_page_content(base_url, 'refund', client)
-                brand_context = await self._extract_brand_context(base_url, client)
-                faqs = await self._extract_faqs(base_url, client)
-                db_insights.brand_name = self._extract_brand_name(homepage_soup)
-                db_insights.product_catalog = [p.model_dump() for p in product_catalog]
-                db_insights.hero_products = [p.model_dump() for p in hero_products]
-                db_insights.privacy_policy = privacy_policy
-                db_insights.refund_policy = refund_policy
-                db_insights.faqs = [f.model_dump() for f in faqs]
-                db_insights.brand_context = brand_context
+            semaphore = asyncio.Semaphore(settings.MAX_CONCURRENT_FETCHES_PER_STORE)
+            validators = dict(db_insights.page_validators or {})
+            sources = PageSources(base_url, db_insights.section_pages, validators)
+            fetched_at = dict(db_insights.section_fetched_at or {})
+            stale_sections = [s for s in SECTIONS if self._is_stale(fetched_at.get(s), max_age)]
+            homepage = UNCHANGED
+            if 'homepage' in stale_sections:
+                homepage = await self._get_page_unless_unchanged(base_url, validators)
+            if homepage is UNCHANGED:
+                is_shopify = bool(db_insights.is_shopify_store)
+            else:
+                # Parsed in the executor while detection checks headers and probes; the catalog fetch needs is_shopify first
+                analysis, detection = await asyncio.gather(
+                    self.scraper.analyze_homepage(homepage, base_url),
+                    self.shopify_detector.detect(base_url, homepage)
+                )
+                is_shopify = detection.is_shopify
+            
+            if any(section in stale_sections for section in DISCOVERED_SECTIONS):
+                # Shared by the page extractors, which wait for it while the catalog is fetched
+                discovery = asyncio.ensure_future(self._discover_pages(db_insights, base_url))
+            
+            jobs = {}
+            if 'homepage' in stale_sections and is_shopify:
+                jobs['hero_products'] = self._fetch_featured_products(base_url, semaphore)
+            if 'product_catalog' in stale_sections:
+                # The only job using db: it writes the catalog to the products table as pages arrive
+                jobs['product_catalog'] = self._fetch_product_catalog(db_insights, base_url, is_shopify, semaphore, db, validators)
+            if 'privacy_policy' in stale_sections:
+                jobs['privacy_policy'] = self._extract_page_content(base_url, 'privacy', semaphore, sources, discovery)
+            if 'refund_policy' in stale_sections:
+                jobs['refund_policy'] = self._extract_page_content(base_url, 'refund', semaphore, sources, discovery)
+            if settings.LLM_COMBINED_EXTRACTION and {'brand_context', 'faqs'} <= set(stale_sections):
+                jobs['llm_sections'] = self._extract_llm_sections(base_url, semaphore, sources, discovery)
+            else:
+                if 'brand_context' in stale_sections:
+                    jobs['brand_context'] = self._extract_brand_context(base_url, semaphore, sources, discovery)
+                if 'faqs' in stale_sections:
+                    jobs['faqs'] = self._extract_faqs(base_url, semaphore, sources, discovery)
+            results = dict(zip(jobs, await asyncio.gather(*jobs.values())))
+            results.update(results.pop('llm_sections', {}))
+            
+            catalog = results.get('product_catalog', UNCHANGED)
+            hero_products = results.get('hero_products') or (analysis.hero_products if homepage is not UNCHANGED else None)
+            if hero_products:
+                generation = db_insights.catalog_generation if catalog is UNCHANGED else catalog.generation
+                db_insights.hero_products = await self._join_catalog(db_insights, generation, hero_products, db)
+            if homepage is not UNCHANGED:
+                contact_details, social_handles, important_links = analysis.details
+                db_insights.brand_name = analysis.brand_name
+                if not hero_products:
+                    db_insights.hero_products = []
                 db_insights.contact_details = contact_details.model_dump()
                 db_insights.social_handles = social_handles.model_dump()
                 db_insights.important_links = important_links.model_dump()
+                if discovery is not None:
+                    self._add_discovered_links(db_insights, base_url, await discovery)
                 db_insights.is_shopify_store = is_shopify
-                db_insights.scraping_status = ScrapingStatus.COMPLETED
-                await db.commit()
-                return self._convert_to_response(db_insights)
+                db_insights.shopify_signal = detection.signal
+                db_insights.shopify_confidence = detection.confidence
+            for section, page_type in SECTION_PAGE_TYPES.items():
+                result = results.get(section, UNCHANGED)
+                if result is UNCHANGED:
+                    continue
+                if not result:
+                    # Nothing extracted: keep what is stored, and leave the section stale so it is tried again
+                    stale_sections.remove(section)
+                    continue
+                setattr(db_insights, section, [f.model_dump() for f in result] if section == 'faqs' else result)
+                sources.keep(page_type)
+            if catalog is not UNCHANGED:
+                await self.product_service.swap(db_insights, catalog.generation, db)
+            
+            now = datetime.utcnow().isoformat()
+            fetched_at.update({section: now for section in stale_sections})
+            db_insights.section_fetched_at = fetched_at
+            db_insights.page_validators = validators
+            db_insights.section_pages = sources.paths
+            db_insights.scraping_status = ScrapingStatus.COMPLETED
+            await db.commit()
+            await similarity_index.upsert(db_insights.id)
+            return await self._convert_to_response(db_insights, db)
         except Exception as e:
+            # Catalog rows already staged are dropped when the next extraction starts a generation
             logger.error(f"Error extracting insights: {e}")
             db_insights.scraping_status = ScrapingStatus.FAILED
             db_insights.error_message = str(e)
             await db.commit()
             raise ScrapingError(f"Failed to extract insights: {str(e)}")
+        finally:
+            if discovery is not None and not discovery.done():
+                discovery.cancel()
+            await path_stats.flush()
+    
+    async def _get_page_unless_unchanged(self, url: str, validators: Dict[str, Dict]) -> Any:
+        try:
+            return await self.scraper.get_page(url, validators)
+        except PageNotModified:
+            return UNCHANGED
     
     async def _get_existing_insights(self, website_url: str, db: AsyncSession) -> Optional[BrandInsight]:
         result = await db.execute(
-            select(BrandInsight).where(BrandInsight.website_url == website_url)
+            select(BrandInsight).where(BrandInsight.base_url == self.scraper.normalize_base_url(website_url))
         )
-        return result.scalar_one_or_none()
+        db_insights = result.scalar_one_or_none()
+        if db_insights is None:
+            # Rows stored before base_url existed are only reachable by their exact URL
+            result = await db.execute(
+                select(BrandInsight)
+                .where(BrandInsight.base_url.is_(None), BrandInsight.website_url == website_url)
+                .limit(1)
+            )
+            db_insights = result.scalar_one_or_none()
+        return db_insights
     
-    def _extract_brand_name(self, soup) -> Optional[str]:
-        title_tag = soup.find('title')
-        if title_tag:
-            return title_tag.get_text(strip=True).split(' - ')[0]
-        h1_tag = soup.find('h1')
-        if h1_tag:
-            return h1_tag.get_text(strip=True)
-        return None
+    async def _get_or_create_insights(self, website_url: str, db: AsyncSession) -> BrandInsight:
+        existing_insights = await self._get_existing_insights(website_url, db)
+        if existing_insights:
+            return existing_insights
+        db_insights = BrandInsight(
+            website_url=website_url,
+            base_url=self.scraper.normalize_base_url(website_url),
+            scraping_status=ScrapingStatus.PENDING
+        )
+        db.add(db_insights)
+        try:
+            await db.commit()
+            return db_insights
+        except IntegrityError:
+            # Another process inserted the store first; use its row
+            await db.rollback()
+            return await self._get_existing_insights(website_url, db)
+    
+    async def _fetch_product_catalog(
+        self,
+        db_insights: BrandInsight,
+        base_url: str,
+        is_shopify: bool,
+        semaphore: asyncio.Semaphore,
+        db: AsyncSession,
+        validators: Optional[Dict[str, Dict]] = None,
+        reuse: bool = True
+    ) -> Any:
+        # Each page is written under the next generation and committed as it arrives, so at most a page of
+        # products is held. Pages unchanged since the last scrape are copied from the live generation by the
+        # product ids recorded with their validators; when one of those is no longer stored, every page is
+        # fetched. Returns the StagedCatalog for run_extraction to swap in, or UNCHANGED.
+        brand_id, live = db_insights.id, db_insights.catalog_generation
+        generation = await self.product_service.start_generation(brand_id, live, db)
+        if not is_shopify:
+            return StagedCatalog(generation, 0)
+        validators = {} if validators is None else validators
+        catalog_validators = {}
+        if reuse:
+            catalog_validators = {url: v for url, v in validators.items() if 'product_ids' in v}
+        page_urls = []
+        changed = not reuse
+        complete = True
+        async with semaphore:
+            async for page_url, batch in self.scraper.iter_product_pages(base_url, validators=catalog_validators):
+                page_urls.append(page_url)
+                if batch is None:
+                    product_ids = catalog_validators[page_url]['product_ids']
+                    if not await self.product_service.carry_over(brand_id, live, generation, product_ids, db):
+                        complete = False
+                        break
+                else:
+                    changed = True
+                    catalog_validators[page_url]['product_ids'] = [p.id for p in batch]
+                    await self.product_service.stage(brand_id, generation, [p.model_dump() for p in batch], db)
+                await db.commit()
+        if not complete:
+            return await self._fetch_product_catalog(db_insights, base_url, is_shopify, semaphore, db, validators, reuse=False)
+        for url in [url for url, v in validators.items() if 'items' in v]:
+            del validators[url]
+        validators.update({url: catalog_validators[url] for url in page_urls})
+        count = await self.product_service.count(brand_id, generation, db)
+        if not changed and count == await self.product_service.count(brand_id, live, db):
+            await self.product_service.discard(brand_id, generation, db)
+            await db.commit()
+            return UNCHANGED
+        return StagedCatalog(generation, count)
     
-    async def _extract_page_content(self, base_url: str, page_type: str, client: httpx.AsyncClient) -> Optional[str]:
-        page_urls = {
-            'privacy': ['/pages/privacy-policy', '/privacy-policy', '/privacy'],
-            'refund': ['/pages/refund-policy', '/pages/return-policy', '/refund-policy', '/returns']
-        }
-        for url_path in page_urls.get(page_type, []):
+    async def _fetch_featured_products(self, base_url: str, semaphore: asyncio.Semaphore) -> List[ProductSchema]:
+        async with semaphore:
             try:
-                page_url = urljoin(base_url, url_path)
-                soup = await self.scraper.get_soup(page_url, client)
-                main_content = soup.find('main') or soup.find('div', class_='main-content') or soup.find('body')
-                if main_content:
-                    return main_content.get_text(separator='\n', strip=True)
+                return await self.scraper.fetch_collection_products(
+                    base_url, settings.HERO_COLLECTION, settings.HERO_PRODUCTS_LIMIT
+                )
             except Exception as e:
-                logger.warning(f"Could not fetch {page_type} page at {url_path}: {e}")
-                continue
+                logger.info(f"Could not fetch featured products for {base_url}: {e}")
+                return []
+    
+    async def _join_catalog(
+        self,
+        db_insights: BrandInsight,
+        generation: int,
+        hero_products: List[ProductSchema],
+        db: AsyncSession
+    ) -> List[dict]:
+        # Hero products read from the page carry the catalog's ids, vendors and prices when the handle is known
+        handles = [product.handle for product in hero_products]
+        catalog_by_handle = await self.product_service.find_by_handles(db_insights.id, generation, handles, db)
+        if not catalog_by_handle and db_insights.product_catalog:
+            catalog_by_handle = {p['handle']: p for p in db_insights.product_catalog if p['handle'] in handles}
+        joined = []
+        for product in hero_products:
+            known = catalog_by_handle.get(product.handle)
+            joined.append({**known, 'is_hero_product': True} if known else product.model_dump())
+        return joined
+    
+    async def _probe_url(
+        self,
+        base_url: str,
+        url_path: str,
+        semaphore: asyncio.Semaphore,
+        label: str,
+        reader: Optional[Callable[[ParsedPage], Awaitable[Any]]] = None,
+        validator: Optional[Dict] = None
+    ) -> Any:
+        # The page is read with reader, main text by default. Returns a ProbedPage, None when it has
+        # no content, or UNCHANGED when validator shows it unchanged. The page's new validator is
+        # returned rather than recorded. Hits are what the fetch found, never what an LLM made of it.
+        host = self.scraper.get_host_key(base_url)
+        page_url = urljoin(base_url, url_path)
+        page_validators = {page_url: validator} if validator else {}
+        try:
+            async with semaphore:
+                page = await self._get_page_unless_unchanged(page_url, page_validators)
+        except WebsiteNotFoundError:
+            path_stats.record(host, label, url_path, hit=False, dead=True)
+            raise
+        if page is UNCHANGED:
+            path_stats.record(host, label, url_path, hit=True)
+            return UNCHANGED
+        content = await (reader or self.scraper.extract_main_text)(page)
+        path_stats.record(host, label, url_path, hit=bool(content))
+        return ProbedPage(url_path, page_url, content, page_validators.get(page_url)) if content else None
+    
+    async def _probe_paths(
+        self,
+        base_url: str,
+        url_paths: List[str],
+        semaphore: asyncio.Semaphore,
+        label: str,
+        reader: Optional[Callable[[ParsedPage], Awaitable[Any]]] = None
+    ) -> Optional[ProbedPage]:
+        # Candidates go most likely first, in waves of PATH_PROBE_WAVE_SIZE, so a later wave is
+        # only fetched when the earlier ones miss
+        host = self.scraper.get_host_key(base_url)
+        url_paths = await path_stats.order(host, label, url_paths)
+        
+        async def probe(url_path: str) -> Optional[ProbedPage]:
+            return await self._probe_url(base_url, url_path, semaphore, label, reader)
+        
+        wave_size = settings.PATH_PROBE_WAVE_SIZE or len(url_paths) or 1
+        for start in range(0, len(url_paths), wave_size):
+            result = await self._first_result(probe, url_paths[start:start + wave_size], label)
+            if result:
+                return result
         return None
     
-    async def _extract_brand_context(self, base_url: str, client: httpx.AsyncClient) -> Optional[str]:
-        about_urls = ['/pages/about', '/pages/about-us', '/about', '/about-us', '/pages/our-story']
-        for url_path in about_urls:
+    async def _first_result(self, probe: Callable[[str], Awaitable[Any]], url_paths: List[str], label: str) -> Optional[Any]:
+        tasks = {asyncio.create_task(probe(url_path)): url_path for url_path in url_paths}
+        pending = set(tasks)
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    try:
+                        result = task.result()
+                    except Exception as e:
+                        logger.warning(f"Could not fetch {label} page at {tasks[task]}: {e}")
+                        continue
+                    if result:
+                        return result
+            return None
+        finally:
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+    
+    async def _discover_pages(self, db_insights: BrandInsight, base_url: str) -> Dict[str, List[str]]:
+        stored = db_insights.discovered_pages or {}
+        if not settings.DISCOVERY_ENABLED:
+            return {}
+        if stored and not self._is_stale(stored.get('fetched_at'), settings.DISCOVERY_MAX_AGE):
+            return stored.get('pages', {})
+        try:
+            pages = await asyncio.wait_for(self.page_discovery.discover(base_url), settings.HTTP_TIMEOUT)
+        except Exception as e:
+            logger.warning(f"Page discovery failed for {base_url}: {e}")
+            return stored.get('pages', {})
+        db_insights.discovered_pages = {'fetched_at': datetime.utcnow().isoformat(), 'pages': pages}
+        return pages
+    
+    def _add_discovered_links(self, db_insights: BrandInsight, base_url: str, pages: Dict[str, List[str]]) -> None:
+        links = dict(db_insights.important_links or {})
+        for field, page_type in DISCOVERED_LINKS.items():
+            if not links.get(field) and pages.get(page_type):
+                links[field] = urljoin(base_url, pages[page_type][0])
+        db_insights.important_links = links
+    
+    async def _probe_page_type(
+        self,
+        base_url: str,
+        page_type: str,
+        semaphore: asyncio.Semaphore,
+        discovery: Optional[Awaitable[Dict[str, List[str]]]] = None,
+        sources: Optional[PageSources] = None,
+        reader: Optional[Callable[[ParsedPage], Awaitable[Any]]] = None
+    ) -> Any:
+        # Returns the content of the page found, None, or UNCHANGED when the page stored last time is unchanged.
+        # That page is checked first and alone, so an unchanged candidate cannot hide a change on it; then
+        # discovered pages, and the guessed paths only when none of them has content.
+        previous_path, validator = sources.previous(page_type) if sources is not None else (None, None)
+        page = None
+        if previous_path:
             try:
-                page_url = urljoin(base_url, url_path)
-                soup = await self.scraper.get_soup(page_url, client)
-                main_content = soup.find('main') or soup.find('div', class_='main-content') or soup.find('body')
-                if main_content:
-                    page_text = main_content.get_text(separator='\n', strip=True)
-                    return await self.llm_service.extract_brand_context(page_text)
+                page = await self._probe_url(base_url, previous_path, semaphore, page_type, reader, validator)
             except Exception as e:
-                logger.warning(f"Could not fetch about page at {url_path}: {e}")
-                continue
+                logger.info(f"Could not fetch {page_type} page at {previous_path}: {e}")
+        if page is UNCHANGED:
+            return UNCHANGED
+        discovered = (await discovery).get(page_type, []) if discovery is not None else []
+        if not page and discovered:
+            page = await self._probe_paths(base_url, [p for p in discovered if p != previous_path], semaphore, page_type, reader)
+        if not page:
+            guesses = [path for path in GUESSED_PATHS[page_type] if path not in discovered and path != previous_path]
+            page = await self._probe_paths(base_url, guesses, semaphore, page_type, reader)
+        if not page:
+            return None
+        if sources is not None:
+            sources.found[page_type] = page
+        return page.content
+    
+    async def _extract_page_content(
+        self,
+        base_url: str,
+        page_type: str,
+        semaphore: asyncio.Semaphore,
+        sources: Optional[PageSources] = None,
+        discovery: Optional[Awaitable[Dict[str, List[str]]]] = None
+    ) -> Any:
+        return await self._probe_page_type(base_url, page_type, semaphore, discovery, sources=sources)
+    
+    async def _extract_brand_context(
+        self,
+        base_url: str,
+        semaphore: asyncio.Semaphore,
+        sources: Optional[PageSources] = None,
+        discovery: Optional[Awaitable[Dict[str, List[str]]]] = None
+    ) -> Any:
+        page = await self._probe_page_type(
+            base_url, 'about', semaphore, discovery,
+            sources=sources,
+            reader=self.scraper.extract_llm_sections
+        )
+        if page is UNCHANGED:
+            return UNCHANGED
+        if page:
+            return await self.llm_service.extract_brand_context(
+                token_budgeter.build(page, 'about', settings.LLM_ABOUT_TOKEN_BUDGET)
+            )
         return None
     
-    async def _extract_faqs(self, base_url: str, client: httpx.AsyncClient) -> List:
-        faq_urls = [
-            '/pages/faq', '/faq', '/pages/faqs', '/faqs', 
-            '/pages/help', '/help', '/pages/support', '/support',
-            '/pages/questions', '/questions'
-        ]
-        for url_path in faq_urls:
-            try:
-                page_url = urljoin(base_url, url_path)
-                soup = await self.scraper.get_soup(page_url, client)
-                main_content = soup.find('main') or soup.find('div', class_='main-content') or soup.find('body')
-                if main_content:
-                    page_text = main_content.get_text(separator='\n', strip=True)
-                    faqs = await self.llm_service.extract_faqs(page_text)
-                    if faqs:
-                        return faqs
-            except Exception as e:
-                logger.warning(f"Could not fetch FAQ page at {url_path}: {e}")
-                continue
+    async def _extract_faqs(
+        self,
+        base_url: str,
+        semaphore: asyncio.Semaphore,
+        sources: Optional[PageSources] = None,
+        discovery: Optional[Awaitable[Dict[str, List[str]]]] = None
+    ) -> Any:
+        # The probes only fetch; the LLM is asked once, about the page that won, so no call is cancelled mid-flight
+        page = await self._probe_page_type(
+            base_url, 'faq', semaphore, discovery,
+            sources=sources,
+            reader=self.scraper.extract_llm_sections
+        )
+        if page is UNCHANGED:
+            return UNCHANGED
+        if page:
+            return await self.llm_service.extract_faqs(token_budgeter.build(page, 'faq', settings.LLM_FAQ_TOKEN_BUDGET))
         return []
     
-    def _convert_to_response(self, db_insights: BrandInsight) -> BrandInsightsResponse:
-        from app.models.schemas import (
-            ProductSchema, FAQSchema, ContactDetailsSchema, 
-            SocialHandlesSchema, ImportantLinksSchema
+    async def _extract_llm_sections(
+        self,
+        base_url: str,
+        semaphore: asyncio.Semaphore,
+        sources: Optional[PageSources] = None,
+        discovery: Optional[Awaitable[Dict[str, List[str]]]] = None
+    ) -> Dict[str, Any]:
+        # One LLM request for both sections; the first FAQ page with text is used rather than
+        # asking the LLM about each candidate in turn
+        about_page, faq_page = await asyncio.gather(
+            self._probe_page_type(
+                base_url, 'about', semaphore, discovery, sources=sources, reader=self.scraper.extract_llm_sections
+            ),
+            self._probe_page_type(
+                base_url, 'faq', semaphore, discovery, sources=sources, reader=self.scraper.extract_llm_sections
+            )
         )
-        return BrandInsightsResponse(
-            id=db_insights.id,
-            website_url=db_insights.website_url,
-            brand_name=db_insights.brand_name,
-            product_catalog=[ProductSchema(**p) for p in db_insights.product_catalog or []],
-            hero_products=[ProductSchema(**p) for p in db_insights.hero_products or []],
-            privacy_policy=db_insights.privacy_policy,
-            refund_policy=db_insights.refund_policy,
-            faqs=[FAQSchema(**f) for f in db_insights.faqs or []],
-            brand_context=db_insights.brand_context,
-            contact_details=ContactDetailsSchema(**(db_insights.contact_details or {})),
-            social_handles=SocialHandlesSchema(**(db_insights.social_handles or {})),
-            important_links=ImportantLinksSchema(**(db_insights.important_links or {})),
-            is_shopify_store=db_insights.is_shopify_store,
-            scraping_status=db_insights.scraping_status,
-            error_message=db_insights.error_message,
-            created_at=db_insights.created_at,
-            updated_at=db_insights.updated_at
-        ) 
\ No newline at end of file
+        if about_page is UNCHANGED and faq_page is UNCHANGED:
+            return {'brand_context': UNCHANGED, 'faqs': UNCHANGED}
+        fetched = [page for page in (about_page, faq_page) if page and page is not UNCHANGED]
+        # Lines on both pages come from the theme rather than either page's content
+        boilerplate = token_budgeter.shared_lines(*fetched) if len(fetched) == 2 else frozenset()
+        about_text = faq_text = None
+        if about_page and about_page is not UNCHANGED:
+            about_text = token_budgeter.build(about_page, 'about', settings.LLM_ABOUT_TOKEN_BUDGET, boilerplate)
+        if faq_page and faq_page is not UNCHANGED:
+            faq_text = token_budgeter.build(faq_page, 'faq', settings.LLM_FAQ_TOKEN_BUDGET, boilerplate)
+        if about_page is UNCHANGED:
+            return {'brand_context': UNCHANGED, 'faqs': await self.llm_service.extract_faqs(faq_text)}
+        if faq_page is UNCHANGED:
+            return {'brand_context': await self.llm_service.extract_brand_context(about_text), 'faqs': UNCHANGED}
+        brand_context, faqs = await self.llm_service.extract_store_content(about_text, faq_text)
+        return {'brand_context': brand_context, 'faqs': faqs}
+    
+    def parse_fields(self, fields: Optional[str]) -> Optional[List[str]]:
+        if not fields:
+            return None
+        requested = [field.strip() for field in fields.split(',') if field.strip()]
+        unknown = [field for field in requested if field not in RESPONSE_FIELDS]
+        if unknown:
+            raise InvalidFieldsError(unknown)
+        return ['id'] + [field for field in dict.fromkeys(requested) if field != 'id']
+    
+    async def get_insight(self, insight_id: int, db: AsyncSession, fields: Optional[List[str]] = None) -> Optional[BrandInsight]:
+        query = select(BrandInsight).where(BrandInsight.id == insight_id)
+        if fields:
+            query = query.options(load_only(*self._columns(fields)))
+        result = await db.execute(query)
+        return result.scalar_one_or_none()
+    
+    async def get_history(
+        self,
+        db: AsyncSession,
+        limit: int,
+        cursor: Optional[str] = None,
+        fields: Optional[List[str]] = None
+    ) -> Tuple[List[BrandInsight], Optional[str]]:
+        # Only the selected columns are loaded; the large text and JSON columns stay in the database
+        query = select(BrandInsight).options(load_only(*self._columns(set(fields or SUMMARY_FIELDS) | {'created_at'})))
+        if cursor:
+            created_at, last_id = decode_cursor(cursor, 2)
+            try:
+                created_at, last_id = datetime.fromisoformat(created_at), int(last_id)
+            except (ValueError, TypeError):
+                raise InvalidCursorError()
+            query = query.where(or_(
+                BrandInsight.created_at < created_at,
+                and_(BrandInsight.created_at == created_at, BrandInsight.id < last_id)
+            ))
+        result = await db.execute(
+            query.order_by(BrandInsight.created_at.desc(), BrandInsight.id.desc()).limit(limit + 1)
+        )
+        insights = result.scalars().all()
+        next_cursor = None
+        if len(insights) > limit:
+            insights = insights[:limit]
+            next_cursor = encode_cursor([insights[-1].created_at.isoformat(), insights[-1].id])
+        return insights, next_cursor
+    
+    def _columns(self, fields) -> List[Any]:
+        # product_catalog is read from the products table at the insight's catalog_generation
+        columns = set(fields) | ({'catalog_generation'} if 'product_catalog' in fields else set())
+        return [getattr(BrandInsight, field) for field in columns]
+    
+    def _convert_to_summary(self, db_insights: BrandInsight) -> BrandInsightSummary:
+        return BrandInsightSummary(**self._convert_fields(db_insights, SUMMARY_FIELDS))
+    
+    def _convert_fields(
+        self,
+        db_insights: BrandInsight,
+        fields,
+        product_catalog: Optional[List[ProductSchema]] = None
+    ) -> Dict[str, Any]:
+        converted = {}
+        for field in fields:
+            if field == 'product_catalog':
+                converted[field] = product_catalog or []
+                continue
+            value = getattr(db_insights, field)
+            if field == 'hero_products':
+                value = [ProductSchema(**p) for p in value or []]
+            elif field == 'faqs':
+                value = [FAQSchema(**f) for f in value or []]
+            elif field == 'contact_details':
+                value = ContactDetailsSchema(**(value or {}))
+            elif field == 'social_handles':
+                value = SocialHandlesSchema(**(value or {}))
+            elif field == 'important_links':
+                value = ImportantLinksSchema(**(value or {}))
+            converted[field] = value
+        return converted
+    
+    async def _convert_selected(self, db_insights: BrandInsight, fields, db: AsyncSession) -> Dict[str, Any]:
+        product_catalog = None
+        if 'product_catalog' in fields:
+            product_catalog = await self.product_service.load_catalog(db_insights, db)
+        return self._convert_fields(db_insights, fields, product_catalog)
+    
+    async def _convert_to_response(self, db_insights: BrandInsight, db: AsyncSession) -> BrandInsightsResponse:
+        product_catalog = await self.product_service.load_catalog(db_insights, db)
+        return BrandInsightsResponse(**self._convert_fields(db_insights, RESPONSE_FIELDS, product_catalog))
@@ -0,0 +1,144 @@
+import asyncio
+from datetime import datetime, timedelta
+from typing import List, Optional
+import logging
+
+import httpx
+from fastapi import Request
+from sqlalchemy import select, update, or_, and_
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from app.core.config import settings
+from app.core.database import BrandInsight, async_session_maker
+from app.models.schemas import InsightJobResponse, ScrapingStatus
+from app.services.insights_service import InsightsService, WORKER_ID
+
+logger = logging.getLogger(__name__)
+
+class InsightsJobQueue:
+    # Jobs are PENDING BrandInsight rows, claimed with a conditional UPDATE that sets a lease
+
+    def __init__(
+        self,
+        http_client: httpx.AsyncClient,
+        session_maker: async_sessionmaker = async_session_maker,
+        workers: Optional[int] = None
+    ):
+        self.http_client = http_client
+        self.session_maker = session_maker
+        self.workers = settings.INSIGHTS_WORKERS if workers is None else workers
+        self.worker_id = WORKER_ID
+        self.lease = timedelta(seconds=settings.JOB_LEASE_SECONDS)
+        self._wakeup = asyncio.Event()
+        self._tasks: List[asyncio.Task] = []
+
+    async def start(self) -> None:
+        for n in range(self.workers):
+            self._tasks.append(asyncio.create_task(self._worker(n)))
+        logger.info(f"Started {self.workers} insight workers as {self.worker_id}")
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def enqueue(self, website_url: str, db: AsyncSession, max_age: Optional[int] = None) -> InsightJobResponse:
+        db_insights = await InsightsService(self.http_client, self.session_maker).enqueue_insights(website_url, db, max_age)
+        self._wakeup.set()
+        return self._to_job_response(db_insights)
+
+    def _claimable(self, now: datetime):
+        return and_(
+            BrandInsight.attempts < settings.JOB_MAX_ATTEMPTS,
+            or_(BrandInsight.retry_at.is_(None), BrandInsight.retry_at <= now),
+            or_(
+                BrandInsight.scraping_status == ScrapingStatus.PENDING,
+                and_(
+                    BrandInsight.scraping_status == ScrapingStatus.IN_PROGRESS,
+                    BrandInsight.lease_expires_at.is_not(None),
+                    BrandInsight.lease_expires_at < now
+                )
+            )
+        )
+
+    async def claim(self, db: AsyncSession) -> Optional[int]:
+        now = datetime.utcnow()
+        result = await db.execute(
+            select(BrandInsight.id)
+            .where(self._claimable(now))
+            .order_by(BrandInsight.created_at)
+            .limit(self.workers)
+        )
+        for job_id in result.scalars().all():
+            claimed = await db.execute(
+                update(BrandInsight)
+                .where(BrandInsight.id == job_id, self._claimable(now))
+                .values(
+                    scraping_status=ScrapingStatus.IN_PROGRESS,
+                    lease_owner=self.worker_id,
+                    lease_expires_at=now + self.lease,
+                    attempts=BrandInsight.attempts + 1
+                )
+                .execution_options(synchronize_session=False)
+            )
+            await db.commit()
+            if claimed.rowcount == 1:
+                return job_id
+        return None
+
+    async def _worker(self, n: int) -> None:
+        while True:
+            try:
+                async with self.session_maker() as db:
+                    job_id = await self.claim(db)
+                    if job_id is not None:
+                        await self._process(job_id, db)
+                        continue
+                await self._wait_for_work()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Insight worker {n} error: {e}")
+                await asyncio.sleep(settings.JOB_POLL_INTERVAL)
+
+    async def _wait_for_work(self) -> None:
+        try:
+            await asyncio.wait_for(self._wakeup.wait(), timeout=settings.JOB_POLL_INTERVAL)
+        except asyncio.TimeoutError:
+            pass
+        self._wakeup.clear()
+
+    async def _process(self, job_id: int, db: AsyncSession) -> None:
+        db_insights = await db.get(BrandInsight, job_id, populate_existing=True)
+        insights_service = InsightsService(self.http_client, self.session_maker)
+        heartbeat = asyncio.create_task(insights_service.keep_lease(job_id))
+        try:
+            await insights_service.run_extraction(db_insights, db, db_insights.max_age)
+        except Exception as e:
+            logger.warning(f"Insight job {job_id} attempt {db_insights.attempts} failed: {e}")
+            if db_insights.attempts < settings.JOB_MAX_ATTEMPTS:
+                backoff = settings.JOB_RETRY_BACKOFF * 2 ** (db_insights.attempts - 1)
+                db_insights.scraping_status = ScrapingStatus.PENDING
+                db_insights.retry_at = datetime.utcnow() + timedelta(seconds=backoff)
+        finally:
+            heartbeat.cancel()
+            await asyncio.gather(heartbeat, return_exceptions=True)
+            db_insights.lease_owner = None
+            db_insights.lease_expires_at = None
+            await db.commit()
+
+    def _to_job_response(self, db_insights: BrandInsight) -> InsightJobResponse:
+        return InsightJobResponse(
+            id=db_insights.id,
+            website_url=db_insights.website_url,
+            scraping_status=db_insights.scraping_status,
+            attempts=db_insights.attempts or 0,
+            error_message=db_insights.error_message,
+            created_at=db_insights.created_at,
+            updated_at=db_insights.updated_at
+        )
+
+
+def get_job_queue(request: Request) -> InsightsJobQueue:
+    return request.app.state.job_queue
@@ -0,0 +1,120 @@
+import hashlib
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Any, Dict, Optional, Tuple
+import logging
+
+from sqlalchemy import select, delete, func
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from app.core.config import settings
+from app.core.database import LLMCacheEntry, async_session_maker
+
+logger = logging.getLogger(__name__)
+
+class LLMCache:
+    """Two-tier cache of LLM responses: an in-process LRU in front of the llm_cache table."""
+
+    EVICTION_INTERVAL = 50
+
+    def __init__(
+        self,
+        session_maker: async_sessionmaker = async_session_maker,
+        ttl: Optional[int] = None,
+        max_memory_entries: Optional[int] = None,
+        max_db_entries: Optional[int] = None
+    ):
+        self.session_maker = session_maker
+        self.ttl = settings.LLM_CACHE_TTL if ttl is None else ttl
+        self.max_memory_entries = settings.LLM_CACHE_MAX_MEMORY_ENTRIES if max_memory_entries is None else max_memory_entries
+        self.max_db_entries = settings.LLM_CACHE_MAX_DB_ENTRIES if max_db_entries is None else max_db_entries
+        self._memory: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+        self._writes = 0
+        self.memory_hits = 0
+        self.db_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def make_key(self, method: str, prompt_version: int, payload: str) -> str:
+        digest = hashlib.sha256()
+        digest.update(f"{method}:{prompt_version}:".encode('utf-8'))
+        digest.update(payload.encode('utf-8'))
+        return digest.hexdigest()
+
+    async def get(self, key: str) -> Tuple[bool, Any]:
+        cached = self._memory.get(key)
+        if cached is not None:
+            expires_at, value = cached
+            if expires_at > time.time():
+                self._memory.move_to_end(key)
+                self.memory_hits += 1
+                return True, value
+            del self._memory[key]
+        try:
+            async with self.session_maker() as db:
+                entry = await db.get(LLMCacheEntry, key)
+                if entry is not None and entry.expires_at > datetime.utcnow():
+                    self.db_hits += 1
+                    ttl_left = (entry.expires_at - datetime.utcnow()).total_seconds()
+                    self._remember(key, entry.response, time.time() + ttl_left)
+                    return True, entry.response
+        except Exception as e:
+            logger.warning(f"LLM cache lookup failed: {e}")
+        self.misses += 1
+        return False, None
+
+    async def set(self, key: str, method: str, value: Any) -> None:
+        self._remember(key, value, time.time() + self.ttl)
+        try:
+            async with self.session_maker() as db:
+                now = datetime.utcnow()
+                await db.merge(LLMCacheEntry(
+                    cache_key=key,
+                    method=method,
+                    response=value,
+                    created_at=now,
+                    expires_at=now + timedelta(seconds=self.ttl)
+                ))
+                await db.commit()
+                self._writes += 1
+                if self._writes % self.EVICTION_INTERVAL == 0:
+                    await self._evict(db)
+        except IntegrityError:
+            pass
+        except Exception as e:
+            logger.warning(f"LLM cache write failed: {e}")
+
+    def _remember(self, key: str, value: Any, expires_at: float) -> None:
+        self._memory[key] = (expires_at, value)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_entries:
+            self._memory.popitem(last=False)
+            self.evictions += 1
+
+    async def _evict(self, db) -> None:
+        await db.execute(delete(LLMCacheEntry).where(LLMCacheEntry.expires_at <= datetime.utcnow()))
+        total = await db.scalar(select(func.count()).select_from(LLMCacheEntry))
+        overflow = (total or 0) - self.max_db_entries
+        if overflow > 0:
+            oldest = select(LLMCacheEntry.cache_key).order_by(LLMCacheEntry.created_at).limit(overflow)
+            oldest_keys = (await db.execute(oldest)).scalars().all()
+            await db.execute(delete(LLMCacheEntry).where(LLMCacheEntry.cache_key.in_(oldest_keys)))
+            self.evictions += len(oldest_keys)
+        await db.commit()
+
+    def metrics(self) -> Dict[str, Any]:
+        lookups = self.memory_hits + self.db_hits + self.misses
+        return {
+            'enabled': settings.LLM_CACHE_ENABLED,
+            'memory_entries': len(self._memory),
+            'memory_hits': self.memory_hits,
+            'db_hits': self.db_hits,
+            'misses': self.misses,
+            'hit_ratio': (self.memory_hits + self.db_hits) / lookups if lookups else 0.0,
+            'evictions': self.evictions,
+        }
+
+
+llm_cache = LLMCache()
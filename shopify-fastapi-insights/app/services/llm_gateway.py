@@ -0,0 +1,215 @@
+import asyncio
+import bisect
+import random
+import time
+from typing import Any, Dict, Optional, Sequence
+import logging
+
+from google.api_core import exceptions as google_exceptions
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Provider errors that say nothing about the request itself, so a retry may succeed
+RETRYABLE_ERRORS = (
+    asyncio.TimeoutError,
+    ConnectionError,
+    google_exceptions.ResourceExhausted,
+    google_exceptions.TooManyRequests,
+    google_exceptions.ServiceUnavailable,
+    google_exceptions.InternalServerError,
+    google_exceptions.DeadlineExceeded,
+    google_exceptions.GatewayTimeout,
+)
+
+LATENCY_BUCKETS_MS = (50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000, 60000)
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+
+class LLMUnavailableError(Exception):
+    """The provider is failing or the call ran out of time; callers degrade to no result."""
+
+
+class LLMQueueTimeoutError(LLMUnavailableError):
+    """The deadline passed while waiting for a local concurrency slot; says nothing about the provider."""
+
+
+class Histogram:
+    def __init__(self, buckets_ms: Sequence[float] = LATENCY_BUCKETS_MS):
+        self.buckets_ms = tuple(buckets_ms)
+        self.counts = [0] * (len(self.buckets_ms) + 1)
+        self.total_ms = 0.0
+
+    def observe(self, seconds: float) -> None:
+        milliseconds = seconds * 1000
+        self.counts[bisect.bisect_left(self.buckets_ms, milliseconds)] += 1
+        self.total_ms += milliseconds
+
+    def snapshot(self) -> Dict[str, Any]:
+        count = sum(self.counts)
+        labels = [f"le_{bucket}" for bucket in self.buckets_ms] + ['le_inf']
+        return {
+            'count': count,
+            'mean_ms': round(self.total_ms / count, 3) if count else 0.0,
+            'buckets': dict(zip(labels, self.counts)),
+        }
+
+
+class LLMGateway:
+    """Concurrency limit, deadline, retries and circuit breaker around every LLM request."""
+
+    def __init__(
+        self,
+        max_concurrency: Optional[int] = None,
+        timeout: Optional[float] = None,
+        max_retries: Optional[int] = None,
+        retry_backoff: Optional[float] = None,
+        failure_threshold: Optional[int] = None,
+        reset_seconds: Optional[float] = None
+    ):
+        self.max_concurrency = max_concurrency or settings.LLM_MAX_CONCURRENCY
+        self.timeout = timeout or settings.LLM_TIMEOUT
+        self.max_retries = settings.LLM_MAX_RETRIES if max_retries is None else max_retries
+        self.retry_backoff = settings.LLM_RETRY_BACKOFF if retry_backoff is None else retry_backoff
+        self.failure_threshold = failure_threshold or settings.LLM_CIRCUIT_FAILURE_THRESHOLD
+        self.reset_seconds = settings.LLM_CIRCUIT_RESET_SECONDS if reset_seconds is None else reset_seconds
+        self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        self.state = CLOSED
+        self._opened_at = 0.0
+        self._trial_in_flight = False
+        self._consecutive_failures = 0
+        self.queued = 0
+        self.in_flight = 0
+        self.calls = 0
+        self.successes = 0
+        self.failures = 0
+        self.timeouts = 0
+        self.queue_timeouts = 0
+        self.retries = 0
+        self.rejected = 0
+        self.circuit_opens = 0
+        self.latency = Histogram()
+        self.queue_wait = Histogram()
+
+    async def generate(self, model: Any, prompt: str) -> Any:
+        trial = self._admit()
+        self.calls += 1
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.timeout
+        started = time.perf_counter()
+        provider_failed = False
+        try:
+            for attempt in range(self.max_retries + 1):
+                try:
+                    response = await self._attempt(model, prompt, deadline)
+                except RETRYABLE_ERRORS as e:
+                    provider_failed = True
+                    if isinstance(e, asyncio.TimeoutError):
+                        self.timeouts += 1
+                    backoff = self.retry_backoff * (2 ** attempt) * random.uniform(0.5, 1.5)
+                    if attempt == self.max_retries or loop.time() + backoff >= deadline:
+                        raise LLMUnavailableError(f"LLM call failed after {attempt + 1} attempts: {e!r}") from e
+                    logger.info(f"Retrying LLM call in {backoff:.2f}s after {e!r}")
+                    self.retries += 1
+                    await asyncio.sleep(backoff)
+                    continue
+                except LLMQueueTimeoutError:
+                    raise
+                except Exception as e:
+                    # Not worth retrying, but still a failed provider call for the circuit
+                    raise LLMUnavailableError(f"LLM call failed: {e!r}") from e
+                self._record_success()
+                return response
+        except LLMQueueTimeoutError:
+            # Only a provider error in an earlier attempt counts towards opening the circuit
+            self.queue_timeouts += 1
+            if provider_failed:
+                self._record_failure()
+            raise
+        except LLMUnavailableError:
+            self._record_failure()
+            raise
+        finally:
+            if trial:
+                self._trial_in_flight = False
+            self.latency.observe(time.perf_counter() - started)
+
+    async def _attempt(self, model: Any, prompt: str, deadline: float) -> Any:
+        loop = asyncio.get_running_loop()
+        queued_at = time.perf_counter()
+        self.queued += 1
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), max(0.0, deadline - loop.time()))
+        except asyncio.TimeoutError:
+            raise LLMQueueTimeoutError(f"No LLM slot free within {self.timeout}s ({self.max_concurrency} in flight)")
+        finally:
+            self.queued -= 1
+            waited = time.perf_counter() - queued_at
+            self.queue_wait.observe(waited)
+        self.in_flight += 1
+        try:
+            return await asyncio.wait_for(model.generate_content_async(prompt), max(0.0, deadline - loop.time()))
+        except asyncio.TimeoutError:
+            # The provider only had what queueing left of the deadline; when that was most of it, blame the queue
+            if waited > self.timeout / 2:
+                raise LLMQueueTimeoutError(f"LLM call timed out after waiting {waited:.2f}s for a slot")
+            raise
+        finally:
+            self.in_flight -= 1
+            self._semaphore.release()
+
+    def _admit(self) -> bool:
+        # Returns whether this call is the half-open trial
+        if self.state == OPEN:
+            if time.monotonic() - self._opened_at < self.reset_seconds:
+                self.rejected += 1
+                raise LLMUnavailableError("LLM circuit is open")
+            self.state = HALF_OPEN
+        if self.state == HALF_OPEN:
+            if self._trial_in_flight:
+                self.rejected += 1
+                raise LLMUnavailableError("LLM circuit is half-open and a trial call is running")
+            self._trial_in_flight = True
+            return True
+        return False
+
+    def _record_success(self) -> None:
+        self.successes += 1
+        self._consecutive_failures = 0
+        if self.state != CLOSED:
+            logger.info("LLM circuit closed")
+            self.state = CLOSED
+
+    def _record_failure(self) -> None:
+        self.failures += 1
+        self._consecutive_failures += 1
+        if self.state == HALF_OPEN or (self.state == CLOSED and self._consecutive_failures >= self.failure_threshold):
+            logger.warning(f"LLM circuit opened after {self._consecutive_failures} consecutive failures")
+            self.state = OPEN
+            self._opened_at = time.monotonic()
+            self.circuit_opens += 1
+
+    def metrics(self) -> Dict[str, Any]:
+        return {
+            'circuit_state': self.state,
+            'circuit_opens': self.circuit_opens,
+            'max_concurrency': self.max_concurrency,
+            'queued': self.queued,
+            'in_flight': self.in_flight,
+            'calls': self.calls,
+            'successes': self.successes,
+            'failures': self.failures,
+            'timeouts': self.timeouts,
+            'queue_timeouts': self.queue_timeouts,
+            'retries': self.retries,
+            'rejected': self.rejected,
+            'latency': self.latency.snapshot(),
+            'queue_wait': self.queue_wait.snapshot(),
+        }
+
+
+llm_gateway = LLMGateway()
@@ -1,22 +1,77 @@
 import google.generativeai as genai
 import json
 import re
-from typing import List, Optional
+from typing import Any, Awaitable, Callable, List, Optional, Tuple
 import logging
 import asyncio
 
 from app.models.schemas import FAQSchema
 from app.core.config import settings
 from app.core.exceptions import ScrapingError
+from app.services.fake_llm import FakeGenerativeModel
+from app.services.llm_cache import llm_cache
+from app.services.llm_gateway import LLMUnavailableError, llm_gateway
+from app.services.token_budget import truncate_to_tokens
 
 logger = logging.getLogger(__name__)
 
+# Bump a method's version whenever its prompt changes so stale cache entries are not reused
+PROMPT_VERSIONS = {
+    'extract_faqs': 1,
+    'extract_brand_context': 1,
+    'extract_store_content': 1,
+    'find_competitors': 1,
+}
+
+class UnusableResponseError(ValueError):
+    """The model returned no parts (e.g. a blocked prompt) or not the JSON asked for; such answers are never cached."""
+
 class LLMService:
     def __init__(self):
-        if not settings.GOOGLE_API_KEY:
-            raise ValueError("GOOGLE_API_KEY is required")
-        genai.configure(api_key=settings.GOOGLE_API_KEY)
-        self.model = genai.GenerativeModel('gemini-1.5-flash-latest')
+        self.provider = settings.LLM_PROVIDER.lower()
+        if self.provider == 'fake':
+            self.model = FakeGenerativeModel()
+        elif self.provider == 'gemini':
+            if not settings.GOOGLE_API_KEY:
+                raise ValueError("GOOGLE_API_KEY is required")
+            genai.configure(api_key=settings.GOOGLE_API_KEY)
+            self.model = genai.GenerativeModel('gemini-1.5-flash-latest')
+        else:
+            raise ValueError(f"Unknown LLM provider: {settings.LLM_PROVIDER}")
+        self.cache = llm_cache
+        self.gateway = llm_gateway
+    
+    async def _cached(self, method: str, payload: str, compute: Callable[[str], Awaitable[Any]]) -> Any:
+        if not settings.LLM_CACHE_ENABLED:
+            return await compute(payload)
+        # Other providers get their own keys so fake answers never reach Gemini callers
+        namespace = method if self.provider == 'gemini' else f"{self.provider}:{method}"
+        key = self.cache.make_key(namespace, PROMPT_VERSIONS[method], payload)
+        found, value = await self.cache.get(key)
+        if found:
+            return value
+        # compute raises UnusableResponseError rather than return a placeholder, so only real answers are stored
+        value = await compute(payload)
+        await self.cache.set(key, method, value)
+        return value
+    
+    def _response_text(self, response: Any) -> str:
+        if not response.parts:
+            raise UnusableResponseError("empty or blocked response")
+        response_text = re.sub(r'```json\s*|\s*```', '', response.text.strip())
+        if not response_text:
+            raise UnusableResponseError("empty response text")
+        return response_text
+    
+    def _response_json(self, response: Any, expected: type) -> Any:
+        response_text = self._response_text(response)
+        try:
+            data = json.loads(response_text)
+        except ValueError:
+            raise UnusableResponseError(f"response is not JSON: {response_text[:200]}")
+        if not isinstance(data, expected):
+            raise UnusableResponseError(f"response is not a JSON {expected.__name__}: {response_text[:200]}")
+        return data
     
     async def extract_faqs(self, text: str) -> List[FAQSchema]:
         if not text or not text.strip():
@@ -35,17 +90,16 @@ class LLMService:
         If no FAQs are found, return: {"faqs": []}
         Text to analyze:
         """
+        
+        async def generate(payload: str) -> List[dict]:
+            data = self._response_json(await self.gateway.generate(self.model, prompt + payload), dict)
+            return [faq for faq in data.get('faqs', []) if isinstance(faq, dict)]
+        
         try:
-            full_prompt = prompt + text[:10000]
-            response = await self.model.generate_content_async(full_prompt)
-            if not response.parts:
-                return []
-            response_text = response.text.strip()
-            response_text = re.sub(r'```json\s*|\s*```', '', response_text)
-            if response_text.startswith('{') and response_text.endswith('}'):
-                data = json.loads(response_text)
-                faqs = data.get('faqs', [])
-                return [FAQSchema(**faq) for faq in faqs if isinstance(faq, dict)]
+            faqs = await self._cached('extract_faqs', truncate_to_tokens(text, settings.LLM_FAQ_TOKEN_BUDGET), generate)
+            return [FAQSchema(**faq) for faq in faqs]
+        except (LLMUnavailableError, UnusableResponseError) as e:
+            logger.warning(f"Skipping LLM FAQs: {e}")
         except Exception as e:
             logger.error(f"Error extracting FAQs with LLM: {e}")
         return []
@@ -63,15 +117,70 @@ class LLMService:
         Return only the summary text, no additional formatting or explanations.
         Text:
         """
+        
+        async def generate(payload: str) -> str:
+            return self._response_text(await self.gateway.generate(self.model, prompt + payload))
+        
         try:
-            full_prompt = prompt + text[:8000]
-            response = await self.model.generate_content_async(full_prompt)
-            if response.parts:
-                return response.text.strip()
+            return await self._cached(
+                'extract_brand_context', truncate_to_tokens(text, settings.LLM_ABOUT_TOKEN_BUDGET), generate
+            )
+        except (LLMUnavailableError, UnusableResponseError) as e:
+            logger.warning(f"Skipping LLM brand context: {e}")
         except Exception as e:
             logger.error(f"Error extracting brand context with LLM: {e}")
         return None
     
+    async def extract_store_content(self, about_text: Optional[str], faq_text: Optional[str]) -> Tuple[Optional[str], List[FAQSchema]]:
+        """Brand context and FAQs from one request, falling back to a call per field."""
+        if not (about_text and about_text.strip()) or not (faq_text and faq_text.strip()):
+            # At most one field has text, so there is nothing to combine
+            return await self.extract_brand_context(about_text), await self.extract_faqs(faq_text)
+        prompt = """
+        You are a brand analyst and data extraction assistant. Below are two texts from the same company's website.
+        From the ABOUT text, summarize the brand in 2-3 sentences. Focus on:
+        - Brand mission and values
+        - What they do/sell
+        - Their unique story or background
+        - Target audience
+        From the FAQ text, extract ALL question-and-answer pairs. Look for:
+        - Questions in headings (h1-h6) with answers in following paragraphs
+        - Definition lists (dt/dd pairs)
+        - Any text patterns like "Q:" and "A:" or "Question:" and "Answer:"
+        - Section titles that look like questions
+        - Accordion-style content
+        Return ONLY valid JSON in this exact format:
+        {"brand_context": "...", "faqs": [{"question": "...", "answer": "..."}]}
+        Use null for brand_context if the ABOUT text says nothing about the brand, and [] for faqs if none are found.
+        """
+        
+        async def generate(payload: str) -> dict:
+            data = self._response_json(await self.gateway.generate(self.model, prompt + payload), dict)
+            if not isinstance(data.get('faqs'), list):
+                raise UnusableResponseError(f"faqs is not a list: {data.get('faqs')!r}")
+            brand_context = data.get('brand_context')
+            if brand_context is not None and not isinstance(brand_context, str):
+                raise UnusableResponseError(f"brand_context is not a string: {brand_context!r}")
+            return {
+                'brand_context': (brand_context or '').strip() or None,
+                'faqs': [FAQSchema(**faq).model_dump() for faq in data['faqs']]
+            }
+        
+        about_text = truncate_to_tokens(about_text, settings.LLM_ABOUT_TOKEN_BUDGET)
+        faq_text = truncate_to_tokens(faq_text, settings.LLM_FAQ_TOKEN_BUDGET)
+        payload = f"\n### ABOUT\n{about_text}\n### FAQ\n{faq_text}"
+        try:
+            content = await self._cached('extract_store_content', payload, generate)
+            return content['brand_context'], [FAQSchema(**faq) for faq in content['faqs']]
+        except LLMUnavailableError as e:
+            # Separate calls would fail the same way
+            logger.warning(f"Skipping LLM brand context and FAQs: {e}")
+            return None, []
+        except Exception as e:
+            logger.warning(f"Combined LLM extraction failed, falling back to separate calls: {e}")
+        brand_context, faqs = await asyncio.gather(self.extract_brand_context(about_text), self.extract_faqs(faq_text))
+        return brand_context, faqs
+    
     async def find_competitors(self, brand_name: str, industry: str) -> List[str]:
         if not brand_name:
             return []
@@ -81,13 +190,14 @@ class LLMService:
         ["https://competitor1.com", "https://competitor2.com", ...]
         Focus on direct competitors with similar products/services.
         """
+        
+        async def generate(payload: str) -> List[str]:
+            return self._response_json(await self.gateway.generate(self.model, prompt), list)
+        
         try:
-            response = await self.model.generate_content_async(prompt)
-            if response.parts:
-                response_text = response.text.strip()
-                response_text = re.sub(r'```json\s*|\s*```', '', response_text)
-                if response_text.startswith('[') and response_text.endswith(']'):
-                    return json.loads(response_text)
+            return await self._cached('find_competitors', f"{brand_name}\n{industry}", generate)
+        except (LLMUnavailableError, UnusableResponseError) as e:
+            logger.warning(f"Skipping LLM competitors: {e}")
         except Exception as e:
             logger.error(f"Error finding competitors with LLM: {e}")
-        return [] 
\ No newline at end of file
+        return []
\ No newline at end of file
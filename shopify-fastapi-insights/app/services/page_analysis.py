@@ -0,0 +1,290 @@
+"""CPU-bound page parsing as picklable module-level functions, run via parse_executor."""
+import json
+import re
+from typing import Any, Dict, Iterator, List, NamedTuple, Optional
+from urllib.parse import urljoin, urlparse
+import logging
+
+from app.core.config import settings
+from app.models.schemas import ProductSchema
+from app.services.extraction import ExtractionResult, extraction_engine
+from app.services.parsed_page import ParsedPage
+
+logger = logging.getLogger(__name__)
+
+HERO_SELECTORS = ('.hero-product', '.featured-product', '.product-card', '[data-product-id]', '.product-item')
+PRICE_REGEX = re.compile(r'[\d,]+\.?\d*')
+JSON_LD_REGEX = re.compile(
+    r'<script[^>]+type\s*=\s*["\']?application/ld\+json["\']?[^>]*>(.*?)</script>',
+    re.IGNORECASE | re.DOTALL
+)
+# Themes embed the Liquid ``product | json`` for product cards and quick views
+PRODUCT_JSON_REGEX = re.compile(
+    r'<script[^>]*(?:data-product-json|id\s*=\s*["\']ProductJson-[^"\']*["\'])[^>]*>(.*?)</script>',
+    re.IGNORECASE | re.DOTALL
+)
+PRODUCT_HANDLE_REGEX = re.compile(r'/products/([^/?#]+)')
+
+# Page chrome dropped before text is prepared for the LLM; header and footer only outside <main>
+CHROME_TAGS = ('script', 'style', 'noscript', 'template', 'svg', 'iframe', 'form', 'nav', 'aside', 'button')
+CHROME_ATTR_REGEX = re.compile(
+    r'cookie|consent|gdpr|newsletter|popup|modal|drawer|announcement|breadcrumb|skip-link|visually-hidden|sr-only',
+    re.IGNORECASE
+)
+INLINE_TAGS = ('a', 'b', 'strong', 'i', 'em', 'u', 'span', 'small', 'sup', 'sub', 'mark', 'abbr', 'code')
+HEADING_TAGS = ('h1', 'h2', 'h3', 'h4', 'h5', 'h6')
+# Control characters marking where headings and questions were, so they survive get_text
+HEADING_MARK = '\x01'
+QUESTION_MARK = '\x02'
+
+
+class TextSection(NamedTuple):
+    kind: str  # 'text', 'heading' or 'question'
+    title: Optional[str]
+    lines: List[str]
+
+
+class PageSections(NamedTuple):
+    url: str
+    sections: List[TextSection]
+    raw_text_length: int  # characters of the page's plain main text
+
+
+class HomepageAnalysis(NamedTuple):
+    brand_name: Optional[str]
+    hero_products: List[ProductSchema]
+    details: ExtractionResult
+
+
+def analyze_homepage(url: str, html: str, base_url: str) -> HomepageAnalysis:
+    page = ParsedPage(url, html)
+    return HomepageAnalysis(
+        brand_name=extract_brand_name(page),
+        hero_products=extract_hero_products(page, base_url),
+        details=extraction_engine.extract(page, base_url)
+    )
+
+
+def extract_main_text(url: str, html: str) -> Optional[str]:
+    return ParsedPage(url, html).main_text
+
+
+def extract_llm_sections(url: str, html: str) -> Optional[PageSections]:
+    """The page's main content as sections under its headings; None when it has no text."""
+    page = ParsedPage(url, html)
+    raw_text = page.main_text or ''
+    soup = page.soup
+    root = soup.find('main') or soup.find(attrs={'role': 'main'}) or soup.body or soup
+    chrome_tags = CHROME_TAGS if root.name == 'main' else CHROME_TAGS + ('header', 'footer')
+    chrome = root.find_all(chrome_tags)
+    chrome.extend(
+        tag for tag in root.find_all(True)
+        if CHROME_ATTR_REGEX.search(' '.join(tag.get('class') or []) + ' ' + (tag.get('id') or ''))
+    )
+    for tag in chrome:
+        if not tag.decomposed:
+            tag.decompose()
+    for tag in root.find_all(INLINE_TAGS):
+        tag.unwrap()
+    root.smooth()
+    for tag in root.find_all(['summary', 'dt']):
+        tag.replace_with(f"\n{QUESTION_MARK}{' '.join(tag.get_text().split())}\n")
+    for tag in root.find_all(HEADING_TAGS):
+        tag.replace_with(f"\n{HEADING_MARK}{' '.join(tag.get_text().split())}\n")
+    
+    sections: List[TextSection] = []
+    current: Optional[TextSection] = None
+    seen = set()
+    for line in root.get_text(separator='\n', strip=True).splitlines():
+        line = ' '.join(line.split())
+        if line[:1] in (HEADING_MARK, QUESTION_MARK):
+            title = line[1:].strip()
+            kind = 'question' if line[0] == QUESTION_MARK or title.endswith('?') else 'heading'
+            current = TextSection(kind, title, [])
+            sections.append(current)
+            continue
+        key = line.casefold()
+        if len(key) < 2 or key in seen:
+            continue
+        seen.add(key)
+        if current is None:
+            current = TextSection('text', None, [])
+            sections.append(current)
+        current.lines.append(line)
+    sections = [section for section in sections if section.lines]
+    if not sections:
+        return None
+    return PageSections(url, sections, len(raw_text))
+
+
+def extract_brand_name(page: ParsedPage) -> Optional[str]:
+    soup = page.soup
+    title_tag = soup.find('title')
+    if title_tag:
+        return title_tag.get_text(strip=True).split(' - ')[0]
+    h1_tag = soup.find('h1')
+    if h1_tag:
+        return h1_tag.get_text(strip=True)
+    return None
+
+
+def extract_hero_products(page: ParsedPage, base_url: str) -> List[ProductSchema]:
+    """Products featured on a page: JSON-LD and inline product JSON first, CSS selectors as a fallback."""
+    hero_products = extract_structured_products(page.html, base_url)
+    if not hero_products:
+        hero_products = extract_hero_products_from_css(page, base_url)
+    return hero_products[:settings.HERO_PRODUCTS_LIMIT]
+
+
+def extract_structured_products(html: str, base_url: str) -> List[ProductSchema]:
+    # Regex over the raw HTML: only script bodies are read, the DOM is never walked.
+    # A product with fields of unexpected types is skipped, not the page: themes and apps write these by hand
+    products: Dict[str, ProductSchema] = {}
+    for match in PRODUCT_JSON_REGEX.finditer(html):
+        data = _load_json(match.group(1))
+        if isinstance(data, dict) and data.get('handle') and data.get('title'):
+            try:
+                product = _product_from_shopify_json(data, base_url)
+            except Exception as e:
+                logger.warning(f"Skipping malformed product JSON on {base_url}: {e}")
+                continue
+            products.setdefault(product.handle, product)
+    for match in JSON_LD_REGEX.finditer(html):
+        for item in _iter_json_ld_products(_load_json(match.group(1))):
+            try:
+                product = _product_from_json_ld(item, base_url)
+            except Exception as e:
+                logger.warning(f"Skipping malformed JSON-LD product on {base_url}: {e}")
+                continue
+            if product:
+                products.setdefault(product.handle, product)
+    return list(products.values())
+
+
+def extract_hero_products_from_css(page: ParsedPage, base_url: str) -> List[ProductSchema]:
+    hero_products = []
+    for selector in HERO_SELECTORS:
+        elements = page.soup.select(selector)
+        for element in elements[:6]:
+            try:
+                title = element.select_one('.product-title, .product-name, h3, h4')
+                price_elem = element.select_one('.price, .product-price')
+                link_elem = element.select_one('a[href*="/products/"]')
+                if title and price_elem and link_elem:
+                    price_text = price_elem.get_text(strip=True)
+                    hero_products.append(ProductSchema(
+                        id=len(hero_products) + 1,
+                        title=title.get_text(strip=True),
+                        handle=link_elem['href'].split('/')[-1],
+                        vendor="Unknown",
+                        product_type="Hero Product",
+                        price=extract_price(price_text),
+                        url=urljoin(base_url, link_elem['href']),
+                        is_hero_product=True
+                    ))
+            except Exception as e:
+                logger.warning(f"Error extracting hero product: {e}")
+                continue
+        if hero_products:
+            break
+    return hero_products
+
+
+def extract_price(price_text: str) -> float:
+    price_match = PRICE_REGEX.search(price_text.replace(',', ''))
+    if price_match:
+        try:
+            return float(price_match.group())
+        except ValueError:
+            pass
+    return 0.0
+
+
+def product_handle(url: str) -> Optional[str]:
+    match = PRODUCT_HANDLE_REGEX.search(urlparse(url).path)
+    return match.group(1) if match else None
+
+
+def _load_json(text: str) -> Any:
+    try:
+        return json.loads(text.strip())
+    except ValueError:
+        return None
+
+
+def _iter_json_ld_products(node: Any) -> Iterator[Dict]:
+    if isinstance(node, list):
+        for child in node:
+            yield from _iter_json_ld_products(child)
+    elif isinstance(node, dict):
+        node_type = node.get('@type')
+        types = node_type if isinstance(node_type, list) else [node_type]
+        if 'Product' in types or 'ProductGroup' in types:
+            yield node
+        elif '@graph' in node:
+            yield from _iter_json_ld_products(node['@graph'])
+        elif 'ItemList' in types:
+            for element in node.get('itemListElement') or []:
+                yield from _iter_json_ld_products(element.get('item', element) if isinstance(element, dict) else element)
+
+
+def _product_from_shopify_json(data: Dict, base_url: str) -> ProductSchema:
+    # Liquid's product JSON has prices in cents; products.json-style strings are in currency units
+    price = data.get('price')
+    if price is None and data.get('variants'):
+        price = data['variants'][0].get('price')
+    if isinstance(price, (int, float)):
+        price = price / 100
+    image_url = data.get('featured_image') or next(iter(data.get('images') or []), None)
+    if isinstance(image_url, dict):
+        image_url = image_url.get('src')
+    return ProductSchema(
+        id=data.get('id') or 0,
+        title=data['title'],
+        handle=data['handle'],
+        vendor=data.get('vendor') or 'Unknown',
+        product_type=data.get('type') or data.get('product_type') or 'N/A',
+        price=_to_price(price),
+        url=urljoin(base_url, f"/products/{data['handle']}"),
+        image_url=urljoin(base_url, image_url) if image_url else None,
+        is_hero_product=True
+    )
+
+
+def _product_from_json_ld(item: Dict, base_url: str) -> Optional[ProductSchema]:
+    url = urljoin(base_url, item.get('url') or item.get('@id') or '')
+    handle = product_handle(url)
+    if not handle or not item.get('name'):
+        return None
+    offers = item.get('offers') or {}
+    if isinstance(offers, list):
+        offers = offers[0] if offers else {}
+    brand = item.get('brand')
+    if isinstance(brand, dict):
+        brand = brand.get('name')
+    image_url = item.get('image')
+    if isinstance(image_url, list):
+        image_url = image_url[0] if image_url else None
+    if isinstance(image_url, dict):
+        image_url = image_url.get('url')
+    product_id = str(item.get('productID') or '')
+    return ProductSchema(
+        id=int(product_id) if product_id.isdigit() else 0,
+        title=item['name'],
+        handle=handle,
+        vendor=brand if isinstance(brand, str) and brand else 'Unknown',
+        product_type=item.get('category') if isinstance(item.get('category'), str) else 'N/A',
+        price=_to_price(offers.get('price', offers.get('lowPrice')) if isinstance(offers, dict) else None),
+        url=urljoin(base_url, f"/products/{handle}"),
+        image_url=urljoin(base_url, image_url) if isinstance(image_url, str) else None,
+        description=item['description'][:500] if isinstance(item.get('description'), str) else None,
+        is_hero_product=True
+    )
+
+
+def _to_price(value: Any) -> float:
+    if isinstance(value, (int, float)):
+        return float(value)
+    if isinstance(value, str):
+        return extract_price(value)
+    return 0.0
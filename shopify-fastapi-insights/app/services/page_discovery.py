@@ -0,0 +1,92 @@
+import re
+from typing import Dict, List
+from urllib.parse import urljoin, urlparse
+from urllib.robotparser import RobotFileParser
+import logging
+
+from app.core.config import settings
+from app.services.scraper import WebScraper
+
+logger = logging.getLogger(__name__)
+
+PAGE_TYPE_PATTERNS = {
+    'privacy': r'privacy',
+    'refund': r'refunds?|returns?',
+    'shipping': r'shipping|delivery',
+    'faq': r'faqs?|frequently-asked|questions|help',
+    'about': r'about|our-story|who-we-are',
+    'contact': r'contact',
+    'terms': r'terms',
+    'tracking': r'track',
+}
+
+PAGE_TYPE_REGEX = re.compile(
+    '|'.join(f'(?P<{page_type}>{pattern})' for page_type, pattern in PAGE_TYPE_PATTERNS.items()),
+    re.IGNORECASE
+)
+
+# Sections of a sitemap index that never list content pages
+SKIPPED_SITEMAP_REGEX = re.compile(r'product|collection|blog|post|article|image|video|categor|tag|author', re.IGNORECASE)
+PAGES_SITEMAP_REGEX = re.compile(r'pages', re.IGNORECASE)
+SKIPPED_PATH_PREFIXES = ('/products/', '/collections/', '/blogs/', '/cart', '/checkout', '/account', '/search')
+
+MAX_PATHS_PER_TYPE = 3
+
+
+class PageDiscovery:
+    """Finds a store's policy, about, FAQ and similar pages from robots.txt and its sitemaps."""
+
+    def __init__(self, scraper: WebScraper):
+        self.scraper = scraper
+
+    async def discover(self, base_url: str) -> Dict[str, List[str]]:
+        robots = RobotFileParser()
+        robots_txt = await self.scraper.get_robots_txt(base_url)
+        robots.parse((robots_txt or '').splitlines())
+        sitemaps = robots.site_maps() or [urljoin(base_url, '/sitemap.xml')]
+        host = self.scraper.get_host_key(base_url)
+        pages: Dict[str, List[str]] = {}
+        seen = set()
+        fetched = 0
+        while sitemaps and fetched < settings.DISCOVERY_MAX_SITEMAPS:
+            sitemap_url = sitemaps.pop(0)
+            if sitemap_url in seen:
+                continue
+            seen.add(sitemap_url)
+            fetched += 1
+            children = []
+            try:
+                async for tag, loc in self.scraper.iter_sitemap(sitemap_url):
+                    if tag == 'sitemap':
+                        children.append(loc)
+                    elif self.scraper.get_host_key(loc) == host and robots.can_fetch(self.scraper.headers['User-Agent'], loc):
+                        self._classify(urlparse(loc).path, pages)
+            except Exception as e:
+                logger.info(f"Could not read sitemap {sitemap_url}: {e}")
+                continue
+            sitemaps.extend(self._select_children(children))
+        for page_type, paths in pages.items():
+            pages[page_type] = sorted(paths, key=self._rank)[:MAX_PATHS_PER_TYPE]
+        logger.info(f"Discovered {sum(len(paths) for paths in pages.values())} pages for {base_url} in {fetched} sitemaps")
+        return pages
+
+    def _select_children(self, children: List[str]) -> List[str]:
+        pages_sitemaps = [child for child in children if PAGES_SITEMAP_REGEX.search(urlparse(child).path)]
+        if pages_sitemaps:
+            return pages_sitemaps
+        return [child for child in children if not SKIPPED_SITEMAP_REGEX.search(urlparse(child).path)]
+
+    def _classify(self, path: str, pages: Dict[str, List[str]]) -> None:
+        path = path.rstrip('/') or '/'
+        if path.startswith(SKIPPED_PATH_PREFIXES) or path.count('/') > 2:
+            return
+        slug = path.rsplit('/', 1)[-1]
+        for match in PAGE_TYPE_REGEX.finditer(slug):
+            paths = pages.setdefault(match.lastgroup, [])
+            if path not in paths:
+                paths.append(path)
+
+    def _rank(self, path: str) -> tuple:
+        # Shopify content pages first, then the shortest slug, which is least likely to be a sub-topic
+        return (not path.startswith(('/pages/', '/policies/')), len(path.rsplit('/', 1)[-1]), path)
+
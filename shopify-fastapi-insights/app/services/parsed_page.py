@@ -0,0 +1,78 @@
+from bs4 import BeautifulSoup
+from typing import List, Mapping, NamedTuple, Optional
+import logging
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+try:
+    import lxml  # noqa: F401
+    LXML_AVAILABLE = True
+except ImportError:
+    LXML_AVAILABLE = False
+
+
+def resolve_parser(preferred: Optional[str] = None) -> str:
+    parser = preferred or settings.HTML_PARSER
+    if parser == 'lxml' and not LXML_AVAILABLE:
+        return 'html.parser'
+    return parser
+
+
+class Anchor(NamedTuple):
+    href: str
+    text: str
+
+
+class ParsedPage:
+    """A fetched page parsed once, with derived views computed lazily and cached."""
+
+    def __init__(self, url: str, html: str, parser: Optional[str] = None, headers: Optional[Mapping[str, str]] = None):
+        self.url = url
+        self.html = html
+        self.headers = headers
+        self.parser = resolve_parser(parser)
+        self._soup: Optional[BeautifulSoup] = None
+        self._html_lower: Optional[str] = None
+        self._text: Optional[str] = None
+        self._main_text: Optional[str] = None
+        self._main_text_loaded = False
+        self._anchors: Optional[List[Anchor]] = None
+
+    @property
+    def soup(self) -> BeautifulSoup:
+        if self._soup is None:
+            self._soup = BeautifulSoup(self.html, self.parser)
+        return self._soup
+
+    @property
+    def html_lower(self) -> str:
+        if self._html_lower is None:
+            self._html_lower = self.html.lower()
+        return self._html_lower
+
+    @property
+    def text(self) -> str:
+        if self._text is None:
+            self._text = self.soup.get_text()
+        return self._text
+
+    @property
+    def main_text(self) -> Optional[str]:
+        if not self._main_text_loaded:
+            soup = self.soup
+            main_content = soup.find('main') or soup.find('div', class_='main-content') or soup.find('body')
+            if main_content:
+                self._main_text = main_content.get_text(separator='\n', strip=True)
+            self._main_text_loaded = True
+        return self._main_text
+
+    @property
+    def anchors(self) -> List[Anchor]:
+        if self._anchors is None:
+            self._anchors = [
+                Anchor(href=link['href'], text=link.get_text(strip=True))
+                for link in self.soup.find_all('a', href=True)
+            ]
+        return self._anchors
@@ -0,0 +1,175 @@
+import asyncio
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Dict, List, NamedTuple, Optional, Tuple
+import logging
+
+from sqlalchemy import select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from app.core.config import settings
+from app.core.database import PathStat, async_session_maker
+
+logger = logging.getLogger(__name__)
+
+GLOBAL_HOST = '*'
+MAX_PATH_LENGTH = 255
+
+# Pseudo-observations of the fleet-wide rate mixed into a host's own counts
+PRIOR_WEIGHT = 2.0
+
+StatKey = Tuple[str, str]  # (page type, path)
+
+
+class Counts(NamedTuple):
+    hits: int
+    misses: int
+    dead_until: Optional[datetime]
+
+
+class _Delta:
+    __slots__ = ('hits', 'misses', 'dead_until', 'set_dead')
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.dead_until: Optional[datetime] = None
+        self.set_dead = False
+
+
+class PathStats:
+    """Learned ordering of candidate page paths and a negative cache of dead ones."""
+
+    MAX_CACHED_HOSTS = 10000
+
+    def __init__(self, session_maker: async_sessionmaker = async_session_maker):
+        self.session_maker = session_maker
+        self._global: Dict[StatKey, Counts] = {}
+        self._global_loaded_at = 0.0
+        self._hosts: "OrderedDict[str, Tuple[float, Dict[StatKey, Counts]]]" = OrderedDict()
+        self._pending: Dict[Tuple[str, str, str], _Delta] = {}
+        self._lock = asyncio.Lock()
+        self.skipped_dead = 0
+
+    async def order(self, host: str, page_type: str, paths: List[str]) -> List[str]:
+        if not settings.PATH_STATS_ENABLED or not paths:
+            return paths
+        try:
+            await self._load_global()
+            host_stats = await self._load_host(host)
+        except Exception as e:
+            logger.warning(f"Could not load path stats for {host}: {e}")
+            return paths
+        now = datetime.utcnow()
+        alive = []
+        for index, path in enumerate(paths):
+            counts = host_stats.get((page_type, path))
+            if counts and counts.dead_until and counts.dead_until > now:
+                self.skipped_dead += 1
+                continue
+            alive.append((-self._hit_rate(counts, self._global.get((page_type, path))), index, path))
+        return [path for _, _, path in sorted(alive)]
+
+    def record(self, host: str, page_type: str, path: str, hit: bool, dead: bool = False) -> None:
+        if not settings.PATH_STATS_ENABLED or len(path) > MAX_PATH_LENGTH:
+            return
+        dead_until = datetime.utcnow() + timedelta(seconds=settings.PATH_NEGATIVE_TTL) if dead else None
+        for key_host in (host, GLOBAL_HOST):
+            delta = self._pending.setdefault((key_host, page_type, path), _Delta())
+            if hit:
+                delta.hits += 1
+            else:
+                delta.misses += 1
+            if key_host != GLOBAL_HOST:
+                # Latest outcome wins: a hit clears the negative cache, a 404 sets it
+                delta.dead_until, delta.set_dead = dead_until, True
+        cached = [self._global]
+        if host in self._hosts:
+            cached.append(self._hosts[host][1])
+        for stats in cached:
+            hits, misses, previous_dead = stats.get((page_type, path), Counts(0, 0, None))
+            stats[(page_type, path)] = Counts(
+                hits + hit, misses + (not hit), dead_until if stats is not self._global else previous_dead
+            )
+
+    async def flush(self) -> None:
+        if not self._pending:
+            return
+        pending, self._pending = self._pending, {}
+        try:
+            async with self.session_maker() as db:
+                for (host, page_type, path), delta in pending.items():
+                    values = {
+                        'hits': PathStat.hits + delta.hits,
+                        'misses': PathStat.misses + delta.misses,
+                        'updated_at': datetime.utcnow()
+                    }
+                    if delta.set_dead:
+                        values['dead_until'] = delta.dead_until
+                    where = (PathStat.host == host, PathStat.page_type == page_type, PathStat.path == path)
+                    result = await db.execute(update(PathStat).where(*where).values(**values))
+                    if result.rowcount:
+                        continue
+                    try:
+                        async with db.begin_nested():
+                            db.add(PathStat(
+                                host=host, page_type=page_type, path=path,
+                                hits=delta.hits, misses=delta.misses, dead_until=delta.dead_until
+                            ))
+                    except IntegrityError:
+                        # Another process inserted the row first
+                        await db.execute(update(PathStat).where(*where).values(**values))
+                await db.commit()
+        except Exception as e:
+            logger.warning(f"Could not store path stats: {e}")
+
+    def _hit_rate(self, counts: Optional[Counts], global_counts: Optional[Counts]) -> float:
+        global_hits, global_misses = (global_counts.hits, global_counts.misses) if global_counts else (0, 0)
+        prior = (global_hits + 1) / (global_hits + global_misses + 2)
+        if not counts:
+            return prior
+        return (counts.hits + PRIOR_WEIGHT * prior) / (counts.hits + counts.misses + PRIOR_WEIGHT)
+
+    async def _load_global(self) -> None:
+        if time.monotonic() - self._global_loaded_at < settings.PATH_STATS_REFRESH:
+            return
+        async with self._lock:
+            if time.monotonic() - self._global_loaded_at < settings.PATH_STATS_REFRESH:
+                return
+            async with self.session_maker() as db:
+                result = await db.execute(
+                    select(PathStat.page_type, PathStat.path, PathStat.hits, PathStat.misses)
+                    .where(PathStat.host == GLOBAL_HOST)
+                )
+                self._global = {(page_type, path): Counts(hits, misses, None) for page_type, path, hits, misses in result}
+            self._global_loaded_at = time.monotonic()
+
+    async def _load_host(self, host: str) -> Dict[StatKey, Counts]:
+        cached = self._hosts.get(host)
+        if cached is not None and time.monotonic() - cached[0] < settings.PATH_STATS_REFRESH:
+            self._hosts.move_to_end(host)
+            return cached[1]
+        async with self.session_maker() as db:
+            result = await db.execute(
+                select(PathStat.page_type, PathStat.path, PathStat.hits, PathStat.misses, PathStat.dead_until)
+                .where(PathStat.host == host)
+            )
+            stats = {(page_type, path): Counts(hits, misses, dead_until) for page_type, path, hits, misses, dead_until in result}
+        self._hosts[host] = (time.monotonic(), stats)
+        self._hosts.move_to_end(host)
+        while len(self._hosts) > self.MAX_CACHED_HOSTS:
+            self._hosts.popitem(last=False)
+        return stats
+
+    def metrics(self) -> Dict[str, int]:
+        return {
+            'cached_hosts': len(self._hosts),
+            'global_paths': len(self._global),
+            'pending_writes': len(self._pending),
+            'skipped_dead_paths': self.skipped_dead,
+        }
+
+
+path_stats = PathStats()
@@ -0,0 +1,251 @@
+from typing import Any, AsyncIterator, Dict, List, NamedTuple, Optional, Tuple
+import logging
+
+from sqlalchemy import select, delete, insert, func, literal, or_, and_
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.compression import decompress_json
+from app.core.database import BrandInsight, Product
+from app.core.exceptions import InvalidCursorError
+from app.core.pagination import encode_cursor, decode_cursor
+from app.models.schemas import ProductPageResponse, ProductSchema, ProductSort
+
+logger = logging.getLogger(__name__)
+
+# Columns copied when an unchanged catalog page is carried over into a new generation
+COPIED_COLUMNS = (
+    'brand_insight_id', 'product_id', 'title', 'handle', 'vendor', 'product_type',
+    'price', 'url', 'image_url', 'description', 'is_hero_product'
+)
+
+class CatalogState(NamedTuple):
+    # The generation an insight's catalog is served from, and whether it has rows there yet
+    generation: int
+    has_products: bool
+
+class ProductService:
+    """Normalized copy of each store's catalog in the products table, paged with keyset cursors."""
+
+    INSERT_BATCH_SIZE = 1000
+    STREAM_BATCH_SIZE = 1000
+
+    # A new catalog is written batch by batch under the generation after the live one, and
+    # swapped in by the extraction's final commit; readers only ever see the live generation
+
+    async def start_generation(self, brand_insight_id: int, live_generation: int, db: AsyncSession) -> int:
+        # Rows left staged by an extraction that failed part way are dropped first
+        await db.execute(
+            delete(Product).where(Product.brand_insight_id == brand_insight_id, Product.generation != live_generation)
+        )
+        await db.commit()
+        return live_generation + 1
+
+    async def stage(self, brand_insight_id: int, generation: int, products: List[Dict[str, Any]], db: AsyncSession) -> None:
+        # A product repeated across pages keeps its first row
+        rows = self._to_rows(brand_insight_id, products, generation)
+        for start in range(0, len(rows), self.INSERT_BATCH_SIZE):
+            await db.execute(
+                insert(Product).prefix_with('IGNORE', dialect='mysql').prefix_with('OR IGNORE', dialect='sqlite'),
+                rows[start:start + self.INSERT_BATCH_SIZE]
+            )
+
+    async def carry_over(
+        self,
+        brand_insight_id: int,
+        from_generation: int,
+        to_generation: int,
+        product_ids: List[int],
+        db: AsyncSession
+    ) -> bool:
+        # Copies a page's products from the live generation; False when any of them is not stored there
+        product_ids = list(dict.fromkeys(product_ids))
+        live = (
+            Product.brand_insight_id == brand_insight_id,
+            Product.generation == from_generation,
+            Product.product_id.in_(product_ids)
+        )
+        if await db.scalar(select(func.count()).select_from(Product).where(*live)) != len(product_ids):
+            return False
+        columns = [getattr(Product, name) for name in COPIED_COLUMNS]
+        await db.execute(
+            insert(Product)
+            .prefix_with('IGNORE', dialect='mysql')
+            .prefix_with('OR IGNORE', dialect='sqlite')
+            .from_select(
+                [*COPIED_COLUMNS, 'generation'],
+                select(*columns, literal(to_generation)).where(*live).order_by(Product.id)
+            )
+        )
+        return True
+
+    async def count(self, brand_insight_id: int, generation: int, db: AsyncSession) -> int:
+        return await db.scalar(
+            select(func.count()).select_from(Product)
+            .where(Product.brand_insight_id == brand_insight_id, Product.generation == generation)
+        )
+
+    async def discard(self, brand_insight_id: int, generation: int, db: AsyncSession) -> None:
+        await db.execute(
+            delete(Product).where(Product.brand_insight_id == brand_insight_id, Product.generation == generation)
+        )
+
+    async def swap(self, db_insights: BrandInsight, generation: int, db: AsyncSession) -> None:
+        # Runs inside the caller's final transaction, so readers move to the new generation with the rest of the insight
+        await db.execute(
+            delete(Product).where(Product.brand_insight_id == db_insights.id, Product.generation != generation)
+        )
+        db_insights.catalog_generation = generation
+        db_insights.product_catalog = None
+
+    async def find_by_handles(
+        self,
+        brand_insight_id: int,
+        generation: int,
+        handles: List[str],
+        db: AsyncSession
+    ) -> Dict[str, Dict[str, Any]]:
+        result = await db.execute(
+            select(Product)
+            .where(
+                Product.brand_insight_id == brand_insight_id,
+                Product.generation == generation,
+                Product.handle.in_(handles)
+            )
+            .order_by(Product.id)
+        )
+        found = {}
+        for product in result.scalars():
+            found.setdefault(product.handle, self._to_schema(product).model_dump())
+        return found
+
+    async def load_catalog(self, db_insights: BrandInsight, db: AsyncSession) -> List[ProductSchema]:
+        # Catalogs stored before the products table are still read from the blob
+        catalog = []
+        async for batch in self.iter_catalog(db_insights.id, db_insights.catalog_generation, db):
+            catalog.extend(self._to_schema(product) for product in batch)
+        if not catalog and db_insights.product_catalog:
+            catalog = [ProductSchema(**p) for p in db_insights.product_catalog]
+        return catalog
+
+    async def iter_catalog(self, brand_insight_id: int, generation: int, db: AsyncSession) -> AsyncIterator[List[Product]]:
+        result = await db.stream_scalars(
+            select(Product)
+            .where(Product.brand_insight_id == brand_insight_id, Product.generation == generation)
+            .order_by(Product.id)
+            .execution_options(yield_per=self.STREAM_BATCH_SIZE)
+        )
+        async for batch in result.partitions():
+            yield batch
+
+    async def catalog_state(self, brand_insight_id: int, db: AsyncSession) -> Optional[CatalogState]:
+        # None when there is no such insight
+        result = await db.execute(
+            select(
+                BrandInsight.catalog_generation,
+                select(Product.id).where(
+                    Product.brand_insight_id == BrandInsight.id,
+                    Product.generation == BrandInsight.catalog_generation
+                ).exists()
+            ).where(BrandInsight.id == brand_insight_id)
+        )
+        row = result.first()
+        return None if row is None else CatalogState(row[0], bool(row[1]))
+
+    async def list_products(
+        self,
+        brand_insight_id: int,
+        db: AsyncSession,
+        generation: int = 0,
+        has_products: bool = True,
+        product_type: Optional[str] = None,
+        vendor: Optional[str] = None,
+        min_price: Optional[float] = None,
+        max_price: Optional[float] = None,
+        sort: ProductSort = ProductSort.PRICE_ASC,
+        cursor: Optional[str] = None,
+        limit: int = 50
+    ) -> ProductPageResponse:
+        if not has_products:
+            await self._backfill(brand_insight_id, generation, db)
+        query = select(Product).where(Product.brand_insight_id == brand_insight_id, Product.generation == generation)
+        if product_type is not None:
+            query = query.where(Product.product_type == product_type)
+        if vendor is not None:
+            query = query.where(Product.vendor == vendor)
+        if min_price is not None:
+            query = query.where(Product.price >= min_price)
+        if max_price is not None:
+            query = query.where(Product.price <= max_price)
+        descending = sort == ProductSort.PRICE_DESC
+        if cursor:
+            price, last_id = self._decode_cursor(cursor)
+            if descending:
+                query = query.where(or_(Product.price < price, and_(Product.price == price, Product.id < last_id)))
+            else:
+                query = query.where(or_(Product.price > price, and_(Product.price == price, Product.id > last_id)))
+        if descending:
+            query = query.order_by(Product.price.desc(), Product.id.desc())
+        else:
+            query = query.order_by(Product.price, Product.id)
+        result = await db.execute(query.limit(limit + 1))
+        products = result.scalars().all()
+        next_cursor = None
+        if len(products) > limit:
+            products = products[:limit]
+            next_cursor = encode_cursor([products[-1].price, products[-1].id])
+        return ProductPageResponse(
+            items=[self._to_schema(product) for product in products],
+            next_cursor=next_cursor
+        )
+
+    async def _backfill(self, brand_insight_id: int, generation: int, db: AsyncSession) -> None:
+        # Catalogs ingested before the products table existed are copied over on first read
+        stored = await db.scalar(
+            select(BrandInsight.product_catalog).where(BrandInsight.id == brand_insight_id)
+        )
+        product_catalog = decompress_json(stored) if stored is not None else None
+        if not product_catalog:
+            return
+        logger.info(f"Backfilling {len(product_catalog)} products for insight {brand_insight_id}")
+        await self.stage(brand_insight_id, generation, product_catalog, db)
+        await db.commit()
+
+    def _to_rows(self, brand_insight_id: int, product_catalog: List[Dict[str, Any]], generation: int) -> List[Dict[str, Any]]:
+        rows = {}
+        for product in product_catalog:
+            rows.setdefault(product['id'], {
+                'brand_insight_id': brand_insight_id,
+                'generation': generation,
+                'product_id': product['id'],
+                'title': product['title'],
+                'handle': product['handle'],
+                'vendor': product['vendor'],
+                'product_type': product['product_type'],
+                'price': product['price'],
+                'url': product['url'],
+                'image_url': product.get('image_url'),
+                'description': product.get('description'),
+                'is_hero_product': product.get('is_hero_product', False),
+            })
+        return list(rows.values())
+
+    def _to_schema(self, product: Product) -> ProductSchema:
+        return ProductSchema(
+            id=product.product_id,
+            title=product.title,
+            handle=product.handle,
+            vendor=product.vendor,
+            product_type=product.product_type,
+            price=product.price,
+            url=product.url,
+            image_url=product.image_url,
+            description=product.description,
+            is_hero_product=product.is_hero_product
+        )
+
+    def _decode_cursor(self, cursor: str) -> Tuple[float, int]:
+        price, last_id = decode_cursor(cursor, 2)
+        try:
+            return float(price), int(last_id)
+        except (ValueError, TypeError):
+            raise InvalidCursorError()
@@ -0,0 +1,166 @@
+import asyncio
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Any, Dict, Optional
+import logging
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+THROTTLE_STATUS_CODES = (429, 503)
+
+class TokenBucket:
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+
+    def reserve(self, now: float) -> float:
+        # Takes a token, going negative if needed, and returns how long the caller must wait for it
+        self.tokens = min(self.burst, self.tokens + max(0.0, now - self.updated) * self.rate)
+        self.updated = max(self.updated, now)
+        self.tokens -= 1
+        if self.tokens >= 0:
+            return 0.0
+        return -self.tokens / self.rate
+
+
+class HostState:
+    def __init__(self, rate: float, burst: float):
+        self.bucket = TokenBucket(rate, burst)
+        self.blocked_until = 0.0
+        self.last_used = time.monotonic()
+        self.requests = 0
+        self.throttled = 0
+        self.waits = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+
+class HostRateLimiter:
+    """Token-bucket politeness scheduler keyed by host, under a global outbound budget."""
+
+    MAX_TRACKED_HOSTS = 10000
+
+    def __init__(
+        self,
+        host_rate: Optional[float] = None,
+        host_burst: Optional[float] = None,
+        global_rate: Optional[float] = None,
+        global_burst: Optional[float] = None,
+        min_host_rate: Optional[float] = None
+    ):
+        self.host_rate = settings.SCRAPER_HOST_RATE if host_rate is None else host_rate
+        self.host_burst = settings.SCRAPER_HOST_BURST if host_burst is None else host_burst
+        self.min_host_rate = settings.SCRAPER_MIN_HOST_RATE if min_host_rate is None else min_host_rate
+        self.global_bucket = TokenBucket(
+            settings.SCRAPER_GLOBAL_RATE if global_rate is None else global_rate,
+            settings.SCRAPER_GLOBAL_BURST if global_burst is None else global_burst
+        )
+        self._hosts: Dict[str, HostState] = {}
+        self.requests = 0
+        self.throttled = 0
+        self.waits = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    def _host(self, host: str) -> HostState:
+        state = self._hosts.get(host)
+        if state is None:
+            if len(self._hosts) >= self.MAX_TRACKED_HOSTS:
+                self._prune()
+            state = self._hosts[host] = HostState(self.host_rate, self.host_burst)
+        return state
+
+    def _prune(self) -> None:
+        now = time.monotonic()
+        idle = sorted(self._hosts.items(), key=lambda item: item[1].last_used)
+        for host, state in idle[:len(idle) // 2]:
+            if state.blocked_until <= now:
+                del self._hosts[host]
+
+    async def acquire(self, host: str) -> float:
+        state = self._host(host)
+        now = time.monotonic()
+        host_wait = max(state.bucket.reserve(now), state.blocked_until - now, 0.0)
+        global_wait = self.global_bucket.reserve(now + host_wait)
+        wait = host_wait + global_wait
+        state.last_used = now + wait
+        state.requests += 1
+        self.requests += 1
+        if wait > 0:
+            state.waits += 1
+            state.total_wait += wait
+            state.max_wait = max(state.max_wait, wait)
+            self.waits += 1
+            self.total_wait += wait
+            self.max_wait = max(self.max_wait, wait)
+            await asyncio.sleep(wait)
+        return wait
+
+    def record_response(self, host: str, status_code: int, retry_after: Optional[str] = None) -> Optional[float]:
+        # Returns the pause applied to the host when throttled, None otherwise
+        state = self._host(host)
+        bucket = state.bucket
+        if status_code in THROTTLE_STATUS_CODES:
+            state.throttled += 1
+            self.throttled += 1
+            bucket.rate = max(self.min_host_rate, bucket.rate / 2)
+            delay = self._parse_retry_after(retry_after)
+            if delay is None:
+                delay = 1.0 / bucket.rate
+            delay = min(delay, settings.SCRAPER_MAX_RETRY_AFTER)
+            state.blocked_until = max(state.blocked_until, time.monotonic() + delay)
+            logger.info(f"Throttled by {host} ({status_code}), pausing {delay:.1f}s at {bucket.rate:.2f} req/s")
+            return delay
+        if status_code < 400 and bucket.rate < self.host_rate:
+            bucket.rate = min(self.host_rate, bucket.rate + self.host_rate * 0.1)
+        return None
+
+    def _parse_retry_after(self, retry_after: Optional[str]) -> Optional[float]:
+        if not retry_after:
+            return None
+        try:
+            return max(0.0, float(retry_after))
+        except ValueError:
+            pass
+        try:
+            retry_at = parsedate_to_datetime(retry_after)
+        except (TypeError, ValueError):
+            return None
+        if retry_at.tzinfo is None:
+            retry_at = retry_at.replace(tzinfo=timezone.utc)
+        return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+
+    def metrics(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        busiest = sorted(self._hosts.items(), key=lambda item: item[1].total_wait, reverse=True)[:20]
+        return {
+            'host_rate': self.host_rate,
+            'global_rate': self.global_bucket.rate,
+            'tracked_hosts': len(self._hosts),
+            'requests': self.requests,
+            'throttled_responses': self.throttled,
+            'waits': self.waits,
+            'total_wait_seconds': round(self.total_wait, 3),
+            'mean_wait_seconds': round(self.total_wait / self.waits, 3) if self.waits else 0.0,
+            'max_wait_seconds': round(self.max_wait, 3),
+            'hosts': {
+                host: {
+                    'rate': round(state.bucket.rate, 3),
+                    'blocked_for_seconds': round(max(0.0, state.blocked_until - now), 3),
+                    'requests': state.requests,
+                    'throttled_responses': state.throttled,
+                    'waits': state.waits,
+                    'total_wait_seconds': round(state.total_wait, 3),
+                    'max_wait_seconds': round(state.max_wait, 3),
+                }
+                for host, state in busiest
+            },
+        }
+
+
+host_rate_limiter = HostRateLimiter()
@@ -1,39 +1,61 @@
 import httpx
-from bs4 import BeautifulSoup
 import asyncio
+import codecs
 import json
 import re
-from typing import List, Optional, Dict, Tuple
+import hashlib
+from typing import Any, AsyncIterator, Callable, Deque, List, NamedTuple, Optional, Dict, Tuple
+from collections import deque
+from xml.etree.ElementTree import XMLPullParser
 from urllib.parse import urlparse, urljoin
 import logging
-from datetime import datetime
 
 from app.models.schemas import (
-    ProductSchema, FAQSchema, ContactDetailsSchema, 
+    ProductSchema, ContactDetailsSchema,
     SocialHandlesSchema, ImportantLinksSchema
 )
-from app.core.exceptions import WebsiteNotFoundError, ScrapingError
+from app.core.exceptions import WebsiteNotFoundError, ScrapingError, PageNotModified
 from app.core.config import settings
+from app.core.executor import parse_executor
+from app.services import page_analysis
+from app.services.page_analysis import HomepageAnalysis, PageSections
+from app.services.parsed_page import ParsedPage
+from app.services.extraction import ExtractionResult, extraction_engine
+from app.services.rate_limiter import HostRateLimiter, host_rate_limiter
 
 logger = logging.getLogger(__name__)
 
+HTML_CONTENT_TYPES = ('text/html', 'application/xhtml+xml', 'text/plain')
+CHARSET_SNIFF_BYTES = 4096
+META_CHARSET_REGEX = re.compile(rb'<meta[^>]+charset\s*=\s*["\']?([A-Za-z0-9_:.-]+)', re.IGNORECASE)
+ROBOTS_MAX_BYTES = 512 * 1024
+
+class StreamedBody(NamedTuple):
+    content: bytes  # empty when the body was decoded to text
+    text: Optional[str]
+    content_hash: str
+    truncated: bool
+
 class WebScraper:
-    def __init__(self):
+    def __init__(self, client: httpx.AsyncClient, rate_limiter: Optional[HostRateLimiter] = None):
+        self.client = client
+        self.rate_limiter = rate_limiter or host_rate_limiter
         self.timeout = settings.HTTP_TIMEOUT
         self.headers = {
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
         }
     
-    async def get_soup(self, url: str, client: httpx.AsyncClient) -> BeautifulSoup:
+    async def get_page(self, url: str, validators: Optional[Dict[str, Dict]] = None) -> ParsedPage:
         try:
-            response = await client.get(
-                url, 
-                headers=self.headers, 
-                timeout=self.timeout,
-                follow_redirects=True
+            response, body = await self._conditional_get(
+                url, validators,
+                follow_redirects=True,
+                max_bytes=settings.MAX_PAGE_BYTES,
+                content_types=HTML_CONTENT_TYPES,
+                decode=True
             )
             response.raise_for_status()
-            return BeautifulSoup(response.text, 'html.parser')
+            return ParsedPage(str(response.url), body.text, headers=response.headers)
         except httpx.HTTPStatusError as e:
             if e.response.status_code == 404:
                 raise WebsiteNotFoundError(f"Page not found: {url}")
@@ -41,152 +63,358 @@ class WebScraper:
         except httpx.RequestError as e:
             raise ScrapingError(f"Network error for {url}: {str(e)}")
     
+    async def get_page_head(
+        self,
+        url: str,
+        max_bytes: int,
+        read_body: Callable[[httpx.Headers], bool]
+    ) -> Tuple[httpx.Headers, Optional[str]]:
+        """Returns the response headers and, if read_body(headers) is true, the first max_bytes of the page as text."""
+        try:
+            response = await self._throttled_get(url, dict(self.headers), True)
+        except httpx.RequestError as e:
+            raise ScrapingError(f"Network error for {url}: {str(e)}")
+        try:
+            if response.status_code == 404:
+                raise WebsiteNotFoundError(f"Page not found: {url}")
+            if not response.is_success:
+                raise ScrapingError(f"HTTP error {response.status_code} for {url}")
+            if not read_body(response.headers):
+                return response.headers, None
+            body = await self._read_body(url, response, max_bytes, truncate=True, decode=True)
+            return response.headers, body.text
+        finally:
+            await response.aclose()
+    
+    async def get_json(self, url: str, max_bytes: Optional[int] = None) -> Optional[Any]:
+        """Returns the decoded JSON body, or None when the response is not a success or not JSON."""
+        response, body = await self._conditional_get(url, follow_redirects=True, max_bytes=max_bytes)
+        if not response.is_success:
+            return None
+        try:
+            return json.loads(body.content)
+        except ValueError:
+            return None
+    
+    async def get_robots_txt(self, base_url: str) -> Optional[str]:
+        url = urljoin(base_url, '/robots.txt')
+        try:
+            response, body = await self._conditional_get(url, follow_redirects=True, max_bytes=ROBOTS_MAX_BYTES, decode=True)
+        except (httpx.HTTPError, ScrapingError) as e:
+            logger.info(f"Could not fetch {url}: {e}")
+            return None
+        return body.text if response.is_success else None
+    
+    async def iter_sitemap(self, url: str) -> AsyncIterator[Tuple[str, str]]:
+        """Yields (tag, loc) for every <sitemap> and <url> entry, parsing the XML as it streams in."""
+        response = await self._throttled_get(url, dict(self.headers), True)
+        try:
+            if not response.is_success:
+                raise ScrapingError(f"HTTP error {response.status_code} for {url}")
+            parser = XMLPullParser(events=('end',))
+            received = 0
+            async for chunk in response.aiter_bytes():
+                received += len(chunk)
+                if received > settings.MAX_SITEMAP_BYTES:
+                    logger.info(f"Stopped reading {url} at {settings.MAX_SITEMAP_BYTES} bytes")
+                    break
+                parser.feed(chunk)
+                for _, element in parser.read_events():
+                    tag = element.tag.rsplit('}', 1)[-1]
+                    if tag in ('sitemap', 'url'):
+                        loc = element.findtext('{*}loc') or element.findtext('loc')
+                        if loc and loc.strip():
+                            yield tag, loc.strip()
+                        element.clear()
+        finally:
+            await response.aclose()
+    
+    async def _conditional_get(
+        self,
+        url: str,
+        validators: Optional[Dict[str, Dict]] = None,
+        follow_redirects: bool = False,
+        max_bytes: Optional[int] = None,
+        content_types: Optional[Tuple[str, ...]] = None,
+        decode: bool = False
+    ) -> Tuple[httpx.Response, StreamedBody]:
+        headers = dict(self.headers)
+        previous = validators.get(url) if validators is not None else None
+        if previous:
+            if previous.get('etag'):
+                headers['If-None-Match'] = previous['etag']
+            if previous.get('last_modified'):
+                headers['If-Modified-Since'] = previous['last_modified']
+        response = await self._throttled_get(url, headers, follow_redirects)
+        try:
+            if response.status_code == 304 and previous:
+                raise PageNotModified(url)
+            if not response.is_success:
+                return response, StreamedBody(b'', None, '', False)
+            if content_types:
+                self._check_content_type(url, response, content_types)
+            body = await self._read_body(url, response, max_bytes or settings.MAX_JSON_BYTES, truncate=decode, decode=decode)
+        finally:
+            await response.aclose()
+        if validators is not None:
+            validators[url] = {
+                **(previous or {}),
+                'etag': response.headers.get('etag'),
+                'last_modified': response.headers.get('last-modified'),
+                'content_hash': body.content_hash
+            }
+            if previous and previous.get('content_hash') == body.content_hash:
+                raise PageNotModified(url)
+        return response, body
+    
+    def _check_content_type(self, url: str, response: httpx.Response, content_types: Tuple[str, ...]) -> None:
+        content_type = response.headers.get('content-type', '').split(';')[0].strip().lower()
+        if content_type and content_type not in content_types:
+            raise ScrapingError(f"Unsupported content type {content_type} for {url}")
+    
+    async def _read_body(self, url: str, response: httpx.Response, max_bytes: int, truncate: bool, decode: bool) -> StreamedBody:
+        # Reads at most max_bytes; past that the rest is dropped (truncate) or the fetch fails.
+        # With decode the body is decoded chunk by chunk and only the text is kept.
+        content_length = response.headers.get('content-length')
+        if not truncate and content_length and content_length.isdigit() and int(content_length) > max_bytes:
+            raise ScrapingError(f"Response of {content_length} bytes exceeds {max_bytes} bytes for {url}")
+        try:
+            return await asyncio.wait_for(
+                self._stream_body(url, response, max_bytes, truncate, decode),
+                timeout=self.timeout
+            )
+        except asyncio.TimeoutError:
+            raise ScrapingError(f"Timed out reading body of {url}")
+    
+    async def _stream_body(self, url: str, response: httpx.Response, max_bytes: int, truncate: bool, decode: bool) -> StreamedBody:
+        digest = hashlib.sha256()
+        received = 0
+        truncated = False
+        head = bytearray()
+        chunks: List[bytes] = []
+        parts: List[str] = []
+        decoder = None
+        async for chunk in response.aiter_bytes():
+            if received + len(chunk) > max_bytes:
+                if not truncate:
+                    raise ScrapingError(f"Response exceeds {max_bytes} bytes for {url}")
+                chunk = chunk[:max_bytes - received]
+                truncated = True
+            received += len(chunk)
+            digest.update(chunk)
+            if not decode:
+                chunks.append(chunk)
+            elif decoder is None:
+                # Buffer until the meta charset declaration, if any, is in view
+                head.extend(chunk)
+                if len(head) >= CHARSET_SNIFF_BYTES:
+                    decoder = self._incremental_decoder(response, bytes(head))
+                    parts.append(decoder.decode(bytes(head)))
+            else:
+                parts.append(decoder.decode(chunk))
+            if truncated:
+                logger.info(f"Truncated {url} at {max_bytes} bytes")
+                break
+        text = None
+        if decode:
+            if decoder is None:
+                decoder = self._incremental_decoder(response, bytes(head))
+                parts.append(decoder.decode(bytes(head)))
+            parts.append(decoder.decode(b'', final=True))
+            text = ''.join(parts)
+        return StreamedBody(b''.join(chunks), text, digest.hexdigest(), truncated)
+    
+    def _incremental_decoder(self, response: httpx.Response, head: bytes) -> codecs.IncrementalDecoder:
+        charset = None
+        if head.startswith(codecs.BOM_UTF8):
+            charset = 'utf-8-sig'
+        if charset is None:
+            charset = response.charset_encoding
+        if charset is None:
+            match = META_CHARSET_REGEX.search(head[:CHARSET_SNIFF_BYTES])
+            if match:
+                charset = match.group(1).decode('ascii')
+        try:
+            return codecs.getincrementaldecoder(charset or 'utf-8')(errors='replace')
+        except LookupError:
+            return codecs.getincrementaldecoder('utf-8')(errors='replace')
+    
+    async def _throttled_get(self, url: str, headers: Dict[str, str], follow_redirects: bool) -> httpx.Response:
+        # Returns the response unread; the caller streams the body and closes it
+        host = urlparse(url).netloc.lower()
+        for attempt in range(settings.SCRAPER_MAX_RETRIES + 1):
+            await self.rate_limiter.acquire(host)
+            request = self.client.build_request('GET', url, headers=headers, timeout=self.timeout)
+            response = await self.client.send(request, stream=True, follow_redirects=follow_redirects)
+            pause = self.rate_limiter.record_response(
+                host, response.status_code, response.headers.get('retry-after')
+            )
+            if pause is None or attempt == settings.SCRAPER_MAX_RETRIES:
+                return response
+            await response.aclose()
+            logger.info(f"Retrying {url} after throttled response {response.status_code}")
+        return response
+    
     def get_base_url(self, url: str) -> str:
         parsed = urlparse(url)
         return f"{parsed.scheme}://{parsed.netloc}"
     
-    def is_shopify_store(self, soup: BeautifulSoup) -> bool:
-        shopify_indicators = [
-            'shopify',
-            'cdn.shopify.com',
-            'myshopify.com',
-            'shopify-analytics'
-        ]
-        page_content = str(soup).lower()
-        return any(indicator in page_content for indicator in shopify_indicators)
-    
-    async def fetch_product_catalog(self, base_url: str, client: httpx.AsyncClient) -> List[ProductSchema]:
+    def normalize_base_url(self, url: str) -> str:
+        parsed = urlparse(url.strip())
+        scheme = (parsed.scheme or 'https').lower()
+        host = (parsed.hostname or '').lower().rstrip('.')
+        port = parsed.port
+        if port and (scheme, port) not in (('http', 80), ('https', 443)):
+            host = f"{host}:{port}"
+        return f"{scheme}://{host}"
+    
+    def get_host_key(self, url: str) -> str:
+        host = (urlparse(url).hostname or '').lower().rstrip('.')
+        return host[4:] if host.startswith('www.') else host
+    
+    async def analyze_homepage(self, page: ParsedPage, base_url: str) -> HomepageAnalysis:
+        return await parse_executor.run(page_analysis.analyze_homepage, page.url, page.html, base_url)
+    
+    async def extract_main_text(self, page: ParsedPage) -> Optional[str]:
+        return await parse_executor.run(page_analysis.extract_main_text, page.url, page.html)
+    
+    async def extract_llm_sections(self, page: ParsedPage) -> Optional[PageSections]:
+        return await parse_executor.run(page_analysis.extract_llm_sections, page.url, page.html)
+    
+    async def fetch_product_catalog(self, base_url: str) -> List[ProductSchema]:
         products = []
+        async for batch in self.iter_product_catalog(base_url):
+            products.extend(batch)
+        return products
+    
+    async def iter_product_catalog(
+        self,
+        base_url: str,
+        max_products: Optional[int] = None,
+        prefetch: Optional[int] = None
+    ) -> AsyncIterator[List[ProductSchema]]:
+        async for _, batch in self.iter_product_pages(base_url, max_products, prefetch):
+            yield batch
+    
+    async def iter_product_pages(
+        self,
+        base_url: str,
+        max_products: Optional[int] = None,
+        prefetch: Optional[int] = None,
+        validators: Optional[Dict[str, Dict]] = None
+    ) -> AsyncIterator[Tuple[str, Optional[List[ProductSchema]]]]:
+        # Yields (page_url, batch); batch is None for pages unchanged since the validators were recorded
+        limit = settings.PRODUCTS_PAGE_LIMIT
+        max_products = settings.MAX_PRODUCTS_PER_STORE if max_products is None else max_products
+        prefetch = settings.PRODUCTS_PAGE_PREFETCH if prefetch is None else prefetch
+        in_flight: Deque[asyncio.Task] = deque()
+        next_page = 1
+        yielded = 0
+        
+        def page_url(page: int) -> str:
+            return urljoin(base_url, f"/products.json?limit={limit}&page={page}")
+        
+        def schedule_page() -> None:
+            nonlocal next_page
+            in_flight.append(asyncio.create_task(
+                self._fetch_products_page(page_url(next_page), validators)
+            ))
+            next_page += 1
+        
         try:
-            products_url = urljoin(base_url, "/products.json")
-            response = await client.get(products_url, headers=self.headers, timeout=self.timeout)
-            response.raise_for_status()
-            data = response.json()
-            for item in data.get('products', []):
+            schedule_page()
+            while in_flight and yielded < max_products:
+                page_number = next_page - len(in_flight)
                 try:
-                    price = 0.0
-                    image_url = None
-                    if item.get('variants'):
-                        try:
-                            price = float(item['variants'][0].get('price', 0.0))
-                        except (ValueError, TypeError):
-                            price = 0.0
-                    if item.get('images'):
-                        image_url = item['images'][0].get('src')
-                    products.append(ProductSchema(
-                        id=item['id'],
-                        title=item['title'],
-                        handle=item['handle'],
-                        vendor=item['vendor'],
-                        product_type=item.get('product_type', 'N/A'),
-                        price=price,
-                        url=urljoin(base_url, f"/products/{item['handle']}"),
-                        image_url=image_url,
-                        description=item.get('body_html', '')[:500] if item.get('body_html') else None
-                    ))
+                    items = await in_flight.popleft()
+                except PageNotModified as e:
+                    items = None
+                    item_count = validators[e.url].get('items', 0)
                 except Exception as e:
-                    logger.warning(f"Skipping product due to error: {e}")
-                    continue
-        except Exception as e:
-            logger.warning(f"Could not fetch product catalog: {e}")
+                    logger.warning(f"Could not fetch product catalog page {page_number}: {e}")
+                    break
+                if items is not None:
+                    item_count = len(items)
+                is_last_page = item_count < limit
+                if not is_last_page:
+                    while len(in_flight) <= prefetch and (next_page - 1) * limit < max_products:
+                        schedule_page()
+                if items is None:
+                    yielded += min(item_count, max_products - yielded)
+                    yield page_url(page_number), None
+                else:
+                    batch = []
+                    for item in items[:max_products - yielded]:
+                        try:
+                            batch.append(self._build_product(item, base_url))
+                        except Exception as e:
+                            logger.warning(f"Skipping product due to error: {e}")
+                            continue
+                    yielded += len(batch)
+                    if batch:
+                        yield page_url(page_number), batch
+                if is_last_page:
+                    break
+        finally:
+            for task in in_flight:
+                task.cancel()
+            if in_flight:
+                await asyncio.gather(*in_flight, return_exceptions=True)
+    
+    async def fetch_collection_products(self, base_url: str, collection: str, limit: int) -> List[ProductSchema]:
+        """Products of a Shopify collection, in the collection's order; empty when the store has no such collection."""
+        data = await self.get_json(urljoin(base_url, f"/collections/{collection}/products.json?limit={limit}"))
+        if not isinstance(data, dict):
+            return []
+        products = []
+        for item in data.get('products') or []:
+            try:
+                products.append(self._build_product(item, base_url).model_copy(update={'is_hero_product': True}))
+            except Exception as e:
+                logger.warning(f"Skipping product due to error: {e}")
         return products
     
-    async def extract_hero_products(self, soup: BeautifulSoup, base_url: str) -> List[ProductSchema]:
-        hero_products = []
-        hero_selectors = [
-            '.hero-product',
-            '.featured-product',
-            '.product-card',
-            '[data-product-id]',
-            '.product-item'
-        ]
-        for selector in hero_selectors:
-            elements = soup.select(selector)
-            for element in elements[:6]:
-                try:
-                    title = element.select_one('.product-title, .product-name, h3, h4')
-                    price_elem = element.select_one('.price, .product-price')
-                    link_elem = element.select_one('a[href*="/products/"]')
-                    if title and price_elem and link_elem:
-                        price_text = price_elem.get_text(strip=True)
-                        price = self._extract_price(price_text)
-                        hero_products.append(ProductSchema(
-                            id=len(hero_products) + 1,
-                            title=title.get_text(strip=True),
-                            handle=link_elem['href'].split('/')[-1],
-                            vendor="Unknown",
-                            product_type="Hero Product",
-                            price=price,
-                            url=urljoin(base_url, link_elem['href']),
-                            is_hero_product=True
-                        ))
-                except Exception as e:
-                    logger.warning(f"Error extracting hero product: {e}")
-                    continue
-            if hero_products:
-                break
-        return hero_products
+    async def _fetch_products_page(self, page_url: str, validators: Optional[Dict[str, Dict]] = None) -> List[Dict]:
+        response, body = await self._conditional_get(page_url, validators)
+        response.raise_for_status()
+        items = json.loads(body.content).get('products', [])
+        if validators is not None:
+            validators[page_url]['items'] = len(items)
+        return items
     
-    def _extract_price(self, price_text: str) -> float:
-        price_match = re.search(r'[\d,]+\.?\d*', price_text.replace(',', ''))
-        if price_match:
+    def _build_product(self, item: Dict, base_url: str) -> ProductSchema:
+        price = 0.0
+        image_url = None
+        if item.get('variants'):
             try:
-                return float(price_match.group())
-            except ValueError:
-                pass
-        return 0.0
-    
-    def extract_contact_details(self, soup: BeautifulSoup) -> ContactDetailsSchema:
-        emails = set()
-        phones = set()
-        email_pattern = r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}\b'
-        emails.update(re.findall(email_pattern, soup.get_text()))
-        for link in soup.find_all('a', href=lambda x: x and x.startswith('mailto:')):
-            email = link['href'].replace('mailto:', '').split('?')[0]
-            emails.add(email)
-        phone_pattern = r'(\+?\d{1,3}[-.\s]?)?\(?\d{3}\)?[-.\s]?\d{3}[-.\s]?\d{4}'
-        phones.update(re.findall(phone_pattern, soup.get_text()))
-        for link in soup.find_all('a', href=lambda x: x and x.startswith('tel:')):
-            phone = link['href'].replace('tel:', '')
-            phones.add(phone)
-        return ContactDetailsSchema(
-            emails=list(emails),
-            phones=list(phones)
+                price = float(item['variants'][0].get('price', 0.0))
+            except (ValueError, TypeError):
+                price = 0.0
+        if item.get('images'):
+            image_url = item['images'][0].get('src')
+        return ProductSchema(
+            id=item['id'],
+            title=item['title'],
+            handle=item['handle'],
+            vendor=item['vendor'],
+            product_type=item.get('product_type', 'N/A'),
+            price=price,
+            url=urljoin(base_url, f"/products/{item['handle']}"),
+            image_url=image_url,
+            description=item.get('body_html', '')[:500] if item.get('body_html') else None
         )
     
-    def extract_social_handles(self, soup: BeautifulSoup) -> SocialHandlesSchema:
-        social_handles = {}
-        social_patterns = {
-            'instagram': r'instagram\.com/([^/\s]+)',
-            'facebook': r'facebook\.com/([^/\s]+)',
-            'twitter': r'(?:twitter\.com|x\.com)/([^/\s]+)',
-            'tiktok': r'tiktok\.com/@([^/\s]+)',
-            'youtube': r'youtube\.com/(?:channel/|user/|c/)?([^/\s]+)',
-            'pinterest': r'pinterest\.com/([^/\s]+)'
-        }
-        page_text = str(soup)
-        for platform, pattern in social_patterns.items():
-            matches = re.findall(pattern, page_text, re.IGNORECASE)
-            if matches:
-                social_handles[platform] = f"https://{platform}.com/{matches[0]}"
-        return SocialHandlesSchema(**social_handles)
-    
-    def extract_important_links(self, soup: BeautifulSoup, base_url: str) -> ImportantLinksSchema:
-        important_links = {}
-        link_patterns = {
-            'order_tracking': r'track|tracking|order.*status',
-            'contact_us': r'contact|support|help',
-            'blogs': r'blog|news|article',
-            'shipping_info': r'shipping|delivery',
-            'size_guide': r'size.*guide|sizing'
-        }
-        for link in soup.find_all('a', href=True):
-            link_text = link.get_text(strip=True).lower()
-            href = link['href']
-            if href.startswith('/'):
-                href = urljoin(base_url, href)
-            for key, pattern in link_patterns.items():
-                if re.search(pattern, link_text, re.IGNORECASE) and key not in important_links:
-                    important_links[key] = href
-                    break
-        return ImportantLinksSchema(**important_links) 
\ No newline at end of file
+    async def extract_hero_products(self, page: ParsedPage, base_url: str) -> List[ProductSchema]:
+        return page_analysis.extract_hero_products(page, base_url)
+    
+    def extract_page_details(self, page: ParsedPage, base_url: str) -> ExtractionResult:
+        return extraction_engine.extract(page, base_url)
+    
+    def extract_contact_details(self, page: ParsedPage) -> ContactDetailsSchema:
+        return extraction_engine.extract_contact_details(page.text, page.anchors)
+    
+    def extract_social_handles(self, page: ParsedPage) -> SocialHandlesSchema:
+        return extraction_engine.extract_social_handles(page.html)
+    
+    def extract_important_links(self, page: ParsedPage, base_url: str) -> ImportantLinksSchema:
+        return extraction_engine.extract_important_links(page.anchors, base_url)
\ No newline at end of file
@@ -0,0 +1,113 @@
+import asyncio
+import re
+from typing import Mapping, NamedTuple, Optional, Tuple
+from urllib.parse import urljoin
+import logging
+
+import httpx
+
+from app.core.config import settings
+from app.core.exceptions import ScrapingError
+from app.services.parsed_page import ParsedPage
+from app.services.scraper import WebScraper
+
+logger = logging.getLogger(__name__)
+
+# Headers Shopify's storefront edge sets on every response, with the confidence each gives
+SHOPIFY_HEADERS = (
+    ('x-shopid', 0.99),
+    ('x-shopify-stage', 0.99),
+    ('x-sorting-hat-shopid', 0.99),
+    ('x-shardid', 0.9),
+)
+POWERED_BY_REGEX = re.compile(r'\bshopify\b', re.IGNORECASE)
+SHOPIFY_COOKIE_REGEX = re.compile(r'\b_shopify_(?:y|s|sa_t|sa_p)=')
+
+# Markers in the homepage's first SHOPIFY_SCAN_BYTES, strongest first. A bare
+# "shopify" is not one: blogs, agencies and app vendors mention it all the time.
+HTML_MARKERS = (
+    ('Shopify.shop', 0.95),
+    ('ShopifyAnalytics', 0.95),
+    ('shopify-digital-wallet', 0.9),
+    ('.myshopify.com', 0.85),
+    ('cdn.shopify.com/s/files', 0.85),
+    ('cdn.shopify.com', 0.7),
+)
+
+SIGNAL_NONE = 'none'
+SIGNAL_ERROR = 'error'
+
+
+class ShopifyDetection(NamedTuple):
+    is_shopify: bool
+    signal: str  # what decided it, e.g. "header:x-shopid", "meta.json" or "html:Shopify.shop"
+    confidence: float  # in the verdict, whichever way it went
+
+
+def detect_from_headers(headers: Optional[Mapping[str, str]]) -> Optional[ShopifyDetection]:
+    if not headers:
+        return None
+    for header, confidence in SHOPIFY_HEADERS:
+        if headers.get(header):
+            return ShopifyDetection(True, f"header:{header}", confidence)
+    if POWERED_BY_REGEX.search(headers.get('powered-by', '')):
+        return ShopifyDetection(True, 'header:powered-by', 0.99)
+    if SHOPIFY_COOKIE_REGEX.search(headers.get('set-cookie', '')):
+        return ShopifyDetection(True, 'header:set-cookie', 0.9)
+    return None
+
+
+def detect_from_html(html: Optional[str]) -> Optional[ShopifyDetection]:
+    if not html:
+        return None
+    head = html[:settings.SHOPIFY_SCAN_BYTES]
+    for marker, confidence in HTML_MARKERS:
+        if marker in head:
+            return ShopifyDetection(True, f"html:{marker}", confidence)
+    return None
+
+
+class ShopifyDetector:
+    """Decides whether a site is a Shopify store, cheapest evidence first."""
+
+    def __init__(self, scraper: WebScraper):
+        self.scraper = scraper
+
+    async def detect(self, base_url: str, page: Optional[ParsedPage] = None) -> ShopifyDetection:
+        if page is not None:
+            headers, head = page.headers, page.html
+        else:
+            headers, head = await self.scraper.get_page_head(
+                base_url, settings.SHOPIFY_SCAN_BYTES,
+                read_body=lambda response_headers: detect_from_headers(response_headers) is None
+            )
+        detection = detect_from_headers(headers)
+        if detection:
+            return detection
+        detection, conclusive = await self._detect_from_endpoints(base_url)
+        if detection:
+            return detection
+        detection = detect_from_html(head)
+        if detection:
+            return detection
+        return ShopifyDetection(False, SIGNAL_NONE, 0.9 if conclusive else 0.6)
+
+    async def _detect_from_endpoints(self, base_url: str) -> Tuple[Optional[ShopifyDetection], bool]:
+        # Returns the detection, if any, and whether every endpoint gave a definite answer
+        conclusive = True
+        for path, signal, confidence in (
+            ('/meta.json', 'meta.json', 0.97),
+            ('/products.json?limit=1', 'products.json', 0.9),
+        ):
+            url = urljoin(base_url, path)
+            try:
+                data = await self.scraper.get_json(url, settings.SHOPIFY_PROBE_MAX_BYTES)
+            except (httpx.HTTPError, ScrapingError, asyncio.TimeoutError) as e:
+                logger.info(f"Could not fetch {url}: {e}")
+                conclusive = False
+                continue
+            if signal == 'meta.json' and isinstance(data, dict) and data.get('myshopify_domain'):
+                return ShopifyDetection(True, signal, confidence), True
+            if signal == 'products.json' and isinstance(data, dict) and isinstance(data.get('products'), list):
+                return ShopifyDetection(True, signal, confidence), True
+        return None, conclusive
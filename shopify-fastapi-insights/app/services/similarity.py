@@ -0,0 +1,359 @@
+import asyncio
+import math
+import re
+import time
+import zlib
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Mapping, NamedTuple, Optional, Tuple
+import logging
+
+import numpy as np
+from sqlalchemy import func, select, or_
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from app.core.compression import decompress_json
+from app.core.config import settings
+from app.core.database import BrandFeature, BrandInsight, Product, async_session_maker
+from app.models.schemas import ScrapingStatus, SocialHandlesSchema
+
+logger = logging.getLogger(__name__)
+
+FEATURE_VERSION = 1
+PRODUCT_TYPE_DIM = 64
+TITLE_DIM = 256
+PRICE_QUANTILES = (0.1, 0.25, 0.5, 0.75, 0.9)
+SOCIAL_PLATFORMS = tuple(SocialHandlesSchema.model_fields)
+
+# Component weights of the combined score; they sum to 1 so scores stay in [0, 1]
+PRODUCT_TYPE_WEIGHT = 0.4
+PRICE_WEIGHT = 0.25
+SOCIAL_WEIGHT = 0.15
+TITLE_WEIGHT = 0.2
+
+TOKEN_REGEX = re.compile(r'[a-z0-9]{2,}')
+POPCOUNT = np.array([bin(n).count('1') for n in range(256)], dtype=np.float32)
+
+
+class BrandFeatures(NamedTuple):
+    product_types: np.ndarray  # hashed product-type histogram, L2-normalised
+    price_quantiles: np.ndarray  # log1p price quantiles, empty when no prices
+    social_mask: int  # bit i set when SOCIAL_PLATFORMS[i] is present
+    title_terms: np.ndarray  # hashed sublinear term frequencies of product titles
+
+
+def _bucket(token: str, dim: int) -> int:
+    # crc32 rather than hash() so buckets are stable across processes
+    return zlib.crc32(token.encode('utf-8')) % dim
+
+
+def _normalize(vector: np.ndarray) -> np.ndarray:
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm > 0 else vector
+
+
+class FeatureBuilder:
+    # Accumulates a catalog batch by batch; only the prices are kept per product, for the quantiles
+
+    def __init__(self):
+        self.product_types = np.zeros(PRODUCT_TYPE_DIM, dtype=np.float32)
+        self.title_counts = np.zeros(TITLE_DIM, dtype=np.float32)
+        self.prices: List[float] = []
+        self.products = 0
+
+    def add(self, products: Iterable[Mapping[str, Any]]) -> None:
+        for product in products:
+            self.products += 1
+            product_type = (product.get('product_type') or '').strip().lower()
+            if product_type:
+                self.product_types[_bucket(product_type, PRODUCT_TYPE_DIM)] += 1
+            for token in TOKEN_REGEX.findall((product.get('title') or '').lower()):
+                self.title_counts[_bucket(token, TITLE_DIM)] += 1
+            price = product.get('price') or 0
+            if price > 0:
+                self.prices.append(price)
+
+    def build(self, social_handles: Optional[Dict[str, Any]]) -> BrandFeatures:
+        title_terms = np.zeros(TITLE_DIM, dtype=np.float32)
+        present = self.title_counts > 0
+        title_terms[present] = 1 + np.log(self.title_counts[present])
+        if self.prices:
+            price_quantiles = np.quantile(np.log1p(np.asarray(self.prices, dtype=np.float64)), PRICE_QUANTILES).astype(np.float32)
+        else:
+            price_quantiles = np.zeros(0, dtype=np.float32)
+        social_mask = 0
+        for bit, platform in enumerate(SOCIAL_PLATFORMS):
+            if (social_handles or {}).get(platform):
+                social_mask |= 1 << bit
+        return BrandFeatures(
+            product_types=_normalize(self.product_types),
+            price_quantiles=price_quantiles,
+            social_mask=social_mask,
+            title_terms=title_terms
+        )
+
+
+def build_features(product_catalog: Optional[Iterable[Dict[str, Any]]], social_handles: Optional[Dict[str, Any]]) -> BrandFeatures:
+    builder = FeatureBuilder()
+    builder.add(product_catalog or [])
+    return builder.build(social_handles)
+
+
+class SimilarityIndex:
+    """In-memory matrix of every stored brand's feature vector, scored in one batch per query."""
+
+    BACKFILL_CHUNK = 200
+    CATALOG_CHUNK = 1000
+
+    def __init__(self, session_maker: async_sessionmaker = async_session_maker):
+        self.session_maker = session_maker
+        self._lock = asyncio.Lock()
+        self._loaded = False
+        # Newest updated_at loaded from brand_features, and when other processes' rows were last looked for
+        self._synced_at: Optional[datetime] = None
+        self._checked_at = 0.0
+        self._size = 0
+        self._positions: Dict[int, int] = {}
+        self._ids = np.zeros(0, dtype=np.int64)
+        self._product_types = np.zeros((0, PRODUCT_TYPE_DIM), dtype=np.float32)
+        self._prices = np.zeros((0, len(PRICE_QUANTILES)), dtype=np.float32)
+        self._has_prices = np.zeros(0, dtype=bool)
+        self._social = np.zeros(0, dtype=np.uint8)
+        self._title_terms = np.zeros((0, TITLE_DIM), dtype=np.float32)
+        self._titles: Optional[np.ndarray] = None
+        self._idf = np.ones(TITLE_DIM, dtype=np.float32)
+        self.queries = 0
+        self.total_query_seconds = 0.0
+        self.max_query_seconds = 0.0
+
+    async def load(self) -> None:
+        if self._loaded:
+            return
+        async with self._lock:
+            if self._loaded:
+                return
+            started = time.perf_counter()
+            await self._backfill()
+            await self._load_since(None)
+            self._loaded = True
+            logger.info(f"Loaded similarity index with {self._size} brands in {time.perf_counter() - started:.2f}s")
+
+    async def warm(self) -> None:
+        try:
+            await self.load()
+        except Exception as e:
+            logger.warning(f"Could not load the similarity index: {e}")
+
+    async def refresh(self) -> None:
+        # Rows written by other processes since the last check, at most every SIMILARITY_REFRESH_SECONDS
+        if not self._loaded or time.monotonic() - self._checked_at < settings.SIMILARITY_REFRESH_SECONDS:
+            return
+        async with self._lock:
+            if time.monotonic() - self._checked_at < settings.SIMILARITY_REFRESH_SECONDS:
+                return
+            async with self.session_maker() as db:
+                newest = await db.scalar(select(func.max(BrandFeature.updated_at)))
+            if newest is not None and (self._synced_at is None or newest > self._synced_at):
+                await self._load_since(self._synced_at)
+            self._checked_at = time.monotonic()
+
+    async def _load_since(self, updated_after: Optional[datetime]) -> None:
+        query = select(BrandFeature).execution_options(yield_per=1000)
+        if updated_after is not None:
+            query = query.where(BrandFeature.updated_at >= updated_after)
+        async with self.session_maker() as db:
+            result = await db.stream(query)
+            async for chunk in result.scalars().partitions():
+                for feature in chunk:
+                    self._add(feature.brand_insight_id, self._decode(feature))
+                newest = max((feature.updated_at for feature in chunk if feature.updated_at), default=None)
+                if newest is not None and (self._synced_at is None or newest > self._synced_at):
+                    self._synced_at = newest
+        self._checked_at = time.monotonic()
+
+    async def _backfill(self) -> None:
+        # Features for brands completed before the index existed, or under an older feature layout
+        async with self.session_maker() as db:
+            result = await db.execute(
+                select(BrandInsight.id)
+                .outerjoin(BrandFeature, BrandFeature.brand_insight_id == BrandInsight.id)
+                .where(
+                    BrandInsight.scraping_status == ScrapingStatus.COMPLETED,
+                    or_(BrandFeature.brand_insight_id.is_(None), BrandFeature.feature_version != FEATURE_VERSION)
+                )
+            )
+            missing = result.scalars().all()
+            for start in range(0, len(missing), self.BACKFILL_CHUNK):
+                for brand_id in missing[start:start + self.BACKFILL_CHUNK]:
+                    features = await self._build(brand_id, db)
+                    if features is not None:
+                        await db.merge(self._encode(brand_id, features))
+                await db.commit()
+        if missing:
+            logger.info(f"Backfilled similarity features for {len(missing)} brands")
+
+    async def _build(self, brand_id: int, db: AsyncSession) -> Optional[BrandFeatures]:
+        # The live catalog is streamed from the products table; catalogs stored before it are read from the blob
+        brand = (await db.execute(
+            select(BrandInsight.catalog_generation, BrandInsight.social_handles).where(BrandInsight.id == brand_id)
+        )).first()
+        if brand is None:
+            return None
+        builder = FeatureBuilder()
+        result = await db.stream(
+            select(Product.product_type, Product.title, Product.price)
+            .where(Product.brand_insight_id == brand_id, Product.generation == brand.catalog_generation)
+            .execution_options(yield_per=self.CATALOG_CHUNK)
+        )
+        async for chunk in result.mappings().partitions():
+            await asyncio.to_thread(builder.add, chunk)
+        if not builder.products:
+            stored = await db.scalar(select(BrandInsight.product_catalog).where(BrandInsight.id == brand_id))
+            if stored is not None:
+                await asyncio.to_thread(lambda: builder.add(decompress_json(stored) or []))
+        return builder.build(brand.social_handles)
+
+    async def upsert(self, brand_id: int) -> None:
+        try:
+            async with self.session_maker() as db:
+                features = await self._build(brand_id, db)
+                if features is None:
+                    return
+                await db.merge(self._encode(brand_id, features))
+                await db.commit()
+            if self._loaded or self._lock.locked():
+                # The lock keeps rows from changing under a query scoring in a worker thread
+                async with self._lock:
+                    self._add(brand_id, features)
+        except Exception as e:
+            logger.warning(f"Could not update similarity features for brand {brand_id}: {e}")
+
+    async def most_similar(self, brand_id: int, k: int) -> Optional[List[Tuple[int, float]]]:
+        await self.load()
+        await self.refresh()
+        position = self._positions.get(brand_id)
+        if position is None:
+            return None
+        k = min(k, self._size - 1)
+        if k <= 0:
+            return []
+        started = time.perf_counter()
+        async with self._lock:
+            top = await asyncio.to_thread(self._top_k, position, k)
+        elapsed = time.perf_counter() - started
+        self.queries += 1
+        self.total_query_seconds += elapsed
+        self.max_query_seconds = max(self.max_query_seconds, elapsed)
+        return top
+
+    def _top_k(self, position: int, k: int) -> List[Tuple[int, float]]:
+        scores = self._score(position)
+        scores[position] = -np.inf
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top], kind='stable')]
+        return [(int(self._ids[i]), float(scores[i])) for i in top]
+
+    def score_pair(self, first: BrandFeatures, second: BrandFeatures) -> float:
+        product_types = float(first.product_types @ second.product_types)
+        price = 0.0
+        if first.price_quantiles.size and second.price_quantiles.size:
+            price = math.exp(-float(np.abs(first.price_quantiles - second.price_quantiles).mean()))
+        union = bin(first.social_mask | second.social_mask).count('1')
+        social = bin(first.social_mask & second.social_mask).count('1') / union if union else 0.0
+        titles = float(_normalize(first.title_terms * self._idf) @ _normalize(second.title_terms * self._idf))
+        return self._combine(product_types, price, social, titles)
+
+    def _score(self, position: int) -> np.ndarray:
+        n = self._size
+        product_types = self._product_types[:n] @ self._product_types[position]
+        if self._has_prices[position]:
+            distance = np.abs(self._prices[:n] - self._prices[position]).mean(axis=1)
+            price = np.where(self._has_prices[:n], np.exp(-distance), 0.0)
+        else:
+            price = np.zeros(n, dtype=np.float32)
+        social = self._social[:n]
+        union = POPCOUNT[social | social[position]]
+        intersection = POPCOUNT[social & social[position]]
+        jaccard = np.divide(intersection, union, out=np.zeros(n, dtype=np.float32), where=union > 0)
+        titles = self._weighted_titles()
+        return self._combine(product_types, price, jaccard, titles @ titles[position])
+
+    def _combine(self, product_types, price, social, titles):
+        score = (
+            PRODUCT_TYPE_WEIGHT * product_types
+            + PRICE_WEIGHT * price
+            + SOCIAL_WEIGHT * social
+            + TITLE_WEIGHT * titles
+        )
+        return np.clip(score, 0.0, 1.0) if isinstance(score, np.ndarray) else min(max(score, 0.0), 1.0)
+
+    def _weighted_titles(self) -> np.ndarray:
+        if self._titles is None:
+            terms = self._title_terms[:self._size]
+            document_frequency = np.count_nonzero(terms, axis=0)
+            self._idf = (np.log((1 + self._size) / (1 + document_frequency)) + 1).astype(np.float32)
+            weighted = terms * self._idf
+            norms = np.linalg.norm(weighted, axis=1, keepdims=True)
+            self._titles = np.divide(weighted, norms, out=np.zeros_like(weighted), where=norms > 0)
+        return self._titles
+
+    def _add(self, brand_id: int, features: BrandFeatures) -> None:
+        position = self._positions.get(brand_id)
+        if position is None:
+            position = self._size
+            self._ensure_capacity(position + 1)
+            self._positions[brand_id] = position
+            self._size += 1
+        self._ids[position] = brand_id
+        self._product_types[position] = features.product_types
+        self._has_prices[position] = bool(features.price_quantiles.size)
+        self._prices[position] = features.price_quantiles if features.price_quantiles.size else 0.0
+        self._social[position] = features.social_mask
+        self._title_terms[position] = features.title_terms
+        self._titles = None
+
+    def _ensure_capacity(self, size: int) -> None:
+        capacity = len(self._ids)
+        if size <= capacity:
+            return
+        capacity = max(size, capacity * 2, 1024)
+        for name in ('_ids', '_product_types', '_prices', '_has_prices', '_social', '_title_terms'):
+            current = getattr(self, name)
+            grown = np.zeros((capacity,) + current.shape[1:], dtype=current.dtype)
+            grown[:len(current)] = current
+            setattr(self, name, grown)
+
+    def _encode(self, brand_id: int, features: BrandFeatures) -> BrandFeature:
+        return BrandFeature(
+            brand_insight_id=brand_id,
+            feature_version=FEATURE_VERSION,
+            product_types=features.product_types.astype(np.float32).tobytes(),
+            price_quantiles=features.price_quantiles.astype(np.float32).tobytes(),
+            social_mask=features.social_mask,
+            title_terms=features.title_terms.astype(np.float32).tobytes(),
+            updated_at=datetime.utcnow()
+        )
+
+    def _decode(self, feature: BrandFeature) -> BrandFeatures:
+        return BrandFeatures(
+            product_types=np.frombuffer(feature.product_types, dtype=np.float32),
+            price_quantiles=np.frombuffer(feature.price_quantiles, dtype=np.float32),
+            social_mask=feature.social_mask,
+            title_terms=np.frombuffer(feature.title_terms, dtype=np.float32)
+        )
+
+    def metrics(self) -> Dict[str, Any]:
+        return {
+            'loaded': self._loaded,
+            'synced_at': self._synced_at.isoformat() if self._synced_at else None,
+            'brands': self._size,
+            'memory_bytes': sum(
+                getattr(self, name).nbytes
+                for name in ('_ids', '_product_types', '_prices', '_has_prices', '_social', '_title_terms')
+            ),
+            'queries': self.queries,
+            'mean_query_ms': round(self.total_query_seconds / self.queries * 1000, 3) if self.queries else 0.0,
+            'max_query_ms': round(self.max_query_seconds * 1000, 3),
+        }
+
+
+similarity_index = SimilarityIndex()
@@ -0,0 +1,40 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Generic, TypeVar
+import logging
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar('T')
+
+class SingleFlight(Generic[T]):
+    """Coalesces concurrent calls sharing a key onto one in-flight task."""
+
+    def __init__(self):
+        self._calls: Dict[str, "asyncio.Task[T]"] = {}
+        self.leaders = 0
+        self.followers = 0
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[T]]) -> T:
+        task = self._calls.get(key)
+        if task is not None:
+            self.followers += 1
+            return await asyncio.shield(task)
+        task = asyncio.ensure_future(fn())
+        self._calls[key] = task
+        self.leaders += 1
+        task.add_done_callback(lambda done: self._forget(key, done))
+        return await asyncio.shield(task)
+
+    def _forget(self, key: str, task: "asyncio.Task[T]") -> None:
+        if self._calls.get(key) is task:
+            del self._calls[key]
+        if not task.cancelled() and task.exception() is not None:
+            # Marks the exception retrieved when every waiter has gone away
+            logger.debug(f"Single-flight call for {key} failed: {task.exception()}")
+
+    def metrics(self) -> Dict[str, Any]:
+        return {
+            'in_flight': len(self._calls),
+            'leaders': self.leaders,
+            'followers': self.followers,
+        }
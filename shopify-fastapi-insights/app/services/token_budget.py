@@ -0,0 +1,110 @@
+import re
+from typing import Dict, FrozenSet, List, Tuple
+import logging
+
+from app.services.page_analysis import PageSections, TextSection
+
+logger = logging.getLogger(__name__)
+
+# Token counts are estimated; Gemini averages about four characters per token on English text
+CHARS_PER_TOKEN = 4
+
+# Sections under these headings are chosen first for each purpose
+PRIORITY_HEADINGS = {
+    'about': re.compile(r'about|story|mission|values|who we are|our (?:brand|team|founders?)|founded|why we', re.IGNORECASE),
+    'faq': re.compile(r'faq|frequently|questions|help|shipping|delivery|returns?|refunds?|orders?|payments?', re.IGNORECASE),
+}
+
+# Sections of the lowest priority are only sent when a page has nothing better
+FALLBACK_PRIORITY = 1
+
+# Below this many tokens left, a section that does not fit is skipped rather than cut
+MIN_PARTIAL_TOKENS = 32
+
+
+def estimate_tokens(text: str) -> int:
+    return -(-len(text) // CHARS_PER_TOKEN)
+
+
+def truncate_to_tokens(text: str, budget: int) -> str:
+    return text[:budget * CHARS_PER_TOKEN]
+
+
+def normalize_line(line: str) -> str:
+    return ' '.join(line.split()).casefold()
+
+
+class TokenBudgeter:
+    """Chooses the text of a page that is sent to the LLM, within a token budget."""
+
+    def __init__(self):
+        self.inputs = 0
+        self.raw_tokens = 0
+        self.sent_tokens = 0
+        self.boilerplate_lines = 0
+
+    def shared_lines(self, *pages: PageSections) -> FrozenSet[str]:
+        seen: Dict[str, int] = {}
+        for page in pages:
+            for line in {normalize_line(line) for section in page.sections for line in section.lines}:
+                seen[line] = seen.get(line, 0) + 1
+        return frozenset(line for line, count in seen.items() if count > 1)
+
+    def build(self, page: PageSections, purpose: str, budget: int, boilerplate: FrozenSet[str] = frozenset()) -> str:
+        candidates: List[Tuple[int, int, str]] = []
+        for index, section in enumerate(page.sections):
+            lines = [line for line in section.lines if normalize_line(line) not in boilerplate]
+            self.boilerplate_lines += len(section.lines) - len(lines)
+            if lines:
+                candidates.append((self._priority(section, purpose), index, self._render(section, lines)))
+        chosen: Dict[int, str] = {}
+        remaining = budget
+        for priority, index, text in sorted(candidates, key=lambda candidate: (-candidate[0], candidate[1])):
+            if priority == FALLBACK_PRIORITY and chosen:
+                break
+            tokens = estimate_tokens(text) + 1  # blank line between sections
+            if tokens <= remaining:
+                chosen[index] = text
+                remaining -= tokens
+            elif remaining >= MIN_PARTIAL_TOKENS:
+                cut = truncate_to_tokens(text, remaining - 1)
+                chosen[index] = cut.rsplit('\n', 1)[0] if '\n' in cut else cut
+                remaining = 0
+            if remaining < MIN_PARTIAL_TOKENS:
+                break
+        text = '\n\n'.join(chosen[index] for index in sorted(chosen))
+        raw_tokens = -(-page.raw_text_length // CHARS_PER_TOKEN)
+        sent_tokens = estimate_tokens(text)
+        self.inputs += 1
+        self.raw_tokens += raw_tokens
+        self.sent_tokens += sent_tokens
+        logger.info(
+            f"LLM {purpose} input from {page.url}: {sent_tokens} of {raw_tokens} tokens, "
+            f"{raw_tokens - sent_tokens} saved, {len(chosen)}/{len(page.sections)} sections"
+        )
+        return text
+
+    def _priority(self, section: TextSection, purpose: str) -> int:
+        heading_matches = bool(section.title and PRIORITY_HEADINGS[purpose].search(section.title))
+        if purpose == 'faq':
+            return 3 if section.kind == 'question' else 2 if heading_matches else FALLBACK_PRIORITY
+        return 3 if heading_matches else FALLBACK_PRIORITY if section.kind == 'question' else 2
+
+    def _render(self, section: TextSection, lines: List[str]) -> str:
+        if section.kind == 'question':
+            return '\n'.join([f"Q: {section.title}", *lines])
+        if section.title:
+            return '\n'.join([section.title, *lines])
+        return '\n'.join(lines)
+
+    def metrics(self) -> Dict[str, int]:
+        return {
+            'inputs': self.inputs,
+            'raw_tokens': self.raw_tokens,
+            'sent_tokens': self.sent_tokens,
+            'saved_tokens': self.raw_tokens - self.sent_tokens,
+            'boilerplate_lines_dropped': self.boilerplate_lines,
+        }
+
+
+token_budgeter = TokenBudgeter()
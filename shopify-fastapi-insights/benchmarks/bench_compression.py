@@ -0,0 +1,142 @@
+"""Stored size and read latency of each compression codec, and of lazy against eager decompression.
+
+    python -m benchmarks.bench_compression [--rows 200] [--repeat 5]
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+from typing import Callable, List, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+from app.core import compression
+from app.core.compression import compress, decompress, dictionary_registry, train_dictionary
+from app.core.database import Base, BrandInsight
+
+WORDS = (
+    'order refund return days purchase original payment method store credit exchange item condition '
+    'shipping label customer service email within receipt unworn tags sale final damaged defective'
+).split()
+
+POLICY_TEXTS = ('privacy_policy', 'refund_policy', 'brand_context')
+COMPRESSED_FIELDS = POLICY_TEXTS + ('product_catalog', 'hero_products', 'faqs')
+SUMMARY_FIELDS = ('id', 'website_url', 'brand_name', 'scraping_status')
+
+
+def sentence(rng: random.Random, words: int = 14) -> str:
+    return ' '.join(rng.choice(WORDS) for _ in range(words)).capitalize() + '.'
+
+
+def random_store(rng: random.Random, boilerplate: List[str], n: int) -> dict:
+    # Policies share most of their lines with other stores, as Shopify's policy templates do
+    policy = lambda: '\n'.join(rng.sample(boilerplate, 30) + [sentence(rng) for _ in range(10)])
+    catalog = [
+        {
+            'id': n * 1000 + i, 'title': sentence(rng, 4), 'handle': f"product-{n}-{i}", 'vendor': f"Store {n}",
+            'product_type': rng.choice(('Shirts', 'Shoes', 'Bags', 'Hats')), 'price': round(rng.uniform(5, 200), 2),
+            'url': f"https://store{n}.test/products/product-{n}-{i}", 'image_url': None,
+            'description': sentence(rng, 30), 'is_hero_product': False,
+        }
+        for i in range(250)
+    ]
+    return {
+        'website_url': f"https://store{n}.test",
+        'brand_name': f"Store {n}",
+        'scraping_status': 'completed',
+        'privacy_policy': policy(),
+        'refund_policy': policy(),
+        'brand_context': ' '.join(sentence(rng) for _ in range(8)),
+        'product_catalog': catalog,
+        'hero_products': catalog[:8],
+        'faqs': [{'question': sentence(rng, 8) + '?', 'answer': sentence(rng)} for _ in range(15)],
+    }
+
+
+def encoded_values(stores: List[dict]) -> List[Tuple[bytes, bool]]:
+    values = []
+    for store in stores:
+        for field in COMPRESSED_FIELDS:
+            value = store[field]
+            if field in POLICY_TEXTS:
+                values.append((value.encode('utf-8'), True))
+            else:
+                values.append((json.dumps(value, separators=(',', ':')).encode('utf-8'), False))
+    return values
+
+
+def best_of(repeat: int, run: Callable[[], None]) -> float:
+    best = float('inf')
+    for _ in range(repeat):
+        started = time.perf_counter()
+        run()
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def codec_report(values: List[Tuple[bytes, bool]], repeat: int) -> None:
+    raw_bytes = sum(len(value) for value, _ in values)
+    configurations = [('none', False), ('zlib', False), ('zlib', True)]
+    if compression.ZSTD_AVAILABLE:
+        configurations += [('zstd', False), ('zstd', True)]
+    for codec, use_dictionary in configurations:
+        pack = lambda: [compress(value, codec, use_dictionary=use_dictionary and text) for value, text in values]
+        packed = pack()
+        write_seconds = best_of(repeat, pack)
+        read_seconds = best_of(repeat, lambda: [decompress(value) for value in packed])
+        stored_bytes = sum(len(value) for value in packed)
+        label = f"{codec}+dictionary" if use_dictionary else codec
+        print(f"{label:16} stored={stored_bytes:>10} ratio={raw_bytes / stored_bytes:5.2f} "
+              f"write={write_seconds / len(values) * 1e6:7.1f}us read={read_seconds / len(values) * 1e6:7.1f}us per value")
+
+
+async def lazy_report(stores: List[dict], repeat: int) -> None:
+    engine = create_async_engine('sqlite+aiosqlite://')
+    session_maker = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    async with session_maker() as db:
+        db.add_all([BrandInsight(**store) for store in stores])
+        await db.commit()
+
+    async def read(fields) -> float:
+        best = float('inf')
+        for _ in range(repeat):
+            async with session_maker() as db:
+                started = time.perf_counter()
+                result = await db.execute(select(BrandInsight))
+                for row in result.scalars():
+                    for field in fields:
+                        getattr(row, field)
+                best = min(best, time.perf_counter() - started)
+        return best
+
+    summary_seconds = await read(SUMMARY_FIELDS)
+    all_seconds = await read(SUMMARY_FIELDS + COMPRESSED_FIELDS)
+    print(f"rows={len(stores)} summary fields only={summary_seconds * 1000:.1f}ms "
+          f"every field={all_seconds * 1000:.1f}ms (what decompressing while rows load always cost)")
+    await engine.dispose()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=200)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+    rng = random.Random(0)
+    boilerplate = [sentence(rng) for _ in range(60)]
+    stores = [random_store(rng, boilerplate, n) for n in range(args.rows)]
+    values = encoded_values(stores)
+    samples = [value for value, text in values if text]
+    # Registered in this process only, as if trained by app.core.migrations
+    dictionary_registry.register(1, 'zlib', train_dictionary(samples, 'zlib'))
+    if compression.ZSTD_AVAILABLE:
+        dictionary_registry.register(2, 'zstd', train_dictionary(samples, 'zstd'))
+    codec_report(values, args.repeat)
+    asyncio.run(lazy_report(stores, args.repeat))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,50 @@
+"""Pages per second of ExtractionEngine against the per-pattern functions it replaced.
+
+    python -m benchmarks.bench_extraction [--pages 500] [--repeat 5]
+"""
+import argparse
+import random
+import time
+
+from app.services.extraction import extraction_engine
+from app.services.parsed_page import ParsedPage
+from tests import legacy_extraction
+from tests.pages import BASE_URL, random_page
+
+
+def legacy(page: ParsedPage) -> None:
+    legacy_extraction.extract_contact_details(page)
+    legacy_extraction.extract_social_handles(page)
+    legacy_extraction.extract_important_links(page, BASE_URL)
+
+
+def engine(page: ParsedPage) -> None:
+    extraction_engine.extract(page, BASE_URL)
+
+
+def pages_per_second(extract, pages, repeat: int) -> float:
+    best = float('inf')
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for page in pages:
+            extract(page)
+        best = min(best, time.perf_counter() - started)
+    return len(pages) / best
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--pages', type=int, default=500)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+    rng = random.Random(0)
+    pages = [ParsedPage(BASE_URL, random_page(rng)) for _ in range(args.pages)]
+    for page in pages:
+        # Parse up front so only the pattern matching is timed
+        page.text, page.anchors
+    for name, extract in (('per-pattern', legacy), ('engine', engine)):
+        print(f"{name}: {pages_per_second(extract, pages, args.repeat):.0f} pages/s")
+
+
+if __name__ == '__main__':
+    main()
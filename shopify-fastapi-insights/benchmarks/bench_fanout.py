@@ -0,0 +1,73 @@
+"""Wall-clock time of one store extraction with fetches one at a time against the concurrent fan-out.
+
+    python -m benchmarks.bench_fanout [--latency 0.1] [--products 2000] [--repeat 3]
+"""
+import os
+import tempfile
+
+# Settings are read at import time: a throwaway database, the fake LLM and no request throttling
+_db_dir = tempfile.mkdtemp(prefix='bench-fanout-')
+for name, value in {
+    'DATABASE_URL': f"sqlite+aiosqlite:///{_db_dir}/bench.db",
+    'ENVIRONMENT': 'test',
+    'LLM_PROVIDER': 'fake',
+    'PARSE_EXECUTOR': 'inline',
+    'DISCOVERY_ENABLED': 'false',
+    'PATH_STATS_ENABLED': 'false',
+    'SCRAPER_HOST_RATE': '10000',
+    'SCRAPER_HOST_BURST': '10000',
+    'SCRAPER_GLOBAL_RATE': '10000',
+    'SCRAPER_GLOBAL_BURST': '10000',
+}.items():
+    os.environ.setdefault(name, value)
+
+import argparse
+import asyncio
+import shutil
+import time
+from typing import Tuple
+
+from app.core.config import settings
+from app.core.database import Base, async_session_maker, engine, init_db
+from app.services.insights_service import InsightsService
+from tests.store import STORE_URL, MockStore, store_products
+
+
+async def extract_once(latency: float, products: int, concurrency: int) -> Tuple[float, int]:
+    settings.MAX_CONCURRENT_FETCHES_PER_STORE = concurrency
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+    await init_db()
+    store = MockStore(products=store_products(products), latency=latency)
+    async with store.client() as client:
+        started = time.perf_counter()
+        async with async_session_maker() as db:
+            await InsightsService(client).extract_insights(STORE_URL, db)
+        return time.perf_counter() - started, sum(store.hits.values())
+
+
+async def report(latency: float, products: int, repeat: int) -> None:
+    for concurrency in (1, settings.MAX_CONCURRENT_FETCHES_PER_STORE):
+        best, requests = float('inf'), 0
+        for _ in range(repeat):
+            seconds, requests = await extract_once(latency, products, concurrency)
+            best = min(best, seconds)
+        print(f"fetches per store={concurrency:<3} requests={requests:<4} best={best * 1000:7.0f}ms "
+              f"({best / latency:.1f} round trips of {latency * 1000:.0f}ms)")
+    await engine.dispose()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--latency', type=float, default=0.1)
+    parser.add_argument('--products', type=int, default=2000)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+    try:
+        asyncio.run(report(args.latency, args.products, args.repeat))
+    finally:
+        shutil.rmtree(_db_dir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
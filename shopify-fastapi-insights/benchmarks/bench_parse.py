@@ -0,0 +1,108 @@
+"""Homepages per second from raw HTML to extracted fields: the soup-per-extractor pipeline against ParsedPage.
+
+    python -m benchmarks.bench_parse [--pages 20] [--size-kb 300] [--repeat 3] [--pages-dir saved_homepages/]
+
+With --pages-dir every *.html file in the directory is used instead of generated homepages.
+"""
+import argparse
+import random
+import re
+import time
+from pathlib import Path
+from typing import Callable, List
+from urllib.parse import urljoin
+
+from bs4 import BeautifulSoup
+
+from app.core.config import settings
+from app.services import page_analysis
+from app.services.parsed_page import resolve_parser
+from app.services.shopify_detector import detect_from_html
+from tests.pages import BASE_URL, large_homepage
+
+EMAIL_PATTERN = r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}\b'
+PHONE_PATTERN = r'(\+?\d{1,3}[-.\s]?)?\(?\d{3}\)?[-.\s]?\d{3}[-.\s]?\d{4}'
+SOCIAL_PATTERNS = {
+    'instagram': r'instagram\.com/([^/\s]+)',
+    'facebook': r'facebook\.com/([^/\s]+)',
+    'twitter': r'(?:twitter\.com|x\.com)/([^/\s]+)',
+    'tiktok': r'tiktok\.com/@([^/\s]+)',
+    'youtube': r'youtube\.com/(?:channel/|user/|c/)?([^/\s]+)',
+    'pinterest': r'pinterest\.com/([^/\s]+)'
+}
+LINK_PATTERNS = {
+    'order_tracking': r'track|tracking|order.*status',
+    'contact_us': r'contact|support|help',
+    'blogs': r'blog|news|article',
+    'shipping_info': r'shipping|delivery',
+    'size_guide': r'size.*guide|sizing'
+}
+
+
+def soup_pipeline(html: str) -> None:
+    # The homepage steps as they were before ParsedPage: each extractor walks or re-serializes the soup
+    soup = BeautifulSoup(html, 'html.parser')
+    page_content = str(soup).lower()
+    any(marker in page_content for marker in ('shopify', 'cdn.shopify.com', 'myshopify.com', 'shopify-analytics'))
+    emails = set(re.findall(EMAIL_PATTERN, soup.get_text()))
+    emails.update(a['href'][len('mailto:'):] for a in soup.find_all('a', href=lambda x: x and x.startswith('mailto:')))
+    phones = set(re.findall(PHONE_PATTERN, soup.get_text()))
+    phones.update(a['href'][len('tel:'):] for a in soup.find_all('a', href=lambda x: x and x.startswith('tel:')))
+    page_text = str(soup)
+    {platform: re.findall(pattern, page_text, re.IGNORECASE) for platform, pattern in SOCIAL_PATTERNS.items()}
+    links = {}
+    for link in soup.find_all('a', href=True):
+        link_text = link.get_text(strip=True).lower()
+        for key, pattern in LINK_PATTERNS.items():
+            if re.search(pattern, link_text, re.IGNORECASE) and key not in links:
+                links[key] = urljoin(BASE_URL, link['href'])
+                break
+    for selector in page_analysis.HERO_SELECTORS:
+        found = [
+            element for element in soup.select(selector)[:6]
+            if element.select_one('.product-title, .product-name, h3, h4') and element.select_one('.price, .product-price')
+        ]
+        if found:
+            break
+    title = soup.find('title')
+    title.get_text(strip=True) if title else None
+
+
+def parsed_page_pipeline(html: str) -> None:
+    detect_from_html(html)
+    page_analysis.analyze_homepage(BASE_URL, html, BASE_URL)
+
+
+def pages_per_second(pipeline: Callable[[str], None], pages: List[str], repeat: int) -> float:
+    best = float('inf')
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for html in pages:
+            pipeline(html)
+        best = min(best, time.perf_counter() - started)
+    return len(pages) / best
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--pages', type=int, default=20)
+    parser.add_argument('--size-kb', type=int, default=300)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--pages-dir', type=Path)
+    args = parser.parse_args()
+    if args.pages_dir:
+        pages = [path.read_text(errors='replace') for path in sorted(args.pages_dir.glob('*.html'))]
+    else:
+        rng = random.Random(0)
+        pages = [large_homepage(rng, args.size_kb) for _ in range(args.pages)]
+    mean_kb = sum(map(len, pages)) / len(pages) / 1024
+    print(f"{len(pages)} homepages, {mean_kb:.0f} KB on average")
+    print(f"soup per extractor (html.parser): {pages_per_second(soup_pipeline, pages, args.repeat):.1f} pages/s")
+    # lxml falls back to html.parser when it is not installed
+    for html_parser in dict.fromkeys(resolve_parser(name) for name in ('html.parser', 'lxml')):
+        settings.HTML_PARSER = html_parser
+        print(f"ParsedPage ({html_parser}): {pages_per_second(parsed_page_pipeline, pages, args.repeat):.1f} pages/s")
+
+
+if __name__ == '__main__':
+    main()
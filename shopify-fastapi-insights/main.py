@@ -1,13 +1,20 @@
 from fastapi import FastAPI, HTTPException, Depends, BackgroundTasks
 from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
+import asyncio
 import uvicorn
 import os
 from dotenv import load_dotenv
 
 from app.core.config import Settings
-from app.core.database import init_db
-from app.api.v1.endpoints import insights, health
+from app.core.database import init_db, refresh_compression_dictionaries
+from app.core.migrations import upgrade_schema
+from app.core.http_client import create_http_client
+from app.core.executor import parse_executor
+from app.core.loop_monitor import loop_lag_monitor
+from app.services.job_queue import InsightsJobQueue
+from app.services.similarity import similarity_index
+from app.api.v1.endpoints import insights, health, metrics
 from app.core.exceptions import setup_exception_handlers
 
 load_dotenv()
@@ -18,9 +25,23 @@ settings = Settings()
 async def lifespan(app: FastAPI):
     # Startup
     await init_db()
+    await upgrade_schema()
+    parse_executor.start()
+    loop_lag_monitor.start()
+    app.state.http_client = create_http_client()
+    app.state.job_queue = InsightsJobQueue(app.state.http_client)
+    await app.state.job_queue.start()
+    # Loaded in the background so startup does not wait on the backfill
+    similarity_warmup = asyncio.create_task(similarity_index.warm())
+    dictionary_refresh = asyncio.create_task(refresh_compression_dictionaries())
     yield
     # Shutdown
-    pass
+    similarity_warmup.cancel()
+    dictionary_refresh.cancel()
+    await app.state.job_queue.stop()
+    await app.state.http_client.aclose()
+    await loop_lag_monitor.stop()
+    parse_executor.shutdown()
 
 app = FastAPI(
     title="Shopify Insights Fetcher API",
@@ -44,6 +65,7 @@ setup_exception_handlers(app)
 # Routes
 app.include_router(health.router, prefix="/api/v1", tags=["health"])
 app.include_router(insights.router, prefix="/api/v1", tags=["insights"])
+app.include_router(metrics.router, prefix="/api/v1", tags=["metrics"])
 
 if __name__ == "__main__":
     uvicorn.run(
@@ -0,0 +1,56 @@
+import asyncio
+import os
+import shutil
+import tempfile
+
+import pytest
+
+# Settings are read at import time, so the test environment is set before any app module loads
+_db_dir = tempfile.mkdtemp(prefix='insights-tests-')
+os.environ.update({
+    'DATABASE_URL': f"sqlite+aiosqlite:///{_db_dir}/test.db",
+    'ENVIRONMENT': 'test',
+    'LLM_PROVIDER': 'fake',
+    'GOOGLE_API_KEY': '',
+    'PARSE_EXECUTOR': 'inline',
+    'DISCOVERY_ENABLED': 'false',
+    'SCRAPER_HOST_RATE': '10000',
+    'SCRAPER_HOST_BURST': '10000',
+    'SCRAPER_GLOBAL_RATE': '10000',
+    'SCRAPER_GLOBAL_BURST': '10000',
+})
+
+
+@pytest.fixture(scope='session')
+def event_loop():
+    # One loop for the session: the app's module-level singletons hold asyncio primitives
+    loop = asyncio.new_event_loop()
+    yield loop
+    loop.close()
+    shutil.rmtree(_db_dir, ignore_errors=True)
+
+
+@pytest.fixture
+def run(event_loop):
+    return event_loop.run_until_complete
+
+
+@pytest.fixture
+def db_schema(run):
+    # A fresh schema per test, and no learned state carried over in the app's singletons
+    from app.core.database import Base, engine, init_db
+    from app.services.llm_cache import llm_cache
+    from app.services.path_stats import path_stats
+
+    async def reset():
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.drop_all)
+        await init_db()
+
+    run(reset())
+    llm_cache._memory.clear()
+    path_stats._global, path_stats._global_loaded_at = {}, 0.0
+    path_stats._hosts.clear()
+    path_stats._pending.clear()
+    yield
+    run(engine.dispose())
@@ -0,0 +1,63 @@
+"""The per-pattern extraction functions ExtractionEngine replaced, kept as the reference its results are checked against."""
+import re
+from urllib.parse import urljoin
+
+from app.models.schemas import ContactDetailsSchema, ImportantLinksSchema, SocialHandlesSchema
+from app.services.parsed_page import ParsedPage
+
+
+def extract_contact_details(page: ParsedPage) -> ContactDetailsSchema:
+    emails = set()
+    phones = set()
+    email_pattern = r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}\b'
+    emails.update(re.findall(email_pattern, page.text))
+    for anchor in page.anchors:
+        if anchor.href.startswith('mailto:'):
+            emails.add(anchor.href.replace('mailto:', '').split('?')[0])
+    phone_pattern = r'(\+?\d{1,3}[-.\s]?)?\(?\d{3}\)?[-.\s]?\d{3}[-.\s]?\d{4}'
+    phones.update(re.findall(phone_pattern, page.text))
+    for anchor in page.anchors:
+        if anchor.href.startswith('tel:'):
+            phones.add(anchor.href.replace('tel:', ''))
+    return ContactDetailsSchema(
+        emails=list(emails),
+        phones=list(phones)
+    )
+
+
+def extract_social_handles(page: ParsedPage) -> SocialHandlesSchema:
+    social_handles = {}
+    social_patterns = {
+        'instagram': r'instagram\.com/([^/\s]+)',
+        'facebook': r'facebook\.com/([^/\s]+)',
+        'twitter': r'(?:twitter\.com|x\.com)/([^/\s]+)',
+        'tiktok': r'tiktok\.com/@([^/\s]+)',
+        'youtube': r'youtube\.com/(?:channel/|user/|c/)?([^/\s]+)',
+        'pinterest': r'pinterest\.com/([^/\s]+)'
+    }
+    for platform, pattern in social_patterns.items():
+        matches = re.findall(pattern, page.html, re.IGNORECASE)
+        if matches:
+            social_handles[platform] = f"https://{platform}.com/{matches[0]}"
+    return SocialHandlesSchema(**social_handles)
+
+
+def extract_important_links(page: ParsedPage, base_url: str) -> ImportantLinksSchema:
+    important_links = {}
+    link_patterns = {
+        'order_tracking': r'track|tracking|order.*status',
+        'contact_us': r'contact|support|help',
+        'blogs': r'blog|news|article',
+        'shipping_info': r'shipping|delivery',
+        'size_guide': r'size.*guide|sizing'
+    }
+    for anchor in page.anchors:
+        link_text = anchor.text.lower()
+        href = anchor.href
+        if href.startswith('/'):
+            href = urljoin(base_url, href)
+        for key, pattern in link_patterns.items():
+            if re.search(pattern, link_text, re.IGNORECASE) and key not in important_links:
+                important_links[key] = href
+                break
+    return ImportantLinksSchema(**important_links)
@@ -0,0 +1,68 @@
+import random
+
+BASE_URL = 'https://store.test'
+
+WORDS = ('shop', 'new', 'order', 'status', 'help', 'size', 'guide', 'blog', 'track', 'shipping', 'our', 'story', 'sale')
+LINK_TEXTS = (
+    'Track order', 'Order status', 'Contact us', 'Help center', 'Support', 'Blog', 'News', 'Shipping',
+    'Delivery info', 'Size guide', 'Sizing', 'Order help status', 'Size blog guide', 'Shipping & returns', 'About'
+)
+SOCIAL_URLS = (
+    'https://instagram.com/brand', 'https://www.facebook.com/brandfb', 'https://twitter.com/brandtw',
+    'https://x.com/brandx', 'https://www.tiktok.com/@brandtt', 'https://youtube.com/c/brandyt',
+    'https://pinterest.com/brandpin', 'https://facebook.com/instagram.com/nested', 'https://netflix.com/title',
+    'https://youtube.com/channel/pinterest.com/odd'
+)
+CONTACT_TEXTS = (
+    'hello@store.test', 'Call +1 555-123-4567', '(555) 987 6543', '5551234567@sms.store.test',
+    'orders+1234567890@store.test', 'SALES@Store.Co.UK', 'ref 123.456.7890 x', '+44 20 7946 0958'
+)
+
+
+def random_page(rng: random.Random) -> str:
+    parts = []
+    for _ in range(rng.randint(5, 40)):
+        kind = rng.random()
+        if kind < 0.3:
+            parts.append(f'<a href="/{rng.choice(WORDS)}">{rng.choice(LINK_TEXTS)}</a>')
+        elif kind < 0.45:
+            parts.append(f'<a href="{rng.choice(SOCIAL_URLS)}">social</a>')
+        elif kind < 0.6:
+            parts.append(f'<p>{rng.choice(CONTACT_TEXTS)}</p>')
+        elif kind < 0.65:
+            parts.append(f'<a href="mailto:{rng.choice(WORDS)}@store.test?subject=hi">mail</a>')
+        elif kind < 0.7:
+            parts.append(f'<a href="tel:+1555{rng.randint(1000000, 9999999)}">call</a>')
+        else:
+            parts.append(f"<p>{' '.join(rng.choice(WORDS) for _ in range(rng.randint(1, 12)))}</p>")
+    return f"<html><head><title>Store</title></head><body>{''.join(parts)}</body></html>"
+
+
+def large_homepage(rng: random.Random, kilobytes: int = 300) -> str:
+    # A theme-sized homepage: inline scripts and styles in the head, navigation, product cards and a footer
+    head = [
+        '<title>Store - Everyday goods</title>',
+        '<link rel="stylesheet" href="//cdn.shopify.com/s/files/theme.css">',
+        f"<style>{' '.join(f'.c{i}{{margin:{i}px;padding:{i % 7}px}}' for i in range(400))}</style>",
+        '<script>var Shopify = Shopify || {}; Shopify.shop = "store.myshopify.com";</script>',
+    ]
+    links = ''.join(f'<a href="/{word}">{word.title()}</a>' for word in WORDS)
+    body = [f"<nav>{links}</nav>"]
+    size = sum(map(len, head + body))
+    product = 0
+    while size < kilobytes * 1024:
+        product += 1
+        card = (
+            f'<div class="product-card" data-product-id="{product}">'
+            f'<a href="/products/item-{product}"><img src="//cdn.shopify.com/item-{product}.jpg" alt="Item {product}"></a>'
+            f'<h3 class="product-title">Item {product}</h3><span class="price">${rng.randint(5, 300)}.00</span>'
+            f"<p>{' '.join(rng.choice(WORDS) for _ in range(rng.randint(10, 40)))}</p></div>\n"
+        )
+        if product % 25 == 0:
+            fields = ', '.join(f'"k{i}": {i}' for i in range(80))
+            card += f"<script>window.item{product} = {{{fields}}};</script>\n"
+        body.append(card)
+        size += len(card)
+    footer = random_page(rng).split('<body>', 1)[1].rsplit('</body>', 1)[0]
+    body.append(f"<footer>{footer}</footer>")
+    return f"<html><head>{''.join(head)}</head><body>{''.join(body)}</body></html>"
@@ -0,0 +1,72 @@
+import asyncio
+import hashlib
+import json
+from typing import Dict, Optional
+
+import httpx
+
+STORE_URL = 'https://acme.test'
+
+STORE_PAGES = {
+    '/': '<html><head><script>Shopify.shop="acme"</script><title>Acme</title></head>\n'
+         '<body><a href="/pages/faq">FAQ</a>\n<p>hello@acme.test</p></body></html>',
+    '/pages/about': '<html><body><main><h1>About</h1><p>We make shoes. Since 1990 in Leeds. Great.</p></main></body></html>',
+    '/pages/faq': '<html><body><main><p>Do you ship?</p><p>Yes we ship worldwide.</p></main></body></html>',
+    '/policies/privacy-policy': '<html><body><main><p>Privacy text here.</p></main></body></html>',
+    '/policies/refund-policy': '<html><body><main><p>Refund text here.</p></main></body></html>',
+}
+
+
+def store_products(count: int = 5) -> list:
+    return [
+        {'id': i, 'title': f"P{i}", 'handle': f"p{i}", 'vendor': 'Acme', 'product_type': 'Shoes',
+         'variants': [{'price': '9.99'}]}
+        for i in range(1, count + 1)
+    ]
+
+
+class MockStore:
+    """A Shopify store behind httpx.MockTransport, answering If-None-Match with 304s. Other hosts refuse connections."""
+
+    def __init__(self, pages: Optional[Dict[str, str]] = None, products: Optional[list] = None, latency: float = 0.0):
+        self.pages = dict(STORE_PAGES if pages is None else pages)
+        self.products = store_products() if products is None else products
+        self.latency = latency
+        self.hits: Dict[str, int] = {}
+        self.not_modified: Dict[str, int] = {}
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    def client(self) -> httpx.AsyncClient:
+        return httpx.AsyncClient(transport=httpx.MockTransport(self.handle))
+
+    async def handle(self, request: httpx.Request) -> httpx.Response:
+        if request.url.host != httpx.URL(STORE_URL).host:
+            raise httpx.ConnectError('Connection refused', request=request)
+        path = request.url.path
+        self.hits[path] = self.hits.get(path, 0) + 1
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            if self.latency:
+                await asyncio.sleep(self.latency)
+            return self._respond(request, path)
+        finally:
+            self.in_flight -= 1
+
+    def _respond(self, request: httpx.Request, path: str) -> httpx.Response:
+        if path == '/products.json':
+            page = int(request.url.params.get('page', '1'))
+            limit = int(request.url.params.get('limit', '250'))
+            body = json.dumps({'products': self.products[(page - 1) * limit:page * limit]}).encode()
+            content_type = 'application/json'
+        elif path in self.pages:
+            body = self.pages[path].encode()
+            content_type = 'text/html'
+        else:
+            return httpx.Response(404)
+        etag = '"%s"' % hashlib.md5(body).hexdigest()
+        if request.headers.get('if-none-match') == etag:
+            self.not_modified[path] = self.not_modified.get(path, 0) + 1
+            return httpx.Response(304, headers={'etag': etag})
+        return httpx.Response(200, content=body, headers={'content-type': content_type, 'etag': etag})
@@ -0,0 +1,114 @@
+import random
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.core import compression
+from app.core.compression import MissingDictionaryError, compress, decompress, dictionary_registry, is_compressed, train_dictionary
+from app.core.database import BrandInsight, CompressionDictionary, async_session_maker
+
+CODECS = ['zlib', pytest.param('zstd', marks=pytest.mark.skipif(not compression.ZSTD_AVAILABLE, reason='zstandard'))]
+
+WORDS = 'order refund return days purchase payment store credit exchange item shipping label customer receipt'.split()
+
+
+def policy_texts(count: int = 60) -> list:
+    rng = random.Random(0)
+    boilerplate = [' '.join(rng.choice(WORDS) for _ in range(12)) for _ in range(40)]
+    return [
+        '\n'.join(rng.sample(boilerplate, 25) + [' '.join(rng.choice(WORDS) for _ in range(12))]).encode()
+        for _ in range(count)
+    ]
+
+
+@pytest.fixture
+def registry(monkeypatch):
+    # Dictionaries registered by a test stay out of the process-wide registry
+    monkeypatch.setattr(dictionary_registry, '_dictionaries', {})
+    monkeypatch.setattr(dictionary_registry, '_active', {})
+    monkeypatch.setattr(dictionary_registry, 'pending', set())
+    return dictionary_registry
+
+
+@pytest.mark.parametrize('codec', CODECS)
+def test_round_trips_with_and_without_a_dictionary(codec, registry):
+    samples = policy_texts()
+    value = samples[0]
+    plain = compress(value, codec, use_dictionary=False)
+    assert is_compressed(plain) and decompress(plain) == value
+    registry.register(1, codec, train_dictionary(samples, codec))
+    with_dictionary = compress(value, codec)
+    assert decompress(with_dictionary) == value
+    assert len(with_dictionary) < len(plain)
+
+
+def test_small_and_legacy_values_are_stored_as_is(registry):
+    assert compress(b'short') == b'short'
+    assert decompress(b'{"written": "before compression"}') == b'{"written": "before compression"}'
+
+
+def test_missing_dictionary_raises_instead_of_reading_the_database(registry):
+    registry.register(3, 'zlib', train_dictionary(policy_texts(), 'zlib'))
+    value = compress(policy_texts()[0], 'zlib')
+    registry._dictionaries.clear()
+    with pytest.raises(MissingDictionaryError, match='Compression dictionary 3 is not loaded'):
+        decompress(value)
+
+
+def test_new_dictionaries_are_read_but_only_written_with_once_settled(run, db_schema, registry):
+    from app.core.database import load_compression_dictionaries
+
+    older, newer = train_dictionary(policy_texts(), 'zlib'), train_dictionary(policy_texts(30), 'zlib')
+
+    async def store(dictionary_id: int, data: bytes, created_at: datetime):
+        async with async_session_maker() as db:
+            db.add(CompressionDictionary(id=dictionary_id, codec='zlib', data=data, sample_count=60, created_at=created_at))
+            await db.commit()
+
+    now = datetime.utcnow()
+    run(store(5, older, now - timedelta(hours=1)))
+    assert run(load_compression_dictionaries()) == 1
+    assert registry.active('zlib') == (5, older)
+
+    # Trained just now: other workers may not have it yet, so values are still written with 5
+    run(store(6, newer, now))
+    assert run(load_compression_dictionaries()) == 1
+    assert registry.get(6) == ('zlib', newer)
+    assert registry.active('zlib') == (5, older)
+    assert registry.pending == {6}
+    # Nothing new to read, and 6 is still too recent
+    assert run(load_compression_dictionaries()) == 0
+    assert registry.pending == {6}
+
+    async def settle():
+        async with async_session_maker() as db:
+            (await db.get(CompressionDictionary, 6)).created_at = now - timedelta(hours=1)
+            await db.commit()
+
+    run(settle())
+    run(load_compression_dictionaries())
+    assert registry.active('zlib') == (6, newer)
+    assert not registry.pending
+
+
+def test_columns_are_decompressed_on_first_read(run, db_schema):
+    catalog = [{'id': i, 'title': f"Product {i}", 'description': 'A long description. ' * 20} for i in range(20)]
+
+    async def save():
+        async with async_session_maker() as db:
+            db.add(BrandInsight(website_url='https://lazy.test', refund_policy='Refunds within 30 days. ' * 50,
+                                product_catalog=catalog))
+            await db.commit()
+
+    async def load():
+        async with async_session_maker() as db:
+            return (await db.execute(BrandInsight.__table__.select())).first(), await db.get(BrandInsight, 1)
+
+    run(save())
+    raw_row, insight = run(load())
+    assert is_compressed(raw_row.product_catalog) and is_compressed(raw_row.refund_policy)
+    assert '_decompressed_product_catalog' not in insight.__dict__
+    assert insight.product_catalog == catalog
+    assert insight.__dict__['_decompressed_product_catalog'][1] is insight.product_catalog
+    insight.refund_policy = 'No refunds.'
+    assert insight._refund_policy == b'No refunds.' and insight.refund_policy == 'No refunds.'
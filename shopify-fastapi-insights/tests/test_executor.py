@@ -0,0 +1,79 @@
+import asyncio
+import random
+
+import pytest
+
+from app.core.executor import ParseExecutor
+from app.core.loop_monitor import LoopLagMonitor
+from app.services import page_analysis
+from tests.pages import BASE_URL, large_homepage, random_page
+
+PAGES = [random_page(random.Random(seed)) for seed in range(5)]
+
+
+def comparable(analysis: page_analysis.HomepageAnalysis) -> page_analysis.HomepageAnalysis:
+    # Emails and phones are collected in sets, so their order follows each process's hash seed
+    contacts = analysis.details.contact_details
+    contacts = contacts.model_copy(update={'emails': sorted(contacts.emails), 'phones': sorted(contacts.phones)})
+    return analysis._replace(details=analysis.details._replace(contact_details=contacts))
+
+
+def fail(message: str) -> None:
+    raise RuntimeError(message)
+
+
+@pytest.mark.parametrize('kind', ['thread', 'process'])
+def test_pool_results_match_inline_parsing(run, kind):
+    executor = ParseExecutor(kind, workers=2)
+    try:
+        for html in PAGES:
+            pooled = run(executor.run(page_analysis.analyze_homepage, BASE_URL, html, BASE_URL))
+            assert comparable(pooled) == comparable(page_analysis.analyze_homepage(BASE_URL, html, BASE_URL))
+            assert run(executor.run(page_analysis.extract_llm_sections, BASE_URL, html)) == \
+                page_analysis.extract_llm_sections(BASE_URL, html)
+    finally:
+        executor.shutdown()
+    assert executor.metrics()['tasks'] == 2 * len(PAGES)
+
+
+def test_failures_reach_the_caller_and_are_counted(run):
+    executor = ParseExecutor('thread', workers=1)
+    try:
+        with pytest.raises(RuntimeError, match='bad page'):
+            run(executor.run(fail, 'bad page'))
+    finally:
+        executor.shutdown()
+    metrics = executor.metrics()
+    assert (metrics['tasks'], metrics['failures'], metrics['in_flight']) == (1, 1, 0)
+
+
+def test_unknown_kind_is_rejected():
+    with pytest.raises(ValueError):
+        ParseExecutor('gpu')
+
+
+async def parse_under_monitor(executor: ParseExecutor, pages) -> float:
+    # Largest loop lag seen while the pages are parsed concurrently
+    monitor = LoopLagMonitor(interval=0.005)
+    monitor.start()
+    await asyncio.sleep(0.02)
+    await asyncio.gather(*[executor.run(page_analysis.analyze_homepage, BASE_URL, html, BASE_URL) for html in pages])
+    # Lets the monitor record the wake-up that a blocking parse delayed
+    await asyncio.sleep(0.02)
+    await monitor.stop()
+    return monitor.max_lag
+
+
+def test_a_process_pool_keeps_the_loop_responsive_while_parsing(run):
+    pages = [large_homepage(random.Random(seed)) for seed in range(4)]
+    inline = ParseExecutor('inline')
+    pool = ParseExecutor('process', workers=2)
+    try:
+        # Workers are spawned and warmed up first so their start-up is not measured
+        run(pool.run(page_analysis.analyze_homepage, BASE_URL, pages[0], BASE_URL))
+        inline_lag = run(parse_under_monitor(inline, pages))
+        pool_lag = run(parse_under_monitor(pool, pages))
+    finally:
+        pool.shutdown()
+    # Inline, the loop waits out every page parse at once (about a second here, against a few ms)
+    assert pool_lag < inline_lag / 4
@@ -0,0 +1,48 @@
+import random
+
+import pytest
+
+from app.services.extraction import extraction_engine
+from app.services.parsed_page import ParsedPage
+from tests import legacy_extraction
+from tests.pages import BASE_URL, random_page
+
+
+def assert_same_as_legacy(html: str) -> None:
+    page = ParsedPage(BASE_URL, html)
+    contacts = extraction_engine.extract_contact_details(page.text, page.anchors)
+    legacy_contacts = legacy_extraction.extract_contact_details(page)
+    assert set(contacts.emails) == set(legacy_contacts.emails)
+    assert set(contacts.phones) == set(legacy_contacts.phones)
+    assert extraction_engine.extract_social_handles(page.html) == legacy_extraction.extract_social_handles(page)
+    assert extraction_engine.extract_important_links(page.anchors, BASE_URL) == \
+        legacy_extraction.extract_important_links(page, BASE_URL)
+
+
+@pytest.mark.parametrize('seed', range(300))
+def test_matches_legacy_functions_on_random_pages(seed):
+    assert_same_as_legacy(random_page(random.Random(seed)))
+
+
+@pytest.mark.parametrize('html', [
+    # A phone number in an email's local part is both an email and a phone
+    '<p>Text 5551234567@sms.store.test to reach us</p>',
+    '<p>orders+1234567890@store.test</p>',
+    # A handle that contains another platform's URL must not hide that platform
+    '<a href="https://facebook.com/instagram.com/nested">x</a>',
+    '<a href="https://youtube.com/channel/pinterest.com/odd">x</a>',
+    # A later key matching inside a greedy earlier match
+    '<a href="/track">Track</a><a href="/help">Order help status</a>',
+    '<a href="/size">Size guide</a><a href="/blog">Size blog guide</a>',
+])
+def test_matches_legacy_functions_on_overlapping_patterns(html):
+    assert_same_as_legacy(f'<html><body>{html}</body></html>')
+
+
+def test_extract_returns_all_families_together():
+    page = ParsedPage(BASE_URL, '<html><body><p>hi@store.test</p>\n<a href="https://instagram.com/brand/">ig</a>\n'
+                                '<a href="/pages/contact">Contact us</a></body></html>')
+    result = extraction_engine.extract(page, BASE_URL)
+    assert result.contact_details.emails == ['hi@store.test']
+    assert result.social_handles.instagram == 'https://instagram.com/brand'
+    assert result.important_links.contact_us == f'{BASE_URL}/pages/contact'
@@ -0,0 +1,38 @@
+import asyncio
+
+import httpx
+
+from app.core.http_client import HostLimitedTransport
+
+
+def test_counts_in_flight_queued_and_idle(run):
+    release = asyncio.Event()
+
+    async def handle(request: httpx.Request) -> httpx.Response:
+        await release.wait()
+        # A stream rather than content, so the client reads and closes it as it would a real body
+        return httpx.Response(200, stream=httpx.ByteStream(b'ok'))
+
+    transport = HostLimitedTransport(
+        httpx.MockTransport(handle), max_requests_per_host=2, max_connections=10,
+        max_keepalive_connections=5, keepalive_expiry=30.0
+    )
+
+    async def scenario():
+        async with httpx.AsyncClient(transport=transport) as client:
+            requests = [asyncio.create_task(client.get(f"https://{host}/")) for host in ('a.test',) * 3 + ('b.test',)]
+            await asyncio.sleep(0.01)
+            busy = transport.metrics()
+            release.set()
+            await asyncio.gather(*requests)
+            return busy, transport.metrics()
+
+    busy, done = run(scenario())
+    assert busy['in_flight_requests'] == 3
+    assert busy['hosts_in_flight'] == {'a.test': 2, 'b.test': 1}
+    assert busy['queued_requests'] == 1
+    assert busy['idle_connections'] == 0
+    assert done['in_flight_requests'] == 0
+    assert done['queued_requests'] == 0
+    assert done['idle_connections'] == 2
+    assert done['total_requests'] == 4
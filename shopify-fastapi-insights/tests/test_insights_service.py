@@ -0,0 +1,237 @@
+import asyncio
+import time
+from datetime import datetime, timedelta
+
+import httpx
+import pytest
+from sqlalchemy import func, select
+
+from app.core.config import settings
+from app.core.database import Base, BrandInsight, Product, async_session_maker, engine, init_db
+from app.core.exceptions import InvalidCursorError
+from app.models.schemas import ScrapingStatus
+from app.services.batch_service import BatchInsightsService
+from app.services.insights_service import GUESSED_PATHS, InsightsService
+from app.services.path_stats import path_stats
+from tests.store import STORE_URL, MockStore, store_products
+
+
+async def extract(store: MockStore, max_age=None):
+    async with store.client() as client:
+        service = InsightsService(client)
+        async with async_session_maker() as db:
+            return await service.extract_insights(STORE_URL, db, max_age)
+
+
+async def stored(insight_id: int) -> BrandInsight:
+    async with async_session_maker() as db:
+        return await db.get(BrandInsight, insight_id)
+
+
+async def product_generations(insight_id: int) -> dict:
+    async with async_session_maker() as db:
+        result = await db.execute(
+            select(Product.generation, func.count())
+            .where(Product.brand_insight_id == insight_id)
+            .group_by(Product.generation)
+        )
+        return dict(result.all())
+
+
+async def reset_schema():
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+    await init_db()
+
+
+def test_extracts_every_section_with_concurrent_fetches(run, db_schema):
+    store = MockStore(latency=0.02)
+    insights = run(extract(store))
+    assert insights.scraping_status == ScrapingStatus.COMPLETED
+    assert insights.is_shopify_store
+    assert insights.contact_details.emails == ['hello@acme.test']
+    assert insights.privacy_policy == 'Privacy text here.'
+    assert insights.refund_policy == 'Refund text here.'
+    assert insights.brand_context.startswith('About We make shoes.')
+    assert [(f.question, f.answer) for f in insights.faqs] == [('Do you ship?', 'Yes we ship worldwide.')]
+    assert [p.title for p in insights.product_catalog] == ['P1', 'P2', 'P3', 'P4', 'P5']
+    assert store.max_in_flight > 1
+
+
+def test_refresh_revalidates_pages_and_refetches_changes(run, db_schema):
+    store = MockStore()
+    first = run(extract(store))
+    row = run(stored(first.id))
+    assert row.section_pages == {
+        'privacy': '/policies/privacy-policy', 'refund': '/policies/refund-policy',
+        'about': '/pages/about', 'faq': '/pages/faq'
+    }
+    store.pages['/pages/about'] = store.pages['/pages/about'].replace('shoes', 'boots')
+    store.products[2]['title'] = 'changed'
+    store.hits.clear()
+    refreshed = run(extract(store, max_age=0))
+    assert refreshed.brand_context.startswith('About We make boots.')
+    assert [p.title for p in refreshed.product_catalog] == ['P1', 'P2', 'changed', 'P4', 'P5']
+    assert refreshed.privacy_policy == 'Privacy text here.'
+    # Remembered pages are asked for again, guessed paths are not
+    assert store.not_modified.keys() >= {'/', '/policies/privacy-policy', '/policies/refund-policy', '/pages/faq'}
+    assert '/pages/privacy-policy' not in store.hits
+
+
+def test_section_with_no_content_keeps_its_value_and_stays_stale(run, db_schema):
+    store = MockStore()
+    first = run(extract(store))
+    fetched_at = run(stored(first.id)).section_fetched_at
+    del store.pages['/pages/faq']
+    refreshed = run(extract(store, max_age=0))
+    assert [f.question for f in refreshed.faqs] == ['Do you ship?']
+    row = run(stored(first.id))
+    assert row.section_fetched_at['faqs'] == fetched_at['faqs']
+    assert row.section_fetched_at['privacy_policy'] > fetched_at['privacy_policy']
+
+
+async def extract_faqs(store: MockStore):
+    async with store.client() as client:
+        service = InsightsService(client)
+        return service, await service._extract_faqs(STORE_URL, asyncio.Semaphore(8))
+
+
+def test_faq_probes_fetch_then_ask_the_llm_once(run, db_schema):
+    # The FAQ page has text but no questions: the LLM finds nothing, yet the path still counts as a hit
+    store = MockStore(pages={'/pages/faq': '<html><body><main><p>Shipping takes three days.</p></main></body></html>'})
+    service, faqs = run(extract_faqs(store))
+    assert faqs == []
+    assert service.llm_service.model.calls == 1
+    hit = path_stats._pending[(service.scraper.get_host_key(STORE_URL), 'faq', '/pages/faq')]
+    assert (hit.hits, hit.misses, hit.dead_until) == (1, 0, None)
+
+
+def test_faq_paths_that_404_are_marked_dead_without_an_llm_call(run, db_schema):
+    service, faqs = run(extract_faqs(MockStore(pages={})))
+    assert faqs == []
+    assert service.llm_service.model.calls == 0
+    host = service.scraper.get_host_key(STORE_URL)
+    for url_path in GUESSED_PATHS['faq']:
+        dead = path_stats._pending[(host, 'faq', url_path)]
+        assert (dead.hits, dead.misses) == (0, 1) and dead.dead_until is not None
+
+
+def test_fan_out_beats_one_fetch_at_a_time(run, db_schema, monkeypatch):
+    # Homepage and detection are sequential either way; the catalog and four pages after them
+    # take one round trip each when fetched one at a time, and about one together
+    latency = 0.1
+    timings = {}
+    for concurrency in (1, 8):
+        monkeypatch.setattr(settings, 'MAX_CONCURRENT_FETCHES_PER_STORE', concurrency)
+        run(reset_schema())
+        started = time.perf_counter()
+        insights = run(extract(MockStore(latency=latency)))
+        timings[concurrency] = time.perf_counter() - started
+        assert [p.title for p in insights.product_catalog] == ['P1', 'P2', 'P3', 'P4', 'P5']
+    assert timings[1] - timings[8] > 2 * latency
+
+
+class CountingStore(MockStore):
+    """Records how many product rows are stored when each catalog page is requested."""
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.stored_at_request = {}
+
+    async def handle(self, request: httpx.Request) -> httpx.Response:
+        if request.url.path == '/products.json' and 'page' in request.url.params:
+            async with async_session_maker() as db:
+                stored = await db.scalar(select(func.count()).select_from(Product))
+            self.stored_at_request[int(request.url.params['page'])] = stored
+        return await super().handle(request)
+
+
+def test_catalog_pages_are_stored_as_they_arrive(run, db_schema, monkeypatch):
+    monkeypatch.setattr(settings, 'PRODUCTS_PAGE_LIMIT', 2)
+    monkeypatch.setattr(settings, 'PRODUCTS_PAGE_PREFETCH', 0)
+    store = CountingStore(products=store_products(7))
+    insights = run(extract(store))
+    assert [p.title for p in insights.product_catalog] == [f"P{i}" for i in range(1, 8)]
+    # Page n + 1 may be requested before or after page n is stored, but page n is committed
+    # before page n + 2 is asked for
+    assert sorted(store.stored_at_request) == [1, 2, 3, 4]
+    assert all(stored >= 2 * (page - 2) for page, stored in store.stored_at_request.items())
+    assert store.stored_at_request[1] == 0 and store.stored_at_request[4] in (4, 6)
+    row = run(stored(insights.id))
+    assert row.product_catalog is None
+    assert run(product_generations(insights.id)) == {row.catalog_generation: 7}
+
+
+def test_refresh_swaps_in_a_new_catalog_generation(run, db_schema, monkeypatch):
+    monkeypatch.setattr(settings, 'PRODUCTS_PAGE_LIMIT', 2)
+    store = MockStore(products=store_products(5))
+    first = run(extract(store))
+    generation = run(stored(first.id)).catalog_generation
+
+    # Nothing changed: no new generation is kept
+    unchanged = run(extract(store, max_age=0))
+    assert [p.title for p in unchanged.product_catalog] == ['P1', 'P2', 'P3', 'P4', 'P5']
+    assert run(product_generations(first.id)) == {generation: 5}
+
+    # One page changed: the others are copied over from the live generation, in catalog order
+    store.products[2]['title'] = 'changed'
+    store.products.append(store_products(6)[5])
+    store.not_modified.clear()
+    refreshed = run(extract(store, max_age=0))
+    assert [p.title for p in refreshed.product_catalog] == ['P1', 'P2', 'changed', 'P4', 'P5', 'P6']
+    assert store.not_modified['/products.json'] == 1
+    assert run(product_generations(first.id)) == {generation + 1: 6}
+
+
+def test_batch_streams_one_result_per_url(run, db_schema):
+    store = MockStore()
+
+    async def batch():
+        async with store.client() as client:
+            return [result async for result in BatchInsightsService(client).stream_insights([STORE_URL, 'https://down.test'])]
+
+    results = {result.website_url: result for result in run(batch())}
+    assert results[STORE_URL].scraping_status == ScrapingStatus.COMPLETED
+    failed = results['https://down.test']
+    assert failed.scraping_status == ScrapingStatus.FAILED
+    assert 'Connection refused' in failed.error_message
+
+
+async def store_history(created_at) -> None:
+    async with async_session_maker() as db:
+        db.add_all(BrandInsight(website_url=f'https://brand-{index}.test', created_at=when) for index, when in enumerate(created_at))
+        await db.commit()
+
+
+async def history_pages(limit: int, fields=None):
+    service = InsightsService(httpx.AsyncClient())
+    pages, cursor = [], None
+    async with async_session_maker() as db:
+        while True:
+            insights, cursor = await service.get_history(db, limit, cursor, fields)
+            pages.append([insight.id for insight in insights])
+            if cursor is None:
+                return pages
+
+
+def test_history_pages_through_tied_timestamps_newest_first(run, db_schema):
+    # Rows stored in the same batch share created_at, so pages break ties on the id
+    noon = datetime(2024, 5, 1, 12)
+    created_at = [noon, noon + timedelta(hours=1), noon, noon, noon + timedelta(hours=1), noon - timedelta(hours=1), noon]
+    run(store_history(created_at))
+    newest_first = sorted(range(1, len(created_at) + 1), key=lambda insight_id: (created_at[insight_id - 1], insight_id), reverse=True)
+    for limit in (1, 2, 3, len(created_at)):
+        pages = run(history_pages(limit))
+        assert sum(pages, []) == newest_first
+        assert all(pages[:-1]) and len(pages[-1]) <= limit
+    assert run(history_pages(2, ['brand_name'])) == [newest_first[:2], newest_first[2:4], newest_first[4:6], newest_first[6:]]
+
+
+def test_history_rejects_a_malformed_cursor(run, db_schema):
+    async def page(cursor: str):
+        async with async_session_maker() as db:
+            return await InsightsService(httpx.AsyncClient()).get_history(db, 10, cursor)
+
+    for cursor in ('not a cursor', 'WyJ5ZXN0ZXJkYXkiLCAxXQ==', 'WzFd'):
+        with pytest.raises(InvalidCursorError):
+            run(page(cursor))
@@ -0,0 +1,108 @@
+import asyncio
+from datetime import datetime, timedelta
+
+from sqlalchemy import update
+
+from app.core.config import settings
+from app.core.database import BrandInsight, async_session_maker
+from app.models.schemas import ScrapingStatus
+from app.services.job_queue import InsightsJobQueue
+from tests.store import STORE_URL, MockStore
+
+# MockStore refuses connections to any other host, so extractions of this site fail
+DOWN_URL = 'https://down.test'
+
+
+def queue(store: MockStore, worker_id: str) -> InsightsJobQueue:
+    job_queue = InsightsJobQueue(store.client(), workers=1)
+    job_queue.worker_id = worker_id
+    return job_queue
+
+
+async def enqueue(job_queue: InsightsJobQueue, website_url: str) -> int:
+    async with async_session_maker() as db:
+        return (await job_queue.enqueue(website_url, db)).id
+
+
+async def claim(job_queue: InsightsJobQueue):
+    async with async_session_maker() as db:
+        return await job_queue.claim(db)
+
+
+async def claim_and_process(job_queue: InsightsJobQueue):
+    async with async_session_maker() as db:
+        job_id = await job_queue.claim(db)
+        if job_id is not None:
+            await job_queue._process(job_id, db)
+        return job_id
+
+
+async def stored(job_id: int) -> BrandInsight:
+    async with async_session_maker() as db:
+        return await db.get(BrandInsight, job_id)
+
+
+async def set_columns(job_id: int, **values) -> None:
+    async with async_session_maker() as db:
+        await db.execute(update(BrandInsight).where(BrandInsight.id == job_id).values(**values))
+        await db.commit()
+
+
+def test_a_job_is_claimed_by_one_worker(run, db_schema):
+    store = MockStore()
+    first, second = queue(store, 'worker-a'), queue(store, 'worker-b')
+    job_id = run(enqueue(first, STORE_URL))
+
+    async def claim_both():
+        return await asyncio.gather(claim(first), claim(second))
+
+    claims = run(claim_both())
+    assert sorted(claims, key=str) == [job_id, None]
+    row = run(stored(job_id))
+    assert row.scraping_status == ScrapingStatus.IN_PROGRESS
+    assert row.attempts == 1
+    assert row.lease_owner == ('worker-a' if claims[0] else 'worker-b')
+
+
+def test_an_expired_lease_is_claimed_again(run, db_schema):
+    store = MockStore()
+    first, second = queue(store, 'worker-a'), queue(store, 'worker-b')
+    job_id = run(enqueue(first, STORE_URL))
+    assert run(claim(first)) == job_id
+    # Held until the lease runs out
+    assert run(claim(second)) is None
+    run(set_columns(job_id, lease_expires_at=datetime.utcnow() - timedelta(seconds=1)))
+    assert run(claim(second)) == job_id
+    row = run(stored(job_id))
+    assert row.lease_owner == 'worker-b'
+    assert row.attempts == 2
+
+
+def test_a_failed_job_waits_for_its_backoff(run, db_schema):
+    job_queue = queue(MockStore(), 'worker-a')
+    job_id = run(enqueue(job_queue, DOWN_URL))
+    before = datetime.utcnow()
+    assert run(claim_and_process(job_queue)) == job_id
+    row = run(stored(job_id))
+    assert row.scraping_status == ScrapingStatus.PENDING
+    assert row.lease_owner is None
+    assert row.retry_at - before >= timedelta(seconds=settings.JOB_RETRY_BACKOFF)
+    assert run(claim(job_queue)) is None
+    run(set_columns(job_id, retry_at=datetime.utcnow() - timedelta(seconds=1)))
+    assert run(claim(job_queue)) == job_id
+
+
+def test_a_job_fails_for_good_after_max_attempts(run, db_schema, monkeypatch):
+    monkeypatch.setattr(settings, 'JOB_MAX_ATTEMPTS', 2)
+    job_queue = queue(MockStore(), 'worker-a')
+    job_id = run(enqueue(job_queue, DOWN_URL))
+    assert run(claim_and_process(job_queue)) == job_id
+    run(set_columns(job_id, retry_at=datetime.utcnow() - timedelta(seconds=1)))
+    assert run(claim_and_process(job_queue)) == job_id
+    row = run(stored(job_id))
+    assert row.scraping_status == ScrapingStatus.FAILED
+    assert row.attempts == 2
+    assert 'Connection refused' in row.error_message
+    # Neither a pending retry nor an expired lease makes it claimable again
+    run(set_columns(job_id, lease_expires_at=datetime.utcnow() - timedelta(seconds=1)))
+    assert run(claim(job_queue)) is None
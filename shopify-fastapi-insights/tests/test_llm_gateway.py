@@ -0,0 +1,87 @@
+import asyncio
+
+import pytest
+
+from app.services.llm_gateway import CLOSED, HALF_OPEN, OPEN, LLMGateway, LLMQueueTimeoutError, LLMUnavailableError
+
+
+class Model:
+    """Answers, or raises, after an optional delay, and counts its calls."""
+
+    def __init__(self, error: Exception = None, delay: float = 0.0):
+        self.error = error
+        self.delay = delay
+        self.calls = 0
+
+    async def generate_content_async(self, prompt: str) -> str:
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        if self.error is not None:
+            raise self.error
+        return f"answer to {prompt}"
+
+
+def gateway(**kwargs) -> LLMGateway:
+    options = dict(max_concurrency=2, timeout=1.0, max_retries=0, retry_backoff=0.0, failure_threshold=2, reset_seconds=60.0)
+    return LLMGateway(**{**options, **kwargs})
+
+
+def test_a_non_retryable_error_counts_as_a_failure(run):
+    llm = gateway()
+    broken = Model(ValueError('unexpected payload'))
+    for _ in range(2):
+        with pytest.raises(LLMUnavailableError, match='unexpected payload'):
+            run(llm.generate(broken, 'p'))
+    assert (llm.failures, llm.retries, llm.state) == (2, 0, OPEN)
+    # While open, calls fail without reaching the provider
+    with pytest.raises(LLMUnavailableError, match='circuit is open'):
+        run(llm.generate(Model(), 'p'))
+    assert broken.calls == 2 and llm.rejected == 1
+
+
+def test_half_open_lets_one_trial_through(run):
+    llm = gateway(reset_seconds=0.05)
+    for _ in range(2):
+        with pytest.raises(LLMUnavailableError):
+            run(llm.generate(Model(ConnectionError('reset')), 'p'))
+    assert llm.state == OPEN
+    run(asyncio.sleep(0.06))
+
+    async def trial_and_another():
+        slow = Model(delay=0.05)
+        trial = asyncio.ensure_future(llm.generate(slow, 'trial'))
+        await asyncio.sleep(0)
+        assert llm.state == HALF_OPEN
+        with pytest.raises(LLMUnavailableError, match='trial call is running'):
+            await llm.generate(Model(), 'other')
+        return await trial
+
+    assert run(trial_and_another()) == 'answer to trial'
+    assert llm.state == CLOSED
+
+    # A failed trial opens the circuit again straight away
+    for _ in range(2):
+        with pytest.raises(LLMUnavailableError):
+            run(llm.generate(Model(ConnectionError('reset')), 'p'))
+    run(asyncio.sleep(0.06))
+    with pytest.raises(LLMUnavailableError):
+        run(llm.generate(Model(ValueError('bad')), 'p'))
+    assert llm.state == OPEN
+    assert llm.circuit_opens == 3
+
+
+def test_waiting_for_a_slot_does_not_open_the_circuit(run):
+    llm = gateway(max_concurrency=1, timeout=0.05)
+
+    async def call_while_slot_is_taken():
+        await llm._semaphore.acquire()
+        try:
+            with pytest.raises(LLMQueueTimeoutError):
+                await llm.generate(Model(), 'p')
+        finally:
+            llm._semaphore.release()
+
+    for _ in range(3):
+        run(call_while_slot_is_taken())
+    assert (llm.queue_timeouts, llm.failures, llm.state) == (3, 0, CLOSED)
+    assert run(llm.generate(Model(), 'p')) == 'answer to p'
@@ -0,0 +1,51 @@
+from sqlalchemy import func, select
+
+from app.core.database import LLMCacheEntry, async_session_maker
+from app.services.fake_llm import FakeGenerativeModel, FakeResponse
+from app.services.llm_service import LLMService
+
+FAQ_TEXT = 'Do you ship?\nYes we ship worldwide.'
+
+
+class ScriptedModel(FakeGenerativeModel):
+    """Answers every prompt with the same text; an empty text has no parts, like a blocked prompt."""
+
+    def __init__(self, text: str):
+        super().__init__()
+        self.text = text
+
+    async def generate_content_async(self, prompt: str) -> FakeResponse:
+        self.calls += 1
+        return FakeResponse(self.text)
+
+
+async def cached_entries() -> int:
+    async with async_session_maker() as db:
+        return await db.scalar(select(func.count()).select_from(LLMCacheEntry))
+
+
+def service_answering(text: str) -> LLMService:
+    service = LLMService()
+    service.model = ScriptedModel(text)
+    return service
+
+
+def test_blocked_and_malformed_answers_are_not_cached(run, db_schema):
+    for text in ('', 'I cannot help with that.', '["not", "an", "object"]'):
+        service = service_answering(text)
+        assert run(service.extract_faqs(FAQ_TEXT)) == []
+        assert run(service.extract_faqs(FAQ_TEXT)) == []
+        assert service.model.calls == 2
+    blocked = service_answering('')
+    assert run(blocked.extract_brand_context('We make shoes.')) is None
+    assert run(blocked.find_competitors('Acme', 'shoes')) == []
+    assert run(cached_entries()) == 0
+
+
+def test_answers_are_cached_even_when_empty(run, db_schema):
+    # "No FAQs on this page" is a real answer and is not asked again
+    service = service_answering('{"faqs": []}')
+    assert run(service.extract_faqs(FAQ_TEXT)) == []
+    assert run(service.extract_faqs(FAQ_TEXT)) == []
+    assert service.model.calls == 1
+    assert run(cached_entries()) == 1
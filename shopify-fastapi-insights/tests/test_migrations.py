@@ -0,0 +1,49 @@
+from sqlalchemy import inspect, text
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from app.core.migrations import upgrade_schema
+
+# The products table as first created, with the store-wide unique product id declared inline
+OLD_PRODUCTS = (
+    "CREATE TABLE products ("
+    "id INTEGER PRIMARY KEY, brand_insight_id INTEGER NOT NULL, product_id BIGINT NOT NULL, "
+    "title VARCHAR(500) NOT NULL, handle VARCHAR(255) NOT NULL, vendor VARCHAR(255) NOT NULL, "
+    "product_type VARCHAR(255) NOT NULL, price FLOAT NOT NULL, url VARCHAR(1000) NOT NULL, "
+    "image_url VARCHAR(1000), description TEXT, is_hero_product BOOLEAN NOT NULL, "
+    "CONSTRAINT uq_products_brand_product UNIQUE (brand_insight_id, product_id))",
+    "CREATE INDEX ix_products_brand_price ON products (brand_insight_id, price, id)",
+)
+
+PRODUCT = "1, 7, 'Cap', 'cap', 'Acme', 'Hats', 9.5, 'https://acme.test/products/cap', NULL, NULL, 0"
+
+
+def test_upgrade_moves_products_to_generations(run, tmp_path):
+    db_engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path}/old.db")
+
+    async def upgrade():
+        async with db_engine.begin() as conn:
+            for statement in OLD_PRODUCTS:
+                await conn.execute(text(statement))
+            await conn.execute(text(
+                "INSERT INTO products (brand_insight_id, product_id, title, handle, vendor, product_type, price, url, "
+                f"image_url, description, is_hero_product) VALUES ({PRODUCT})"
+            ))
+        upgrades = await upgrade_schema(db_engine)
+        async with db_engine.begin() as conn:
+            # The same product can now be staged under the next generation
+            await conn.execute(text(
+                "INSERT INTO products (brand_insight_id, product_id, title, handle, vendor, product_type, price, url, "
+                f"image_url, description, is_hero_product, generation) VALUES ({PRODUCT}, 1)"
+            ))
+            rows = (await conn.execute(text("SELECT product_id, generation FROM products ORDER BY id"))).all()
+            indexes = await conn.run_sync(lambda sync_conn: inspect(sync_conn).get_indexes('products'))
+        again = await upgrade_schema(db_engine)
+        await db_engine.dispose()
+        return upgrades, rows, {index['name'] for index in indexes}, again
+
+    upgrades, rows, indexes, again = run(upgrade())
+    assert upgrades
+    assert rows == [(7, 0), (7, 1)]
+    assert indexes >= {'ix_products_generation_price', 'ix_products_generation_type_price', 'ix_products_generation_vendor_price'}
+    assert 'ix_products_brand_price' not in indexes
+    assert again == 0
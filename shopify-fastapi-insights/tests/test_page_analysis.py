@@ -0,0 +1,36 @@
+import json
+
+from app.services.page_analysis import extract_structured_products
+
+BASE_URL = 'https://acme.test'
+
+
+def json_ld(*items) -> str:
+    return f'<script type="application/ld+json">{json.dumps(list(items))}</script>'
+
+
+def product_json(data: dict) -> str:
+    return f'<script type="application/json" data-product-json>{json.dumps(data)}</script>'
+
+
+def test_json_ld_and_inline_product_json_are_read():
+    html = json_ld({'@type': 'Product', 'name': 'Cap', 'url': '/products/cap', 'offers': {'price': '12.50'}}) + \
+        product_json({'id': 7, 'title': 'Tee', 'handle': 'tee', 'price': 2500})
+    products = {product.handle: product for product in extract_structured_products(html, BASE_URL)}
+    assert (products['tee'].id, products['tee'].price) == (7, 25.0)
+    assert (products['cap'].title, products['cap'].price, products['cap'].url) == ('Cap', 12.5, f'{BASE_URL}/products/cap')
+
+
+def test_a_malformed_product_is_skipped_and_the_rest_kept():
+    html = (
+        json_ld(
+            {'@type': 'Product', 'name': {'@value': 'Cap'}, 'url': '/products/cap'},
+            {'@type': 'Product', 'name': 'Scarf', 'url': '/products/scarf', 'offers': 'ask us'},
+            {'@type': 'Product', 'name': 'Boot', 'url': '/products/boot'},
+        )
+        + product_json({'id': 'gid://shopify/Product/1', 'title': 'Tee', 'handle': 'tee'})
+        + product_json({'id': 2, 'title': 'Sock', 'handle': 'sock', 'variants': ['9.99']})
+        + product_json({'id': 3, 'title': 'Hat', 'handle': 'hat', 'price': 1500})
+    )
+    products = extract_structured_products(html, BASE_URL)
+    assert sorted(product.handle for product in products) == ['boot', 'hat', 'scarf']
@@ -0,0 +1,84 @@
+from app.core.config import settings
+from app.core.database import async_session_maker
+from app.services.insights_service import InsightsService
+from app.services.page_discovery import PageDiscovery
+from app.services.scraper import WebScraper
+from tests.store import STORE_PAGES, STORE_URL, MockStore
+
+SITEMAP = '<?xml version="1.0" encoding="UTF-8"?><{kind} xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">{entries}</{kind}>'
+
+
+def sitemap_index(*paths: str) -> str:
+    return SITEMAP.format(kind='sitemapindex', entries=''.join(f'<sitemap><loc>{STORE_URL}{path}</loc></sitemap>' for path in paths))
+
+
+def url_set(*urls: str) -> str:
+    return SITEMAP.format(kind='urlset', entries=''.join(f'<url><loc>{url}</loc></url>' for url in urls))
+
+
+PAGES_SITEMAP = url_set(
+    f'{STORE_URL}/pages/returns-and-exchanges',
+    f'{STORE_URL}/pages/about-the-brand',
+    f'{STORE_URL}/pages/about',
+    f'{STORE_URL}/pages/shipping',
+    f'{STORE_URL}/pages/private-contact',
+    'https://elsewhere.test/pages/faq',
+    f'{STORE_URL}/products/refund-card',
+)
+
+
+async def discover(store: MockStore) -> dict:
+    async with store.client() as client:
+        return await PageDiscovery(WebScraper(client)).discover(STORE_URL)
+
+
+def test_robots_sitemaps_lead_to_the_pages_sitemap_only(run):
+    store = MockStore(pages={
+        '/robots.txt': f'User-agent: *\nDisallow: /pages/private\nSitemap: {STORE_URL}/sitemap-index.xml\n',
+        '/sitemap-index.xml': sitemap_index('/sitemap_products_1.xml', '/sitemap_pages_1.xml', '/sitemap_blogs_1.xml'),
+        '/sitemap_pages_1.xml': PAGES_SITEMAP,
+    })
+    pages = run(discover(store))
+    assert pages == {
+        'refund': ['/pages/returns-and-exchanges'],
+        'about': ['/pages/about', '/pages/about-the-brand'],
+        'shipping': ['/pages/shipping'],
+    }
+    assert '/sitemap_products_1.xml' not in store.hits and '/sitemap_blogs_1.xml' not in store.hits
+    assert '/sitemap.xml' not in store.hits
+
+
+def test_without_robots_txt_the_default_sitemap_is_read(run):
+    store = MockStore(pages={'/sitemap.xml': PAGES_SITEMAP})
+    assert run(discover(store))['refund'] == ['/pages/returns-and-exchanges']
+    assert store.hits['/robots.txt'] == 1
+
+
+def test_unreadable_sitemaps_find_nothing_and_stop(run, monkeypatch):
+    monkeypatch.setattr(settings, 'DISCOVERY_MAX_SITEMAPS', 2)
+    store = MockStore(pages={
+        '/sitemap.xml': sitemap_index(*[f'/sitemap_pages_{i}.xml' for i in range(1, 5)]),
+        '/sitemap_pages_1.xml': '<urlset><url><loc>',
+    })
+    assert run(discover(store)) == {}
+    assert '/sitemap_pages_2.xml' not in store.hits
+
+
+def test_extraction_reads_discovered_pages_and_guesses_the_rest(run, db_schema, monkeypatch):
+    monkeypatch.setattr(settings, 'DISCOVERY_ENABLED', True)
+    pages = dict(STORE_PAGES)
+    # The refund policy lives at a path no guess covers; the privacy policy is only found by guessing
+    pages['/pages/returns-and-exchanges'] = pages.pop('/policies/refund-policy')
+    pages['/sitemap.xml'] = url_set(f'{STORE_URL}/pages/returns-and-exchanges', f'{STORE_URL}/pages/shipping')
+    store = MockStore(pages=pages)
+
+    async def extract():
+        async with store.client() as client, async_session_maker() as db:
+            return await InsightsService(client).extract_insights(STORE_URL, db)
+
+    insights = run(extract())
+    assert insights.refund_policy == 'Refund text here.'
+    assert insights.privacy_policy == 'Privacy text here.'
+    assert insights.important_links.shipping_info == f'{STORE_URL}/pages/shipping'
+    # Guessed refund paths are not tried once a discovered page has content
+    assert '/pages/refund-policy' not in store.hits and '/returns' not in store.hits
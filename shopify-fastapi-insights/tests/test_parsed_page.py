@@ -0,0 +1,51 @@
+import random
+
+import pytest
+from bs4 import BeautifulSoup
+
+from app.services import page_analysis, parsed_page
+from app.services.parsed_page import Anchor, ParsedPage
+from tests.pages import BASE_URL, random_page
+
+
+@pytest.fixture
+def parses(monkeypatch):
+    counted = []
+
+    def counting_soup(*args, **kwargs):
+        counted.append(args[0])
+        return BeautifulSoup(*args, **kwargs)
+
+    monkeypatch.setattr(parsed_page, 'BeautifulSoup', counting_soup)
+    return counted
+
+
+@pytest.mark.parametrize('seed', range(50))
+def test_views_match_separate_soup_passes(seed):
+    html = random_page(random.Random(seed))
+    page = ParsedPage(BASE_URL, html, parser='html.parser')
+    soup = BeautifulSoup(html, 'html.parser')
+    assert page.text == soup.get_text()
+    assert page.html_lower == html.lower()
+    assert page.anchors == [Anchor(a['href'], a.get_text(strip=True)) for a in soup.find_all('a', href=True)]
+    assert page.main_text == soup.find('body').get_text(separator='\n', strip=True)
+
+
+def test_homepage_analysis_parses_the_page_once(parses):
+    html = random_page(random.Random(0)).replace(
+        '</body>', '<a href="/products/hat"><img alt="Hat"></a><span class="price">$20.00</span></body>'
+    )
+    page_analysis.analyze_homepage(BASE_URL, html, BASE_URL)
+    assert len(parses) == 1
+
+
+def test_views_are_computed_once():
+    page = ParsedPage(BASE_URL, '<html><body><main><p>Main</p></main><a href="/a">A</a></body></html>')
+    assert page.soup is page.soup
+    assert page.anchors is page.anchors
+    assert page.main_text == 'Main' and page.text is page.text
+
+
+def test_unavailable_parser_falls_back(monkeypatch):
+    monkeypatch.setattr(parsed_page, 'LXML_AVAILABLE', False)
+    assert ParsedPage(BASE_URL, '<p>x</p>', parser='lxml').parser == 'html.parser'
@@ -0,0 +1,66 @@
+import asyncio
+import random
+from collections import Counter
+
+import httpx
+
+from app.core.config import settings
+from app.services.insights_service import GUESSED_PATHS, InsightsService
+from app.services.path_stats import path_stats
+
+FAQ_PAGE = '<html><body><main><p>Do you ship?</p><p>Yes we ship worldwide.</p></main></body></html>'
+
+
+class Population:
+    """Many stores behind one transport, each with its FAQ page at one of the guessed paths."""
+
+    def __init__(self, faq_paths: dict):
+        self.faq_paths = faq_paths
+        self.probes = Counter()
+
+    async def handle(self, request: httpx.Request) -> httpx.Response:
+        if request.url.path in GUESSED_PATHS['faq']:
+            self.probes[request.url.host] += 1
+        if self.faq_paths.get(request.url.host) == request.url.path:
+            return httpx.Response(200, content=FAQ_PAGE.encode(), headers={'content-type': 'text/html'})
+        return httpx.Response(404)
+
+    async def find_faqs(self, hosts) -> int:
+        # FAQ probes made for these stores, one store after another
+        async with httpx.AsyncClient(transport=httpx.MockTransport(self.handle)) as client:
+            service = InsightsService(client)
+            for host in hosts:
+                await service._extract_faqs(f'https://{host}', asyncio.Semaphore(8))
+        return sum(self.probes[host] for host in hosts)
+
+
+def population(stores: int) -> Population:
+    # Most of these stores keep their FAQ at /pages/help, fifth in the static order
+    rng = random.Random(0)
+    return Population({
+        f'store-{index}.test': '/pages/help' if rng.random() < 0.8 else rng.choice(GUESSED_PATHS['faq'])
+        for index in range(stores)
+    })
+
+
+def test_learned_order_finds_pages_with_fewer_probes(run, db_schema, monkeypatch):
+    stores = population(60)
+    hosts = list(stores.faq_paths)
+    learning, measured = hosts[:40], hosts[40:]
+
+    monkeypatch.setattr(settings, 'PATH_STATS_ENABLED', False)
+    static = run(stores.find_faqs(measured))
+    stores.probes.clear()
+
+    monkeypatch.setattr(settings, 'PATH_STATS_ENABLED', True)
+    run(stores.find_faqs(learning))
+    # Another worker only knows what was stored
+    run(path_stats.flush())
+    path_stats._global, path_stats._global_loaded_at = {}, 0.0
+    learned = run(stores.find_faqs(measured))
+
+    # About half: the common path takes one wave instead of three, the rare ones a few more
+    assert learned < static * 0.6
+    # Stores with the common path are found on the first wave
+    common = [host for host in measured if stores.faq_paths[host] == '/pages/help']
+    assert all(stores.probes[host] <= settings.PATH_PROBE_WAVE_SIZE for host in common)
@@ -0,0 +1,75 @@
+import pytest
+
+from app.core.database import BrandInsight, async_session_maker
+from app.core.exceptions import InvalidCursorError
+from app.models.schemas import ProductSort
+from app.services.product_service import ProductService
+
+# Prices repeat so that pages have to break ties on the row id
+PRICES = [20.0, 10.0, 20.0, 5.0, 20.0, 10.0, 20.0, 30.0, 20.0]
+
+
+def product(product_id: int, price: float, product_type: str = 'Hats') -> dict:
+    return {
+        'id': product_id, 'title': f'Product {product_id}', 'handle': f'product-{product_id}', 'vendor': 'Acme',
+        'product_type': product_type, 'price': price, 'url': f'https://acme.test/products/product-{product_id}',
+    }
+
+
+async def store_catalog(products) -> int:
+    async with async_session_maker() as db:
+        insight = BrandInsight(website_url='https://acme.test', base_url='https://acme.test', catalog_generation=1)
+        db.add(insight)
+        await db.flush()
+        # A staged generation that is not live yet stays out of the pages
+        await ProductService().stage(insight.id, 2, [product(99, 1.0)], db)
+        await ProductService().stage(insight.id, 1, products, db)
+        await db.commit()
+        return insight.id
+
+
+async def all_pages(insight_id: int, limit: int, **filters):
+    pages, cursor = [], None
+    async with async_session_maker() as db:
+        catalog = await ProductService().catalog_state(insight_id, db)
+        while True:
+            page = await ProductService().list_products(
+                insight_id, db, generation=catalog.generation, has_products=catalog.has_products,
+                cursor=cursor, limit=limit, **filters
+            )
+            pages.append([item.id for item in page.items])
+            cursor = page.next_cursor
+            if cursor is None:
+                return pages
+
+
+def test_pages_cover_tied_prices_once_in_order(run, db_schema):
+    insight_id = run(store_catalog([product(index + 1, price) for index, price in enumerate(PRICES)]))
+    by_price = sorted(range(1, len(PRICES) + 1), key=lambda product_id: (PRICES[product_id - 1], product_id))
+
+    pages = run(all_pages(insight_id, limit=2))
+    assert [len(page) for page in pages] == [2, 2, 2, 2, 1]
+    assert sum(pages, []) == by_price
+
+    pages = run(all_pages(insight_id, limit=3, sort=ProductSort.PRICE_DESC))
+    assert sum(pages, []) == sorted(by_price, key=lambda product_id: (-PRICES[product_id - 1], -product_id))
+
+
+def test_filters_are_kept_across_pages(run, db_schema):
+    products = [product(index + 1, price, 'Hats' if index % 2 else 'Shoes') for index, price in enumerate(PRICES)]
+    insight_id = run(store_catalog(products))
+    pages = run(all_pages(insight_id, limit=1, product_type='Hats', min_price=10.0, max_price=20.0))
+    # The $5 hat and the $30 hat fall outside the price range
+    assert pages == [[2], [6]]
+
+
+def test_a_malformed_cursor_is_rejected(run, db_schema):
+    insight_id = run(store_catalog([product(1, 10.0)]))
+
+    async def page(cursor: str):
+        async with async_session_maker() as db:
+            return await ProductService().list_products(insight_id, db, generation=1, cursor=cursor)
+
+    for cursor in ('not a cursor', 'WyJhIiwgImIiXQ==', 'WzFd'):
+        with pytest.raises(InvalidCursorError):
+            run(page(cursor))
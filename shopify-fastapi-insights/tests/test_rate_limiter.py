@@ -0,0 +1,82 @@
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime
+from types import SimpleNamespace
+
+import pytest
+
+from app.core.config import settings
+from app.services import rate_limiter
+from app.services.rate_limiter import HostRateLimiter, TokenBucket
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    # acquire's sleeps are recorded instead of waited out
+    slept = []
+
+    async def sleep(seconds: float) -> None:
+        slept.append(seconds)
+
+    monkeypatch.setattr(rate_limiter, 'asyncio', SimpleNamespace(sleep=sleep))
+    return slept
+
+
+def limiter() -> HostRateLimiter:
+    return HostRateLimiter(host_rate=4.0, host_burst=2.0, global_rate=1000.0, global_burst=1000.0, min_host_rate=0.5)
+
+
+def test_bucket_spends_its_burst_then_refills_at_its_rate():
+    bucket = TokenBucket(rate=2.0, burst=3.0)
+    bucket.updated = 100.0
+    assert [bucket.reserve(100.0) for _ in range(5)] == [0.0, 0.0, 0.0, 0.5, 1.0]
+    # Two seconds refill four tokens, two of them owed to the reservations above
+    assert bucket.reserve(102.0) == 0.0
+    assert bucket.tokens == pytest.approx(1.0)
+    # Idle time never banks more than the burst
+    bucket.reserve(200.0)
+    assert bucket.tokens == pytest.approx(2.0)
+
+
+def test_hosts_are_paced_independently(run, sleeps):
+    rates = limiter()
+
+    async def requests():
+        return [await rates.acquire('a.test') for _ in range(4)] + [await rates.acquire('b.test')]
+
+    waits = run(requests())
+    assert waits[:2] == [0.0, 0.0]
+    assert waits[2] == pytest.approx(0.25, abs=0.01)
+    assert waits[3] == pytest.approx(0.5, abs=0.01)
+    assert waits[4] == 0.0
+    assert sleeps == waits[2:4]
+
+
+def test_throttling_halves_the_rate_and_honours_retry_after(run, sleeps):
+    rates = limiter()
+    assert rates.record_response('a.test', 429, '3') == 3.0
+    assert rates._hosts['a.test'].bucket.rate == 2.0
+    wait = run(rates.acquire('a.test'))
+    assert wait == pytest.approx(3.0, abs=0.05)
+    assert run(rates.acquire('b.test')) == 0.0
+
+    # Without Retry-After the pause is one request interval at the lowered rate
+    assert rates.record_response('a.test', 503) == pytest.approx(1.0)
+    retry_at = datetime.now(timezone.utc) + timedelta(seconds=2 * settings.SCRAPER_MAX_RETRY_AFTER)
+    assert rates.record_response('a.test', 429, format_datetime(retry_at)) == settings.SCRAPER_MAX_RETRY_AFTER
+    for _ in range(5):
+        rates.record_response('a.test', 429, '0')
+    assert rates._hosts['a.test'].bucket.rate == 0.5
+    assert rates.throttled == 8
+
+
+def test_successes_restore_the_rate_gradually():
+    rates = limiter()
+    rates.record_response('a.test', 429, '0')
+    rates.record_response('a.test', 429, '0')
+    bucket = rates._hosts['a.test'].bucket
+    assert bucket.rate == 1.0
+    assert rates.record_response('a.test', 200) is None
+    assert bucket.rate == pytest.approx(1.4)
+    for _ in range(20):
+        rates.record_response('a.test', 200)
+    assert bucket.rate == 4.0
@@ -0,0 +1,82 @@
+import json
+
+import httpx
+
+from app.core.config import settings
+from app.services.shopify_detector import ShopifyDetection, ShopifyDetector, detect_from_headers, detect_from_html
+from app.services.scraper import WebScraper
+
+SITE_URL = 'https://site.test'
+
+SHOPIFY_HOMEPAGE = '<html><head><script>Shopify.shop="acme"</script></head><body>Hi</body></html>'
+
+
+class Site:
+    """Serves a homepage with the given headers and fixed JSON endpoints, and records the paths asked for."""
+
+    def __init__(self, html: str = '<html><body>Hi</body></html>', headers=None, endpoints=None, down=()):
+        self.html = html
+        self.headers = {'content-type': 'text/html', **(headers or {})}
+        self.endpoints = endpoints or {}
+        self.down = down
+        self.requested = []
+
+    async def handle(self, request: httpx.Request) -> httpx.Response:
+        path = request.url.path
+        self.requested.append(path)
+        if path in self.down:
+            raise httpx.ConnectError('Connection refused', request=request)
+        if path == '/':
+            return httpx.Response(200, stream=httpx.ByteStream(self.html.encode()), headers=self.headers)
+        if path in self.endpoints:
+            return httpx.Response(200, content=json.dumps(self.endpoints[path]).encode(), headers={'content-type': 'application/json'})
+        return httpx.Response(404)
+
+    def detect(self, run) -> ShopifyDetection:
+        async def detect():
+            async with httpx.AsyncClient(transport=httpx.MockTransport(self.handle)) as client:
+                return await ShopifyDetector(WebScraper(client)).detect(SITE_URL)
+
+        return run(detect())
+
+
+def test_a_shopify_header_decides_before_any_other_request(run):
+    site = Site(headers={'x-shopid': '42'}, endpoints={'/meta.json': {'myshopify_domain': 'acme.myshopify.com'}})
+    assert site.detect(run) == ShopifyDetection(True, 'header:x-shopid', 0.99)
+    assert site.requested == ['/']
+
+
+def test_endpoints_are_asked_before_the_html_is_trusted(run):
+    site = Site(html=SHOPIFY_HOMEPAGE, endpoints={'/meta.json': {'myshopify_domain': 'acme.myshopify.com'}})
+    assert site.detect(run) == ShopifyDetection(True, 'meta.json', 0.97)
+    assert site.requested == ['/', '/meta.json']
+
+    site = Site(html=SHOPIFY_HOMEPAGE, endpoints={'/products.json': {'products': []}})
+    assert site.detect(run).signal == 'products.json'
+    assert site.requested == ['/', '/meta.json', '/products.json']
+
+
+def test_html_markers_are_the_last_resort(run):
+    site = Site(html=SHOPIFY_HOMEPAGE)
+    assert site.detect(run) == ShopifyDetection(True, 'html:Shopify.shop', 0.95)
+    assert site.requested == ['/', '/meta.json', '/products.json']
+
+
+def test_confidence_in_a_negative_depends_on_the_endpoints_answering(run):
+    site = Site(endpoints={'/meta.json': {'name': 'Acme'}})
+    assert site.detect(run) == ShopifyDetection(False, 'none', 0.9)
+    # An endpoint that could not be reached leaves the answer less certain
+    site = Site(down=('/products.json',))
+    assert site.detect(run) == ShopifyDetection(False, 'none', 0.6)
+
+
+def test_header_and_html_signals_are_ranked():
+    assert detect_from_headers({'x-shardid': '3', 'x-shopify-stage': 'production'}).signal == 'header:x-shopify-stage'
+    assert detect_from_headers({'powered-by': 'Shopify'}).signal == 'header:powered-by'
+    assert detect_from_headers({'set-cookie': '_shopify_y=abc; path=/'}).signal == 'header:set-cookie'
+    assert detect_from_headers({'server': 'nginx'}) is None
+    assert detect_from_html('<p>We moved from Shopify to our own site</p>') is None
+    assert detect_from_html('<img src="https://cdn.shopify.com/s/files/1/logo.png"><script>ShopifyAnalytics</script>').signal == \
+        'html:ShopifyAnalytics'
+    # Only the start of the page is scanned
+    assert detect_from_html(' ' * settings.SHOPIFY_SCAN_BYTES + 'Shopify.shop') is None
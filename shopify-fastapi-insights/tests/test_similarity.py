@@ -0,0 +1,61 @@
+import numpy as np
+import pytest
+
+from app.services.similarity import SimilarityIndex, TITLE_DIM, _bucket, build_features
+
+
+def catalog(product_type: str, titles, price: float = 20.0):
+    return [{'product_type': product_type, 'title': title, 'price': price} for title in titles]
+
+
+def index_of(brands) -> SimilarityIndex:
+    index = SimilarityIndex()
+    for brand_id, (products, social) in brands.items():
+        index._add(brand_id, build_features(products, social))
+    return index
+
+
+BRANDS = {
+    1: (catalog('shoes', ['trail runner', 'road runner']), {'instagram': 'x'}),
+    2: (catalog('shoes', ['trail runner', 'hiking boot']), {'instagram': 'y'}),
+    3: (catalog('shoes', ['leather loafer'], price=200.0), {}),
+    4: (catalog('candles', ['soy candle'], price=15.0), {'tiktok': 'z'}),
+}
+
+
+def test_top_k_is_ordered_by_score_and_leaves_out_the_brand_itself():
+    index = index_of(BRANDS)
+    top = index._top_k(index._positions[1], 3)
+    assert [brand_id for brand_id, _ in top] == [2, 3, 4]
+    scores = [score for _, score in top]
+    assert scores == sorted(scores, reverse=True)
+    # Scores match the one-pair path used for brands outside the index
+    pair = index.score_pair(build_features(*BRANDS[1]), build_features(*BRANDS[2]))
+    assert scores[0] == pytest.approx(pair, abs=1e-5)
+    assert [brand_id for brand_id, _ in index._top_k(index._positions[1], 1)] == [2]
+
+
+def test_title_idf_is_recomputed_when_a_brand_is_added():
+    index = index_of({
+        1: (catalog('tees', ['organic tee']), {}),
+        2: (catalog('tees', ['linen shirt']), {}),
+    })
+    organic = _bucket('organic', TITLE_DIM)
+    index._weighted_titles()
+    rare = index._idf[organic]
+    # Once every brand sells organic things the term says less about any one of them
+    index._add(3, build_features(catalog('tees', ['organic shirt']), {}))
+    assert index._titles is None
+    index._add(4, build_features(catalog('tees', ['organic linen']), {}))
+    weighted = index._weighted_titles()
+    assert index._idf[organic] < rare
+    assert weighted.shape == (4, TITLE_DIM)
+    assert np.allclose(np.linalg.norm(weighted, axis=1), 1.0)
+
+
+def test_replacing_a_brand_keeps_its_position():
+    hats = {'instagram': 'x'}
+    index = index_of({1: (catalog('shoes', ['runner']), {}), 2: (catalog('hats', ['cap']), hats)})
+    index._add(1, build_features(catalog('hats', ['cap']), hats))
+    assert index._size == 2
+    assert index._top_k(index._positions[1], 1) == [(2, pytest.approx(1.0, abs=1e-5))]
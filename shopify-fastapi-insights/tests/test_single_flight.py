@@ -0,0 +1,90 @@
+import asyncio
+
+import pytest
+
+from app.services.single_flight import SingleFlight
+
+
+class Call:
+    """Counts how often it runs and holds every run until released."""
+
+    def __init__(self, result=None, error: Exception = None):
+        self.result = result
+        self.error = error
+        self.runs = 0
+        self.release = None
+
+    async def __call__(self):
+        self.runs += 1
+        await self.release.wait()
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+
+async def concurrently(flight: SingleFlight, key: str, call: Call, callers: int = 3):
+    call.release = asyncio.Event()
+    waiters = [asyncio.ensure_future(flight.do(key, call)) for _ in range(callers)]
+    await asyncio.sleep(0)
+    call.release.set()
+    return await asyncio.gather(*waiters, return_exceptions=True)
+
+
+def test_concurrent_calls_share_one_run(run):
+    flight = SingleFlight()
+    call = Call(result={'brand': 'acme'})
+    results = run(concurrently(flight, 'acme.test', call))
+    assert call.runs == 1
+    assert results == [{'brand': 'acme'}] * 3
+    assert all(result is results[0] for result in results)
+    assert flight.metrics() == {'in_flight': 0, 'leaders': 1, 'followers': 2}
+    # A call after the first has finished runs again
+    run(concurrently(flight, 'acme.test', call, callers=1))
+    assert call.runs == 2
+
+
+def test_an_error_reaches_every_waiter_and_is_not_kept(run):
+    flight = SingleFlight()
+    failing = Call(error=RuntimeError('store down'))
+    results = run(concurrently(flight, 'acme.test', failing))
+    assert failing.runs == 1
+    assert all(isinstance(result, RuntimeError) for result in results)
+    assert flight.metrics()['in_flight'] == 0
+    # The failure is not cached: the next caller gets a fresh run
+    assert run(concurrently(flight, 'acme.test', Call(result='ok'), callers=1)) == ['ok']
+
+
+def test_a_cancelled_waiter_leaves_the_shared_run_going(run):
+    flight = SingleFlight()
+    call = Call(result='ok')
+
+    async def cancel_one():
+        call.release = asyncio.Event()
+        leader = asyncio.ensure_future(flight.do('acme.test', call))
+        follower = asyncio.ensure_future(flight.do('acme.test', call))
+        await asyncio.sleep(0)
+        leader.cancel()
+        await asyncio.sleep(0)
+        call.release.set()
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+        return await follower
+
+    assert run(cancel_one()) == 'ok'
+    assert call.runs == 1
+
+
+def test_keys_do_not_share_runs(run):
+    flight = SingleFlight()
+    first, second = Call(result=1), Call(result=2)
+
+    async def both():
+        first.release = second.release = asyncio.Event()
+        waiters = [flight.do('a.test', first), flight.do('b.test', second)]
+        tasks = [asyncio.ensure_future(waiter) for waiter in waiters]
+        await asyncio.sleep(0)
+        first.release.set()
+        return await asyncio.gather(*tasks)
+
+    assert run(both()) == [1, 2]
+    assert (first.runs, second.runs) == (1, 1)
@@ -0,0 +1,66 @@
+from app.services.page_analysis import PageSections, TextSection
+from app.services.token_budget import CHARS_PER_TOKEN, MIN_PARTIAL_TOKENS, TokenBudgeter, estimate_tokens
+
+
+def line(number: int, tokens: int = 10) -> str:
+    # A line of exactly this many estimated tokens
+    text = f"Line {number} "
+    return (text * tokens * CHARS_PER_TOKEN)[:tokens * CHARS_PER_TOKEN]
+
+
+def page(*sections: TextSection) -> PageSections:
+    return PageSections('https://acme.test/pages/about', list(sections), sum(len(text) for section in sections for text in section.lines))
+
+
+INTRO = [line(1, 40), line(2, 40)]
+
+ABOUT_PAGE = page(
+    TextSection('text', None, INTRO),
+    TextSection('heading', 'Our story', [line(3), line(4), line(5)]),
+    TextSection('question', 'Do you ship?', [line(6)]),
+    TextSection('heading', 'Mission', [line(7)]),
+)
+
+
+def test_sent_text_never_exceeds_the_budget():
+    for budget in range(0, 120, 7):
+        text = TokenBudgeter().build(ABOUT_PAGE, 'about', budget)
+        assert estimate_tokens(text) <= budget
+
+
+def test_exact_fit_and_whole_lines_when_cut():
+    # A section costs its own tokens and one more for the blank line that separates it
+    story = '\n'.join(['Our story', line(3), line(4), line(5)])
+    exact = estimate_tokens(story) + 1
+    assert TokenBudgeter().build(ABOUT_PAGE, 'about', exact) == story
+    # One token short, the section is cut after its last whole line
+    assert TokenBudgeter().build(ABOUT_PAGE, 'about', exact - 1) == '\n'.join(['Our story', line(3), line(4)])
+
+
+def test_priority_sections_go_first_but_keep_page_order():
+    text = TokenBudgeter().build(ABOUT_PAGE, 'about', 1000)
+    assert text.index(INTRO[0]) < text.index('Our story') < text.index('Mission')
+    # With room for two sections, the headed ones win over the plain text
+    text = TokenBudgeter().build(ABOUT_PAGE, 'about', 66)
+    assert text.split('\n\n') == ['\n'.join(['Our story', line(3), line(4), line(5)]), '\n'.join(['Mission', line(7)])]
+
+
+def test_short_remainders_and_fallback_sections_are_left_out():
+    budgeter = TokenBudgeter()
+    # The question leaves less than MIN_PARTIAL_TOKENS, so the next section is not cut to fit
+    text = budgeter.build(ABOUT_PAGE, 'faq', estimate_tokens('Q: Do you ship?\n' + line(6)) + MIN_PARTIAL_TOKENS)
+    assert text == 'Q: Do you ship?\n' + line(6)
+    # Plain text is only sent when nothing on the page matches the purpose
+    text = budgeter.build(ABOUT_PAGE, 'faq', 1000)
+    assert INTRO[0] not in text and 'Mission' not in text
+    assert budgeter.build(page(TextSection('text', None, INTRO)), 'faq', 1000) == '\n'.join(INTRO)
+
+
+def test_boilerplate_lines_are_dropped_and_counted():
+    budgeter = TokenBudgeter()
+    # Lines repeated across a store's pages match whatever their spacing and case
+    shared = budgeter.shared_lines(ABOUT_PAGE, page(TextSection('text', None, ['  ' + INTRO[0].upper(), 'Other'])))
+    text = budgeter.build(ABOUT_PAGE, 'about', 1000, shared)
+    assert INTRO[0] not in text and INTRO[1] in text
+    assert budgeter.metrics()['boilerplate_lines_dropped'] == 1
+    assert budgeter.metrics()['sent_tokens'] == estimate_tokens(text)